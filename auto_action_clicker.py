@@ -15,252 +15,5119 @@ Performance Optimizations Applied:
 - Memory usage optimizations
 """
 
+import time
+_import_start = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
+from tkinter import font as tkfont
 from datetime import datetime, timedelta
-import webbrowser
 import os
+import sys
+import argparse
+import atexit
+import importlib
+import importlib.machinery
+import importlib.util
 import json
-import time
 import threading
 import logging
-from functools import lru_cache
+import ctypes
+import collections
+import concurrent.futures
+import heapq
+import bisect
+import shutil
+import tempfile
+import itertools
+import mmap
+import operator
+import queue
+import math
+import struct
+from array import array
+
+def _module_available(name):
+    """Check whether a module can be imported without importing it (or, for a submodule, its package)"""
+    if name in sys.modules:
+        return True
+    package, _, _ = name.rpartition('.')
+    try:
+        if package and package not in sys.modules:
+            # find_spec would import the package to search it
+            spec = importlib.util.find_spec(package)
+            locations = spec.submodule_search_locations if spec is not None else None
+            return bool(locations) and importlib.machinery.PathFinder.find_spec(name, locations) is not None
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access"""
+    
+    def __init__(self, name, package=None, on_load=None):
+        self._name = name
+        self._package = package or name.split('.')[0]
+        self._on_load = on_load
+        self._module = None
+        self._lock = threading.Lock()
+    
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    try:
+                        module = importlib.import_module(self._name)
+                    except ImportError as e:
+                        raise ImportError(f"{self._name} is not installed. "
+                                          f"Please install it via: pip install {self._package}") from e
+                    if self._on_load is not None:
+                        self._on_load(module)
+                    self._module = module
+                    logging.info(f"Loaded {self._name} on first use in "
+                                 f"{(time.perf_counter() - start) * 1000:.1f}ms")
+        return self._module
+    
+    @property
+    def loaded(self):
+        return self._module is not None
+    
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
 
-# Attempt to import critical dependencies and show error if missing
-try:
-    import pyautogui
+
+def _configure_pyautogui(module):
     # Performance optimization: Reduce default pause
-    pyautogui.PAUSE = 0.05  # Reduced from default 0.1s for better performance
-    pyautogui.FAILSAFE = True  # Keep failsafe enabled for safety
-except ImportError:
-    print("CRITICAL ERROR: PyAutoGUI is not installed. Please install it via: pip install pyautogui")
-    exit(1)
-
-try:
-    import keyboard
-except ImportError:
-    print("CRITICAL ERROR: keyboard module is not installed. Please install it via: pip install keyboard")
-    exit(1)
-
-try:
-    import win32gui
-    import win32api
-    import win32con
-except ImportError:
-    print("CRITICAL ERROR: pywin32 is not installed. Please install it via: pip install pywin32")
-    exit(1)
+    module.PAUSE = 0.05  # Reduced from default 0.1s for better performance
+    module.FAILSAFE = True  # Keep failsafe enabled for safety
 
-# Optional theme support
-try:
-    from ttkthemes import ThemedTk, ThemedStyle
-    THEMES_AVAILABLE = True
-except ImportError:
-    # Provide fallback classes to avoid unbound variable warnings
-    ThemedTk = None
-    ThemedStyle = None
-    THEMES_AVAILABLE = False
-
-# Setup logging
-logging.basicConfig(
-    filename='autoclick.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+
+# Heavy and platform modules are imported on first use to keep startup fast
+pyautogui = LazyModule('pyautogui', on_load=_configure_pyautogui)
+keyboard = LazyModule('keyboard')
+win32gui = LazyModule('win32gui', 'pywin32')
+win32api = LazyModule('win32api', 'pywin32')
+win32con = LazyModule('win32con', 'pywin32')
+
+# Critical dependencies are checked up front by main() (module name, pip package)
+CRITICAL_DEPENDENCIES = (
+    ('pyautogui', 'pyautogui'),
+    ('keyboard', 'keyboard'),
+    ('win32gui', 'pywin32'),
 )
 
+# Optional low-level mouse hooks (shipped with the keyboard package)
+mouse_hooks = LazyModule('keyboard.mouse', 'keyboard')
+MOUSE_HOOKS_AVAILABLE = _module_available('keyboard.mouse')
+
+# Optional NumPy acceleration for macro path processing (required for image matching)
+numpy = LazyModule('numpy')
+NUMPY_AVAILABLE = _module_available('numpy')
+
+# Optional Pillow for template images other than .npy
+PIL_Image = LazyModule('PIL.Image', 'Pillow')
+PIL_AVAILABLE = _module_available('PIL')
+
+# Optional theme support
+ttkthemes = LazyModule('ttkthemes')
+THEMES_AVAILABLE = _module_available('ttkthemes')
+
+
+def check_dependencies():
+    """Report missing critical dependencies; returns True if all are installed"""
+    missing = [package for module, package in CRITICAL_DEPENDENCIES if not _module_available(module)]
+    for package in missing:
+        print(f"CRITICAL ERROR: {package} is not installed. Please install it via: pip install {package}")
+    return not missing
+
+# Logging (configured by setup_logging from main)
+LOG_FILE = 'autoclick.log'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+LOG_REPEAT_WINDOW = 60.0  # Identical records within this many seconds are counted, not written
+
+
+class RepeatFilter(logging.Filter):
+    """Pass the first of identical log records per window and count the repeats"""
+    
+    def __init__(self, window=LOG_REPEAT_WINDOW, max_keys=1024, clock=None):
+        super().__init__()
+        self.window = window
+        self.max_keys = max_keys
+        self._clock = clock or time.monotonic
+        self._lock = threading.Lock()
+        self._seen = collections.OrderedDict()  # (level, message) -> [window start, count, last record]
+        self._summaries = []
+        self.suppressed = 0
+    
+    def filter(self, record):
+        key = (record.levelno, record.getMessage())
+        now = self._clock()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is not None and now - entry[0] < self.window:
+                entry[1] += 1
+                entry[2] = record
+                self.suppressed += 1
+                return False
+            
+            if entry is not None:
+                self._add_summary(entry)
+            self._seen[key] = [now, 1, None]
+            self._seen.move_to_end(key)
+            if len(self._seen) > self.max_keys:
+                self._add_summary(self._seen.popitem(last=False)[1])
+        return True
+    
+    def _add_summary(self, entry):
+        start, count, record = entry
+        if count > 1:
+            summary = logging.makeLogRecord(record.__dict__)
+            summary.msg = f"{record.getMessage()} ×{count} in last {self.window:g}s"
+            summary.args = None
+            summary.repeat_count = count
+            self._summaries.append(summary)
+    
+    def pop_summaries(self):
+        """Close expired windows and return summary records for those that repeated"""
+        now = self._clock()
+        with self._lock:
+            for key in [key for key, entry in self._seen.items() if now - entry[0] >= self.window]:
+                self._add_summary(self._seen.pop(key))
+            summaries, self._summaries = self._summaries, []
+        return summaries
+    
+    def flush(self):
+        """Return summaries for every open window (used at shutdown)"""
+        with self._lock:
+            for entry in self._seen.values():
+                self._add_summary(entry)
+            self._seen.clear()
+            summaries, self._summaries = self._summaries, []
+        return summaries
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format records as one JSON object per line for offline analysis"""
+    
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+            'function': record.funcName,
+            'line': record.lineno,
+            'count': getattr(record, 'repeat_count', 1),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class QueueLogHandler(logging.Handler):
+    """Hand records to a queue without formatting or blocking; full queues drop records"""
+    
+    def __init__(self, record_queue):
+        super().__init__()
+        self.queue = record_queue
+        self.dropped = 0
+    
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1  # A flood must never block the caller
+
+
+class LogPipeline:
+    """Queue-based logging: callers only enqueue, a background thread formats and writes"""
+    
+    _STOP = object()
+    
+    def __init__(self, handlers, repeat_window=LOG_REPEAT_WINDOW, max_queue=10000, flush_interval=1.0):
+        self.handlers = handlers
+        self.repeat_filter = RepeatFilter(repeat_window)
+        self.queue = queue.Queue(max_queue)
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._thread = None
+        
+        # The handler the logger sees: repeats are dropped before they reach the queue
+        self.handler = QueueLogHandler(self.queue)
+        self.handler.addFilter(self.repeat_filter)
+    
+    def start(self, logger=None):
+        logger = logger or logging.getLogger()
+        logger.addHandler(self.handler)
+        self._logger = logger
+        self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Write everything still queued, close the handlers and detach from the logger"""
+        if self._thread is None:
+            return
+        self._logger.removeHandler(self.handler)
+        self.queue.put(self._STOP)
+        self._thread.join(timeout=5.0)
+        self._thread = None
+        for record in self.repeat_filter.flush():
+            self._write(record)
+        for handler in self.handlers:
+            handler.close()
+    
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = None
+            if record is self._STOP:
+                break
+            if record is not None:
+                self._write(record)
+            
+            # Summaries of repeated records are written when their window closes
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + self.flush_interval
+                for summary in self.repeat_filter.pop_summaries():
+                    self._write(summary)
+    
+    def _write(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                try:
+                    handler.handle(record)
+                except Exception:
+                    handler.handleError(record)
+        self.written += 1
+    
+    def get_stats(self):
+        return {
+            'written': self.written,
+            'suppressed': self.repeat_filter.suppressed,
+            'dropped': self.handler.dropped,
+            'pending': self.queue.qsize(),
+        }
+
+
+def setup_logging(filename=LOG_FILE, json_filename=None, max_bytes=LOG_MAX_BYTES,
+                  backup_count=LOG_BACKUP_COUNT, repeat_window=LOG_REPEAT_WINDOW, level=logging.INFO):
+    """Route logging through a LogPipeline writing size-rotated text (and optional JSON lines) files"""
+    import logging.handlers
+    
+    handlers = []
+    text_handler = logging.handlers.RotatingFileHandler(
+        filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+    text_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers.append(text_handler)
+    if json_filename:
+        json_handler = logging.handlers.RotatingFileHandler(
+            json_filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+    
+    pipeline = LogPipeline(handlers, repeat_window=repeat_window)
+    logging.getLogger().setLevel(level)
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    return pipeline
+
+
+def display_refresh_rate(default=60):
+    """Refresh rate of the primary display in Hz (default when it cannot be read)"""
+    try:
+        settings = win32api.EnumDisplaySettings(None, win32con.ENUM_CURRENT_SETTINGS)
+        rate = int(settings.DisplayFrequency)
+        if rate > 1:  # 0 and 1 mean "hardware default"
+            return rate
+    except Exception:
+        pass
+    return default
+
+
+class RefreshLoop:
+    """Self-rescheduling UI refresh that backs off while nothing changes and stops when disabled"""
+    
+    def __init__(self, schedule, cancel, callback, min_interval, max_interval=None):
+        # schedule(delay_ms, func) -> handle and cancel(handle), i.e. Tk's after/after_cancel.
+        # callback() returns True when something changed, which resets the interval
+        self._schedule = schedule
+        self._cancel = cancel
+        self._callback = callback
+        # Rounded up so a frame interval never refreshes faster than the display
+        self.min_interval = max(1, math.ceil(min_interval))
+        self.max_interval = max(self.min_interval, math.ceil(max_interval or min_interval))
+        self.interval = self.min_interval
+        self.enabled = False
+        self.wakeups = 0
+        self._handle = None
+    
+    def set_enabled(self, enabled):
+        """Start (refreshing right away) or stop the loop; no timer is pending while stopped"""
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        if enabled:
+            self.interval = self.min_interval
+            self._reschedule(0)
+        else:
+            self._cancel_pending()
+    
+    def wake(self):
+        """Return to the fastest interval because something started changing"""
+        if self.enabled and self.interval > self.min_interval:
+            self.interval = self.min_interval
+            self._reschedule(self.min_interval)
+    
+    def _reschedule(self, delay):
+        self._cancel_pending()
+        self._handle = self._schedule(delay, self._tick)
+    
+    def _cancel_pending(self):
+        if self._handle is not None:
+            self._cancel(self._handle)
+            self._handle = None
+    
+    def _tick(self):
+        self._handle = None
+        if not self.enabled:
+            return
+        self.wakeups += 1
+        try:
+            changed = self._callback()
+        except Exception as e:
+            logging.error(f"Error in UI refresh: {e}")
+            changed = False
+        
+        # Double the interval for every refresh that found nothing new
+        self.interval = self.min_interval if changed else min(self.max_interval, self.interval * 2)
+        self._handle = self._schedule(self.interval, self._tick)
+
+
+class UIRefreshController:
+    """Run the UI refresh loops only while the window is visible and their data can change"""
+    
+    def __init__(self, schedule, cancel, update_pointer, update_statistics,
+                 frame_interval=16, idle_interval=1000, statistics_interval=1000):
+        # Pointer display: display rate while the mouse moves, backing off to idle_interval
+        self.pointer_loop = RefreshLoop(schedule, cancel, update_pointer, frame_interval, idle_interval)
+        self.statistics_loop = RefreshLoop(schedule, cancel, update_statistics, statistics_interval)
+        self.visible = True
+        self.focused = True
+        self.busy = False
+    
+    def update(self, visible=None, focused=None, busy=None):
+        """Record a window or activity state change and start or stop the loops"""
+        if visible is not None:
+            self.visible = visible
+        if focused is not None:
+            self.focused = focused
+        if busy is not None:
+            self.busy = busy
+        
+        # A minimized or unfocused window, with nothing running, schedules no timers at all
+        self.pointer_loop.set_enabled(self.visible and self.focused)
+        self.statistics_loop.set_enabled(self.visible and self.busy)
+    
+    def wake(self):
+        """Pointer activity seen (e.g. a <Motion> event): refresh at the display rate again"""
+        self.pointer_loop.wake()
+    
+    @property
+    def wakeups(self):
+        return self.pointer_loop.wakeups + self.statistics_loop.wakeups
+    
+    def get_stats(self):
+        return {
+            'visible': self.visible,
+            'focused': self.focused,
+            'busy': self.busy,
+            'pointer_interval_ms': self.pointer_loop.interval if self.pointer_loop.enabled else None,
+            'statistics_running': self.statistics_loop.enabled,
+            'wakeups': self.wakeups,
+        }
+
+
+class ActionScheduler:
+    """Drift-free action scheduler driven by absolute deadlines on a monotonic clock"""
+    
+    def __init__(self, clock=None, sleep=None, spin_threshold=0.002, latency_stats=None):
+        # Clock and sleep are injectable so the scheduler can run against a fake clock
+        self._clock = clock or time.perf_counter
+        self._sleep = sleep or time.sleep
+        self.spin_threshold = spin_threshold  # Busy-wait the final 2ms for precision
+        self.latency_stats = latency_stats  # Receives 'sleep_overshoot' samples
+        self.interval = 1.0
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self, interval=None):
+        """Reset deadlines and statistics, optionally with a new interval"""
+        with self._lock:
+            if interval is not None:
+                self.interval = max(0.0, float(interval))
+            self._start_time = None
+            self._last_tick_time = None
+            self._next_deadline = None
+            self.tick_count = 0
+            self.resync_count = 0
+            self.last_lateness = 0.0
+            self._lateness_sum = 0.0
+            self._lateness_sq_sum = 0.0
+            self._lateness_max = 0.0
+    
+    def set_interval(self, interval):
+        """Change the interval; takes effect from the next deadline"""
+        with self._lock:
+            self.interval = max(0.0, float(interval))
+    
+    def wait_next(self, should_continue=None):
+        """Block until the next deadline; returns False if cancelled while waiting"""
+        now = self._clock()
+        if self._next_deadline is None:
+            # First tick fires immediately
+            self._start_time = now
+            self._next_deadline = now
+        
+        deadline = self._next_deadline
+        now = self.wait_until(deadline, should_continue)
+        if now is None:
+            return False
+        
+        self._record_tick(now - deadline)
+        self._last_tick_time = now
+        
+        with self._lock:
+            interval = self.interval
+        next_deadline = deadline + interval
+        if now - deadline > interval:
+            # Fell more than a full cycle behind: resync instead of bursting to catch up
+            next_deadline = now + interval
+            self.resync_count += 1
+        self._next_deadline = next_deadline
+        return True
+    
+    def now(self):
+        return self._clock()
+    
+    def wait_until(self, deadline, should_continue=None):
+        """Block until an absolute deadline; returns the wake time, or None if cancelled"""
+        # Coarse sleep in bounded slices so stop requests stay responsive
+        while True:
+            remaining = deadline - self._clock()
+            if remaining <= self.spin_threshold:
+                break
+            if should_continue is not None and not should_continue():
+                return None
+            self._sleep(min(remaining - self.spin_threshold, 0.05))
+        
+        # Final spin for sub-millisecond accuracy
+        now = self._clock()
+        while now < deadline:
+            now = self._clock()
+        return now
+    
+    def _record_tick(self, lateness):
+        """Accumulate per-cycle lateness without storing every sample"""
+        self.tick_count += 1
+        self.last_lateness = lateness
+        self._lateness_sum += lateness
+        self._lateness_sq_sum += lateness * lateness
+        if lateness > self._lateness_max:
+            self._lateness_max = lateness
+        if self.latency_stats is not None:
+            self.latency_stats.record('sleep_overshoot', lateness)
+    
+    def get_stats(self):
+        """Return achieved rate and jitter statistics"""
+        if not self.tick_count or self._start_time is None:
+            return {
+                'ticks': 0, 'target_rate': self._target_rate(), 'achieved_rate': 0.0,
+                'jitter_mean_ms': 0.0, 'jitter_std_ms': 0.0, 'jitter_max_ms': 0.0,
+                'last_jitter_ms': 0.0, 'resyncs': 0
+            }
+        
+        # N ticks span N-1 intervals, from the first tick to the last (not to now, which
+        # would understate the rate between ticks and after stopping)
+        elapsed = self._last_tick_time - self._start_time
+        achieved_rate = (self.tick_count - 1) / elapsed if elapsed > 0 and self.tick_count > 1 else 0.0
+        mean = self._lateness_sum / self.tick_count
+        variance = max(0.0, self._lateness_sq_sum / self.tick_count - mean * mean)
+        
+        return {
+            'ticks': self.tick_count,
+            'target_rate': self._target_rate(),
+            'achieved_rate': achieved_rate,
+            'jitter_mean_ms': mean * 1000,
+            'jitter_std_ms': (variance ** 0.5) * 1000,
+            'jitter_max_ms': self._lateness_max * 1000,
+            'last_jitter_ms': self.last_lateness * 1000,
+            'resyncs': self.resync_count
+        }
+    
+    def _target_rate(self):
+        return 1.0 / self.interval if self.interval > 0 else 0.0
+
+
+class HighResolutionTimer:
+    """Raise the Windows system timer resolution while precise scheduling is active"""
+    
+    def __init__(self, period_ms=1):
+        self.period_ms = period_ms
+        self._active = False
+    
+    def __enter__(self):
+        if os.name == 'nt':
+            try:
+                import ctypes
+                ctypes.windll.winmm.timeBeginPeriod(self.period_ms)
+                self._active = True
+            except Exception as e:
+                logging.error(f"Failed to raise timer resolution: {e}")
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._active:
+            try:
+                import ctypes
+                ctypes.windll.winmm.timeEndPeriod(self.period_ms)
+            except Exception as e:
+                logging.error(f"Failed to restore timer resolution: {e}")
+            self._active = False
+        return False
+
+
+class TTLCache:
+    """Thread-safe cache with per-entry TTL, LRU eviction and hit/miss metrics"""
+    
+    _MISSING = object()
+    
+    def __init__(self, maxsize=128, ttl=2.0, clock=None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._clock = clock or time.monotonic
+        self._data = collections.OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key, default=None):
+        """Return a fresh cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING:
+                self.misses += 1
+                return default
+            
+            expires_at, value = entry
+            if self._clock() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def get_or_set(self, key, factory, ttl=None):
+        """Return the cached value or compute, store and return it"""
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            # Computed outside the lock so slow factories don't block other readers
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+    
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when no key is given"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+    
+    def get_stats(self):
+        """Return hit rate, entry count and eviction metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._data),
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class WindowManager:
+    """Handle window-related operations with caching for performance"""
+    
+    def __init__(self, cache_timeout=2.0, clock=None):
+        self._window_cache = TTLCache(maxsize=16, ttl=cache_timeout, clock=clock)  # Cache for 2 seconds
+    
+    def get_open_window_titles(self):
+        """Get all currently open and visible window titles (cached)"""
+        titles = self._window_cache.get('titles')
+        if titles is not None:
+            return list(titles)
+        
+        titles = []
+        
+        def enum_windows_callback(hwnd, lParam):
+            if win32gui.IsWindowVisible(hwnd):
+                title = win32gui.GetWindowText(hwnd)
+                if title.strip():
+                    titles.append(title)
+            return True
+        
+        try:
+            win32gui.EnumWindows(enum_windows_callback, None)
+            unique_titles = sorted(list(set(titles)))
+            self._window_cache.set('titles', unique_titles)
+            return list(unique_titles)
+        except Exception as e:
+            logging.error(f"Error getting window titles: {e}")
+            return []
+    
+    def find_target_window(self, target_window_name):
+        """Find target windows in the system"""
+        found_windows = []
+        
+        def enum_windows_callback(hwnd, lParam):
+            if win32gui.IsWindowVisible(hwnd):
+                window_title = win32gui.GetWindowText(hwnd)
+                if window_title and target_window_name.lower() in window_title.lower():
+                    found_windows.append((hwnd, window_title))
+            return True
+        
+        try:
+            win32gui.EnumWindows(enum_windows_callback, None)
+        except Exception as e:
+            logging.error(f"Error finding window: {e}")
+        
+        return found_windows
+    
+    def clear_cache(self):
+        """Clear the window cache"""
+        self._window_cache.invalidate()
+    
+    def get_cache_stats(self):
+        """Return window cache metrics"""
+        return self._window_cache.get_stats()
+
+
+class TargetWindowResolver:
+    """Resolve a target window to a handle once per job and revalidate it cheaply"""
+    
+    def __init__(self, window_manager):
+        self.window_manager = window_manager
+        self._lock = threading.Lock()
+        self._target_name = None
+        self._hwnd = None
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """Reset hit/miss/revalidation counters"""
+        self.hits = 0
+        self.misses = 0
+        self.revalidation_failures = 0
+    
+    def invalidate(self):
+        """Drop the resolved handle so the next lookup enumerates windows again"""
+        with self._lock:
+            self._target_name = None
+            self._hwnd = None
+    
+    def resolve(self, target_window_name):
+        """Return the handle of the target window, or None if it cannot be found"""
+        if not target_window_name:
+            return None
+        
+        with self._lock:
+            hwnd = self._hwnd if self._target_name == target_window_name else None
+        
+        if hwnd is not None:
+            if self._is_valid(hwnd, target_window_name):
+                self.hits += 1
+                return hwnd
+            self.revalidation_failures += 1
+        
+        # Slow path: full EnumWindows walk
+        self.misses += 1
+        windows = self.window_manager.find_target_window(target_window_name)
+        hwnd = windows[0][0] if windows else None
+        with self._lock:
+            self._target_name = target_window_name
+            self._hwnd = hwnd
+        return hwnd
+    
+    @staticmethod
+    def _is_valid(hwnd, target_window_name):
+        """Check the cached handle still exists and still matches the target title"""
+        try:
+            if not win32gui.IsWindow(hwnd):
+                return False
+            return target_window_name.lower() in win32gui.GetWindowText(hwnd).lower()
+        except Exception:
+            return False
+    
+    def get_stats(self):
+        """Return lookup counters"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidation_failures': self.revalidation_failures,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+# Virtual key codes for named keys (letters and digits map to their uppercase ASCII code)
+VIRTUAL_KEY_CODES = {
+    'backspace': 0x08, 'tab': 0x09, 'enter': 0x0D, 'return': 0x0D,
+    'shift': 0x10, 'ctrl': 0x11, 'alt': 0x12, 'pause': 0x13, 'capslock': 0x14,
+    'esc': 0x1B, 'escape': 0x1B, 'space': 0x20,
+    'pageup': 0x21, 'pagedown': 0x22, 'end': 0x23, 'home': 0x24,
+    'left': 0x25, 'up': 0x26, 'right': 0x27, 'down': 0x28,
+    'insert': 0x2D, 'delete': 0x2E, 'del': 0x2E,
+}
+VIRTUAL_KEY_CODES.update({f'f{i}': 0x6F + i for i in range(1, 25)})
+
+
+def get_virtual_key_code(key):
+    """Translate a key name into a Windows virtual key code, or None if unknown"""
+    name = str(key).strip().lower()
+    if name in VIRTUAL_KEY_CODES:
+        return VIRTUAL_KEY_CODES[name]
+    if len(name) == 1:
+        if name.isalnum() and name.isascii():
+            return ord(name.upper())
+        try:
+            vk = win32api.VkKeyScan(name)
+            if vk != -1:
+                return vk & 0xFF
+        except Exception:
+            pass
+    return None
+
+
+# Histogram bucket upper bounds in seconds: 1us to ~33s, 8 buckets per doubling (under 9% error)
+LATENCY_BUCKETS_PER_DOUBLING = 8
+LATENCY_BUCKET_BOUNDS = tuple(1e-6 * 2 ** (i / LATENCY_BUCKETS_PER_DOUBLING) for i in range(8 * 25 + 1))
+
+
+class LatencyHistogram:
+    """Fixed-memory log-bucketed latency histogram with percentile estimates"""
+    
+    def __init__(self):
+        # One counter per bucket plus an overflow bucket
+        self.counts = array('Q', bytes(8 * (len(LATENCY_BUCKET_BOUNDS) + 1)))
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.last = 0.0
+    
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+        self.last = seconds
+    
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples (capped at the max)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, fraction * self.count)
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                if index < len(LATENCY_BUCKET_BOUNDS):
+                    return min(LATENCY_BUCKET_BOUNDS[index], self.maximum)
+                break
+        return self.maximum
+    
+    def cumulative_buckets(self, step=LATENCY_BUCKETS_PER_DOUBLING):
+        """Yield (upper bound, cumulative count) for every step-th bucket, for export"""
+        cumulative = 0
+        for index, bound in enumerate(LATENCY_BUCKET_BOUNDS):
+            cumulative += self.counts[index]
+            if index % step == 0:
+                yield bound, cumulative
+    
+    def copy(self):
+        histogram = LatencyHistogram()
+        histogram.counts = array('Q', self.counts)
+        histogram.count = self.count
+        histogram.total = self.total
+        histogram.maximum = self.maximum
+        histogram.last = self.last
+        return histogram
+
+
+class LatencyStats:
+    """Per-stage latency histograms keyed by stage name"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+    
+    def record(self, name, seconds):
+        """Record one latency sample for the named stage"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+    
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+    
+    def snapshot(self):
+        """Return copies of the histograms, safe to read outside the lock"""
+        with self._lock:
+            return {name: histogram.copy() for name, histogram in self._histograms.items()}
+    
+    def get_stats(self):
+        """Return latency summaries in milliseconds"""
+        return {
+            name: {
+                'count': histogram.count,
+                'mean_ms': histogram.total / histogram.count * 1000 if histogram.count else 0.0,
+                'p50_ms': histogram.percentile(0.5) * 1000,
+                'p90_ms': histogram.percentile(0.9) * 1000,
+                'p99_ms': histogram.percentile(0.99) * 1000,
+                'max_ms': histogram.maximum * 1000,
+                'last_ms': histogram.last * 1000
+            }
+            for name, histogram in self.snapshot().items()
+        }
+
+
+def render_metrics(latency_stats, scheduler=None, job_scheduler=None, running=False, actions=0, region_watcher=None):
+    """Render metrics in the Prometheus text exposition format"""
+    lines = [
+        "# HELP autoclick_stage_latency_seconds Latency of each action stage.",
+        "# TYPE autoclick_stage_latency_seconds histogram",
+    ]
+    histograms = latency_stats.snapshot()
+    if job_scheduler is not None:
+        histograms.update(job_scheduler.dispatch_stats.snapshot())
+    for stage, histogram in sorted(histograms.items()):
+        for bound, cumulative in histogram.cumulative_buckets():
+            lines.append(f'autoclick_stage_latency_seconds_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+        lines.append(f'autoclick_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+        lines.append(f'autoclick_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.total:.9f}')
+        lines.append(f'autoclick_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+    
+    lines += [
+        "# HELP autoclick_running Whether the action loop is running.",
+        "# TYPE autoclick_running gauge",
+        f"autoclick_running {int(bool(running))}",
+        "# HELP autoclick_actions_total Actions performed since the loop was started.",
+        "# TYPE autoclick_actions_total counter",
+        f"autoclick_actions_total {actions}",
+    ]
+    if scheduler is not None:
+        stats = scheduler.get_stats()
+        lines += [
+            "# HELP autoclick_requested_rate Requested actions per second.",
+            "# TYPE autoclick_requested_rate gauge",
+            f"autoclick_requested_rate {stats['target_rate']:.6g}",
+            "# HELP autoclick_achieved_rate Achieved actions per second.",
+            "# TYPE autoclick_achieved_rate gauge",
+            f"autoclick_achieved_rate {stats['achieved_rate']:.6g}",
+            "# HELP autoclick_resyncs_total Times the scheduler fell a full interval behind.",
+            "# TYPE autoclick_resyncs_total counter",
+            f"autoclick_resyncs_total {stats['resyncs']}",
+        ]
+    if job_scheduler is not None:
+        lines += [
+            "# HELP autoclick_jobs_active Jobs that are scheduled and not finished.",
+            "# TYPE autoclick_jobs_active gauge",
+            f"autoclick_jobs_active {job_scheduler.active_count() if job_scheduler.running else 0}",
+        ]
+    watches = region_watcher.get_stats() if region_watcher is not None else {}
+    if watches:
+        lines += [
+            "# HELP autoclick_region_watch_cpu_ratio CPU time per wall-clock second spent sampling a watched region.",
+            "# TYPE autoclick_region_watch_cpu_ratio gauge",
+        ]
+        lines += [f'autoclick_region_watch_cpu_ratio{{watch="{name}"}} {stats["cpu_percent"] / 100:.6g}'
+                  for name, stats in sorted(watches.items())]
+        lines += [
+            "# HELP autoclick_region_watch_samples_total Samples taken of a watched region.",
+            "# TYPE autoclick_region_watch_samples_total counter",
+        ]
+        lines += [f'autoclick_region_watch_samples_total{{watch="{name}"}} {stats["samples"]}'
+                  for name, stats in sorted(watches.items())]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serve metrics in Prometheus text format on localhost"""
+    
+    def __init__(self, collect, port=9464, host='127.0.0.1'):
+        self.collect = collect  # Callable returning the metrics text
+        self.port = port
+        self.host = host
+        self._server = None
+    
+    @property
+    def running(self):
+        return self._server is not None
+    
+    def start(self):
+        """Start serving on a background thread; returns False if the port is unavailable"""
+        if self._server is not None:
+            return True
+        
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        collect = self.collect
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                try:
+                    body = collect().encode('utf-8')
+                except Exception as e:
+                    logging.error(f"Error collecting metrics: {e}")
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the log
+        
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        except OSError as e:
+            logging.error(f"Failed to start metrics server on {self.host}:{self.port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logging.info(f"Metrics available at http://{self.host}:{self.port}/metrics")
+        return True
+    
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class FocusTracker:
+    """Only refocus the target window when it has actually lost the foreground"""
+    
+    def __init__(self, latency_stats=None):
+        self.latency_stats = latency_stats
+        self.reset_stats()
+    
+    def reset_stats(self):
+        self.focus_checks = 0
+        self.refocus_count = 0
+    
+    def ensure_focus(self, hwnd):
+        """Bring hwnd to the foreground if needed; returns True if it has focus"""
+        start = time.perf_counter()
+        self.focus_checks += 1
+        try:
+            if win32gui.GetForegroundWindow() == hwnd:
+                return True
+            
+            if win32gui.IsIconic(hwnd):
+                win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
+            win32gui.SetForegroundWindow(hwnd)
+            self.refocus_count += 1
+            return True
+        except Exception as e:
+            logging.error(f"Error focusing window: {e}")
+            return False
+        finally:
+            if self.latency_stats is not None:
+                self.latency_stats.record('focus', time.perf_counter() - start)
+    
+    def get_stats(self):
+        return {
+            'focus_checks': self.focus_checks,
+            'refocus_count': self.refocus_count,
+            'skipped': self.focus_checks - self.refocus_count
+        }
+
+
+class WindowMessageSender:
+    """Deliver clicks and key presses to a window with PostMessage, without stealing focus"""
+    
+    def __init__(self):
+        # Button name -> (down, up, double click message, MK_* key state flag, wParam high word)
+        self._button_messages = {
+            'left': (win32con.WM_LBUTTONDOWN, win32con.WM_LBUTTONUP,
+                     win32con.WM_LBUTTONDBLCLK, win32con.MK_LBUTTON, 0),
+            'right': (win32con.WM_RBUTTONDOWN, win32con.WM_RBUTTONUP,
+                      win32con.WM_RBUTTONDBLCLK, win32con.MK_RBUTTON, 0),
+            'middle': (win32con.WM_MBUTTONDOWN, win32con.WM_MBUTTONUP,
+                       win32con.WM_MBUTTONDBLCLK, win32con.MK_MBUTTON, 0),
+            'x': (WM_XBUTTONDOWN, WM_XBUTTONUP, WM_XBUTTONDBLCLK, MK_XBUTTON1, XBUTTON1 << 16),
+            'x2': (WM_XBUTTONDOWN, WM_XBUTTONUP, WM_XBUTTONDBLCLK, MK_XBUTTON2, XBUTTON2 << 16),
+        }
+    
+    def click(self, hwnd, x, y, button='left', clicks=1, screen_coords=True):
+        """Post a click at (x, y); screen coordinates are translated to client coordinates"""
+        down_msg, up_msg, dblclk_msg, key_state, button_data = self._messages(button)
+        target, cx, cy = self._resolve_click_target(hwnd, x, y, screen_coords)
+        lparam = win32api.MAKELONG(cx & 0xFFFF, cy & 0xFFFF)
+        
+        self._post(target, win32con.WM_MOUSEMOVE, 0, lparam)
+        for i in range(clicks):
+            # The second press of a double click arrives as a DBLCLK message
+            self._post(target, dblclk_msg if i == 1 else down_msg, button_data | key_state, lparam)
+            self._post(target, up_msg, button_data, lparam)
+    
+    def press_key(self, hwnd, key):
+        """Post a key down/up pair for the named key"""
+        vk = get_virtual_key_code(key)
+        if vk is None:
+            raise ValueError(f"Unknown key: {key}")
+        
+        scan_code = win32api.MapVirtualKey(vk, 0)
+        self.key(hwnd, vk, scan_code, True)
+        self.key(hwnd, vk, scan_code, False)
+    
+    def move(self, hwnd, cx, cy, key_state=0):
+        """Post a mouse move at client coordinates; key_state holds the buttons currently down"""
+        self._post(hwnd, win32con.WM_MOUSEMOVE, key_state, win32api.MAKELONG(cx & 0xFFFF, cy & 0xFFFF))
+    
+    def button(self, hwnd, cx, cy, button='left', down=True, key_state=0):
+        """Post one press or release at client coordinates; returns the button's key state flag"""
+        down_msg, up_msg, _, flag, button_data = self._messages(button)
+        lparam = win32api.MAKELONG(cx & 0xFFFF, cy & 0xFFFF)
+        if down:
+            self._post(hwnd, down_msg, button_data | key_state | flag, lparam)
+        else:
+            self._post(hwnd, up_msg, button_data | (key_state & ~flag), lparam)
+        return flag
+    
+    def scroll(self, hwnd, cx, cy, amount, key_state=0):
+        """Post a wheel scroll (1/120 notch units) at client coordinates"""
+        # Wheel messages carry screen coordinates
+        x, y = win32gui.ClientToScreen(hwnd, (cx, cy))
+        self._post(hwnd, win32con.WM_MOUSEWHEEL, ((amount & 0xFFFF) << 16) | key_state,
+                   win32api.MAKELONG(x & 0xFFFF, y & 0xFFFF))
+    
+    def key(self, hwnd, vk, scan_code, down=True):
+        """Post a single key down or up"""
+        lparam = 1 | (scan_code << 16)
+        if down:
+            self._post(hwnd, win32con.WM_KEYDOWN, vk, lparam)
+        else:
+            self._post(hwnd, win32con.WM_KEYUP, vk, lparam | 0xC0000000)  # Previous key state + transition state
+    
+    def _messages(self, button):
+        if button not in self._button_messages:
+            raise ValueError(f"Button {button} cannot be posted to a window")
+        return self._button_messages[button]
+    
+    @staticmethod
+    def _resolve_click_target(hwnd, x, y, screen_coords):
+        """Pick the deepest child control at the point and convert to its client coordinates"""
+        cx, cy = win32gui.ScreenToClient(hwnd, (x, y)) if screen_coords else (x, y)
+        
+        # Searched through hwnd's own children rather than the screen's z-order,
+        # so windows that are covered or minimized still resolve their controls
+        target = hwnd
+        flags = win32con.CWP_SKIPINVISIBLE | win32con.CWP_SKIPTRANSPARENT
+        try:
+            while True:
+                child = win32gui.ChildWindowFromPointEx(target, (cx, cy), flags)
+                if not child or child == target:
+                    break
+                cx, cy = win32gui.ScreenToClient(child, win32gui.ClientToScreen(target, (cx, cy)))
+                target = child
+        except Exception:
+            pass
+        return target, cx, cy
+    
+    @staticmethod
+    def _post(hwnd, msg, wparam, lparam):
+        """PostMessage with a SendMessage fallback"""
+        try:
+            win32gui.PostMessage(hwnd, msg, wparam, lparam)
+        except Exception:
+            win32gui.SendMessage(hwnd, msg, wparam, lparam)
+
+
+class KeyboardHandler:
+    """Handle keyboard input efficiently"""
+    
+    def __init__(self):
+        self.registered_hotkeys = set()
+    
+    def register_hotkey(self, hotkey, callback):
+        """Register a hotkey with error handling"""
+        try:
+            if hotkey in self.registered_hotkeys:
+                keyboard.remove_hotkey(hotkey)
+            keyboard.add_hotkey(hotkey, callback)
+            self.registered_hotkeys.add(hotkey)
+            return True
+        except Exception as e:
+            logging.error(f"Failed to register hotkey {hotkey}: {e}")
+            return False
+    
+    def unregister_hotkey(self, hotkey):
+        """Unregister one hotkey"""
+        if hotkey in self.registered_hotkeys:
+            try:
+                keyboard.remove_hotkey(hotkey)
+            except Exception as e:
+                logging.error(f"Failed to unregister hotkey {hotkey}: {e}")
+            self.registered_hotkeys.discard(hotkey)
+    
+    def unregister_all(self):
+        """Unregister all hotkeys"""
+        for hotkey in self.registered_hotkeys.copy():
+            try:
+                keyboard.remove_hotkey(hotkey)
+                self.registered_hotkeys.remove(hotkey)
+            except Exception as e:
+                logging.error(f"Failed to unregister hotkey {hotkey}: {e}")
+
+
+# SendInput structures (defined with plain ctypes so the module still imports off Windows)
+ULONG_PTR = ctypes.c_size_t
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_LEFTDOWN = 0x0002
+MOUSEEVENTF_LEFTUP = 0x0004
+MOUSEEVENTF_RIGHTDOWN = 0x0008
+MOUSEEVENTF_RIGHTUP = 0x0010
+MOUSEEVENTF_MIDDLEDOWN = 0x0020
+MOUSEEVENTF_MIDDLEUP = 0x0040
+MOUSEEVENTF_XDOWN = 0x0080
+MOUSEEVENTF_XUP = 0x0100
+MOUSEEVENTF_WHEEL = 0x0800
+MOUSEEVENTF_VIRTUALDESK = 0x4000
+MOUSEEVENTF_ABSOLUTE = 0x8000
+
+KEYEVENTF_KEYUP = 0x0002
+
+# Back/forward buttons: mouseData of MOUSEEVENTF_X* and the high word of WM_XBUTTON* wParam
+XBUTTON1 = 0x0001
+XBUTTON2 = 0x0002
+
+# Window messages of the back/forward buttons, which older win32con builds do not define
+WM_XBUTTONDOWN = 0x020B
+WM_XBUTTONUP = 0x020C
+WM_XBUTTONDBLCLK = 0x020D
+MK_XBUTTON1 = 0x0020
+MK_XBUTTON2 = 0x0040
+
+# Button name -> (down flag, up flag, mouseData)
+MOUSE_BUTTON_FLAGS = {
+    'left': (MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP, 0),
+    'right': (MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP, 0),
+    'middle': (MOUSEEVENTF_MIDDLEDOWN, MOUSEEVENTF_MIDDLEUP, 0),
+    'x': (MOUSEEVENTF_XDOWN, MOUSEEVENTF_XUP, XBUTTON1),
+    'x2': (MOUSEEVENTF_XDOWN, MOUSEEVENTF_XUP, XBUTTON2),
+}
+
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [('dx', ctypes.c_long),
+                ('dy', ctypes.c_long),
+                ('mouseData', ctypes.c_ulong),
+                ('dwFlags', ctypes.c_ulong),
+                ('time', ctypes.c_ulong),
+                ('dwExtraInfo', ULONG_PTR)]
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [('wVk', ctypes.c_ushort),
+                ('wScan', ctypes.c_ushort),
+                ('dwFlags', ctypes.c_ulong),
+                ('time', ctypes.c_ulong),
+                ('dwExtraInfo', ULONG_PTR)]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [('mi', MOUSEINPUT),
+                ('ki', KEYBDINPUT)]
+
+
+class INPUT(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_ulong),
+                ('union', _INPUTUNION)]
+
+
+class PyAutoGUIInputBackend:
+    """Fallback input backend using pyautogui without its per-call pause"""
+    
+    name = 'pyautogui'
+    controls_cursor = True
+    
+    def get_position(self):
+        return tuple(pyautogui.position())
+    
+    def move(self, x, y):
+        pyautogui.moveTo(x, y, _pause=False)
+    
+    def click_many(self, points, button='left', clicks=1):
+        """Click each (x, y) point; returns the number of clicks performed"""
+        count = 0
+        for x, y in points:
+            pyautogui.click(x, y, clicks=clicks, button=button, _pause=False)
+            count += 1
+        return count
+    
+    def mouse_button(self, x, y, button='left', down=True):
+        if down:
+            pyautogui.mouseDown(x, y, button=button, _pause=False)
+        else:
+            pyautogui.mouseUp(x, y, button=button, _pause=False)
+    
+    def scroll(self, x, y, amount):
+        """Scroll by amount in wheel units (120 per notch)"""
+        pyautogui.scroll(amount, x, y, _pause=False)
+    
+    def resolve_key(self, key):
+        return key
+    
+    def key(self, key, down=True):
+        if down:
+            pyautogui.keyDown(key, _pause=False)
+        else:
+            pyautogui.keyUp(key, _pause=False)
+
+
+class SendInputBackend:
+    """Native Windows backend that packs a whole batch into one SendInput call"""
+    
+    name = 'sendinput'
+    controls_cursor = True
+    
+    def __init__(self):
+        self._user32 = ctypes.windll.user32
+        self._input_size = ctypes.sizeof(INPUT)
+        self.refresh_screen_metrics()
+    
+    @classmethod
+    def is_available(cls):
+        return os.name == 'nt' and hasattr(ctypes, 'windll')
+    
+    def refresh_screen_metrics(self):
+        """Cache virtual desktop geometry used to normalize absolute coordinates"""
+        self._left = win32api.GetSystemMetrics(win32con.SM_XVIRTUALSCREEN)
+        self._top = win32api.GetSystemMetrics(win32con.SM_YVIRTUALSCREEN)
+        self._width = max(1, win32api.GetSystemMetrics(win32con.SM_CXVIRTUALSCREEN) - 1)
+        self._height = max(1, win32api.GetSystemMetrics(win32con.SM_CYVIRTUALSCREEN) - 1)
+    
+    def _normalize(self, x, y):
+        return ((x - self._left) * 65535 // self._width,
+                (y - self._top) * 65535 // self._height)
+    
+    def get_position(self):
+        return tuple(win32api.GetCursorPos())
+    
+    def move(self, x, y):
+        self.click_many([(x, y)], clicks=0)
+    
+    def click_many(self, points, button='left', clicks=1):
+        """Inject move/down/up events for every point in a single SendInput call"""
+        down_flag, up_flag, button_data = self._button_flags(button)
+        points = list(points)
+        if not points:
+            return 0
+        
+        events_per_point = 1 + 2 * clicks
+        inputs = (INPUT * (len(points) * events_per_point))()
+        
+        i = 0
+        for x, y in points:
+            self._fill_move(inputs[i], x, y)
+            i += 1
+            for _ in range(clicks):
+                inputs[i].type = INPUT_MOUSE
+                inputs[i].union.mi.mouseData = button_data
+                inputs[i].union.mi.dwFlags = down_flag
+                inputs[i + 1].type = INPUT_MOUSE
+                inputs[i + 1].union.mi.mouseData = button_data
+                inputs[i + 1].union.mi.dwFlags = up_flag
+                i += 2
+        
+        self._send(inputs)
+        return len(points)
+    
+    def mouse_button(self, x, y, button='left', down=True):
+        down_flag, up_flag, button_data = self._button_flags(button)
+        inputs = (INPUT * 2)()
+        self._fill_move(inputs[0], x, y)
+        inputs[1].type = INPUT_MOUSE
+        inputs[1].union.mi.mouseData = button_data
+        inputs[1].union.mi.dwFlags = down_flag if down else up_flag
+        self._send(inputs)
+    
+    def scroll(self, x, y, amount):
+        """Scroll by amount in wheel units (120 per notch)"""
+        inputs = (INPUT * 2)()
+        self._fill_move(inputs[0], x, y)
+        inputs[1].type = INPUT_MOUSE
+        inputs[1].union.mi.mouseData = int(amount) & 0xFFFFFFFF
+        inputs[1].union.mi.dwFlags = MOUSEEVENTF_WHEEL
+        self._send(inputs)
+    
+    def resolve_key(self, key):
+        """(virtual key, scan code) for a key name, or the name itself when it has no virtual key"""
+        vk = get_virtual_key_code(key)
+        if vk is None:
+            return key
+        return vk, win32api.MapVirtualKey(vk, 0)
+    
+    def key(self, key, down=True):
+        """Press or release a key name or a code pair from resolve_key"""
+        code = key if isinstance(key, tuple) else self.resolve_key(key)
+        if not isinstance(code, tuple):
+            # Keys without a known virtual key code go through pyautogui
+            PyAutoGUIInputBackend.key(self, code, down)
+            return
+        inputs = (INPUT * 1)()
+        inputs[0].type = INPUT_KEYBOARD
+        inputs[0].union.ki.wVk, inputs[0].union.ki.wScan = code
+        inputs[0].union.ki.dwFlags = 0 if down else KEYEVENTF_KEYUP
+        self._send(inputs)
+    
+    @staticmethod
+    def _button_flags(button):
+        if button not in MOUSE_BUTTON_FLAGS:
+            raise ValueError(f"Unknown mouse button: {button}")
+        return MOUSE_BUTTON_FLAGS[button]
+    
+    def _fill_move(self, event, x, y):
+        dx, dy = self._normalize(x, y)
+        event.type = INPUT_MOUSE
+        event.union.mi.dx = dx
+        event.union.mi.dy = dy
+        event.union.mi.dwFlags = MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE | MOUSEEVENTF_VIRTUALDESK
+    
+    def _send(self, inputs):
+        sent = self._user32.SendInput(len(inputs), inputs, self._input_size)
+        if sent != len(inputs):
+            raise OSError(f"SendInput injected {sent}/{len(inputs)} events")
+
+
+class RecordingInputBackend:
+    """In-memory backend that records injected events, for headless benchmarking"""
+    
+    name = 'recording'
+    controls_cursor = False
+    
+    def __init__(self, max_events=100000):
+        self.events = collections.deque(maxlen=max_events)
+        self.position = (0, 0)
+        self.submit_calls = 0
+        self.event_count = 0
+    
+    def get_position(self):
+        return self.position
+    
+    def move(self, x, y):
+        self.submit_calls += 1
+        self._record('move', x, y)
+    
+    def click_many(self, points, button='left', clicks=1):
+        self.submit_calls += 1
+        count = 0
+        for x, y in points:
+            self._record('move', x, y)
+            for _ in range(clicks):
+                self._record('down', x, y, button)
+                self._record('up', x, y, button)
+            count += 1
+        return count
+    
+    def mouse_button(self, x, y, button='left', down=True):
+        self.submit_calls += 1
+        self._record('down' if down else 'up', x, y, button)
+    
+    def scroll(self, x, y, amount):
+        self.submit_calls += 1
+        self._record('scroll', x, y, amount)
+    
+    def resolve_key(self, key):
+        return key
+    
+    def key(self, key, down=True):
+        self.submit_calls += 1
+        self._record('key_down' if down else 'key_up', None, None, key)
+    
+    def _record(self, kind, x, y, button=None):
+        if x is not None:
+            self.position = (x, y)
+        self.event_count += 1
+        self.events.append((time.perf_counter(), kind, x, y, button))
+    
+    def reset(self):
+        self.events.clear()
+        self.submit_calls = 0
+        self.event_count = 0
+
+
+class WindowInputBackend:
+    """Backend that posts events to one window, translating screen points to its client area
+    
+    origin is the screen point that maps to client (0, 0), normally the client origin
+    of the window a macro was recorded against, so the same macro can drive several
+    windows of one application wherever they are on screen.
+    """
+    
+    name = 'window'
+    controls_cursor = False
+    
+    def __init__(self, hwnd, origin=(0, 0), message_sender=None):
+        self.hwnd = hwnd
+        self.origin = origin
+        self.message_sender = message_sender or WindowMessageSender()
+        self.position = (0, 0)
+        self._key_state = 0  # MK_* flags of the buttons currently held
+    
+    def get_position(self):
+        return self.position
+    
+    def _client(self, x, y):
+        self.position = (x, y)
+        return x - self.origin[0], y - self.origin[1]
+    
+    def _target(self, x, y):
+        """(window, client x, client y) of the child control under the point in this window"""
+        return self.message_sender._resolve_click_target(self.hwnd, *self._client(x, y), False)
+    
+    def move(self, x, y):
+        target, cx, cy = self._target(x, y)
+        self.message_sender.move(target, cx, cy, self._key_state)
+    
+    def click_many(self, points, button='left', clicks=1):
+        count = 0
+        for x, y in points:
+            target, cx, cy = self._target(x, y)
+            self.message_sender.click(target, cx, cy, button, clicks, screen_coords=False)
+            count += 1
+        return count
+    
+    def mouse_button(self, x, y, button='left', down=True):
+        target, cx, cy = self._target(x, y)
+        flag = self.message_sender.button(target, cx, cy, button, down, self._key_state)
+        self._key_state = self._key_state | flag if down else self._key_state & ~flag
+    
+    def scroll(self, x, y, amount):
+        cx, cy = self._client(x, y)
+        self.message_sender.scroll(self.hwnd, cx, cy, amount, self._key_state)
+    
+    def resolve_key(self, key):
+        """(virtual key, scan code) for a key name; raises ValueError when it cannot be posted"""
+        vk = get_virtual_key_code(key)
+        if vk is None:
+            raise ValueError(f"Unknown key: {key}")
+        return vk, win32api.MapVirtualKey(vk, 0)
+    
+    def key(self, key, down=True):
+        vk, scan_code = key if isinstance(key, tuple) else self.resolve_key(key)
+        self.message_sender.key(self.hwnd, vk, scan_code, down)
+
+
+def create_input_backend(name=None):
+    """Create an input backend by name, preferring native SendInput when available"""
+    if name == 'recording':
+        return RecordingInputBackend()
+    if name in (None, 'sendinput') and SendInputBackend.is_available():
+        try:
+            return SendInputBackend()
+        except Exception as e:
+            logging.error(f"SendInput backend unavailable, falling back to pyautogui: {e}")
+    return PyAutoGUIInputBackend()
+
+
+class MouseHandler:
+    """Handle mouse operations with optimizations"""
+    
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else create_input_backend()
+        self._position_cache = TTLCache(maxsize=1, ttl=0.05)  # Cache position for 50ms
+    
+    def get_mouse_position(self, force_update=False):
+        """Get mouse position with caching"""
+        if not force_update:
+            position = self._position_cache.get('position')
+            if position is not None:
+                return position
+        
+        try:
+            position = self.backend.get_position()
+            self._position_cache.set('position', position)
+            return position
+        except Exception as e:
+            logging.error(f"Error getting mouse position: {e}")
+            return (0, 0)
+    
+    def click_at_position(self, x, y, button='left', clicks=1):
+        """Optimized click operation"""
+        return self.click_many([(x, y)], button, clicks) == 1
+    
+    def click_many(self, positions, button='left', clicks=1):
+        """Click a batch of positions in one backend submission; returns clicks performed"""
+        positions = list(positions)
+        try:
+            if self.failsafe_triggered():
+                logging.warning("Failsafe triggered: mouse in a screen corner, batch skipped")
+                return 0
+            return self.backend.click_many(positions, button, clicks)
+        except Exception as e:
+            logging.error(f"Error clicking batch of {len(positions)} at {positions[:1]}: {e}")
+            return 0
+    
+    def get_cache_stats(self):
+        """Return position cache metrics"""
+        return self._position_cache.get_stats()
+    
+    def failsafe_triggered(self):
+        """Cheap once-per-batch replacement for pyautogui's per-call failsafe"""
+        if not self.backend.controls_cursor or not getattr(pyautogui, 'FAILSAFE', False):
+            return False
+        try:
+            position = self.backend.get_position()
+        except Exception:
+            return False
+        return tuple(position) in getattr(pyautogui, 'FAILSAFE_POINTS', [(0, 0)])
+
+
+class ClickJob:
+    """One independently scheduled click or key press job"""
+    
+    _ids = itertools.count(1)
+    FIELDS = ('name', 'action_type', 'target_window', 'x', 'y', 'button', 'clicks', 'key',
+              'interval', 'repeat', 'delivery_mode')
+    
+    def __init__(self, name='', action_type='mouse', target_window='', x=0, y=0, button='left',
+                 clicks=1, key='space', interval=1.0, repeat=0, delivery_mode='foreground'):
+        self.job_id = next(ClickJob._ids)
+        self._configure(name, action_type, target_window, x, y, button, clicks, key, interval, repeat, delivery_mode)
+        self.resolver = None  # Per-job TargetWindowResolver, assigned by the owner
+        self.generation = 0  # Invalidates stale queue entries after remove/re-add
+        self.reset_stats()
+    
+    def _configure(self, name, action_type, target_window, x, y, button, clicks, key, interval, repeat, delivery_mode):
+        self.name = name or f"Job {self.job_id}"
+        self.action_type = action_type
+        self.target_window = target_window
+        self.x = int(x)
+        self.y = int(y)
+        self.button = button
+        self.clicks = int(clicks)
+        self.key = key
+        self.interval = max(0.001, float(interval))
+        self.repeat = int(repeat)  # 0 = run until stopped
+        self.delivery_mode = delivery_mode
+    
+    def update(self, data):
+        """Apply settings from a job dictionary, keeping the job's identity and statistics"""
+        settings = self.to_dict()
+        settings.update((key, value) for key, value in data.items() if key in self.FIELDS)
+        self._configure(**settings)
+    
+    def reset_stats(self):
+        self.run_count = 0
+        self.error_count = 0
+        self.started_at = None
+        self.last_run_at = None
+        self.finished = False
+        self._lateness_sum = 0.0
+        self._lateness_max = 0.0
+    
+    def record_run(self, now, lateness, success):
+        if self.started_at is None:
+            self.started_at = now
+        self.last_run_at = now
+        self.run_count += 1
+        if not success:
+            self.error_count += 1
+        self._lateness_sum += lateness
+        if lateness > self._lateness_max:
+            self._lateness_max = lateness
+    
+    def get_stats(self, now):
+        # Up to the last run, so the rate is not understated between runs or after stopping
+        elapsed = self.last_run_at - self.started_at if self.started_at is not None else 0.0
+        return {
+            'runs': self.run_count,
+            'errors': self.error_count,
+            'achieved_rate': (self.run_count - 1) / elapsed if elapsed > 0 and self.run_count > 1 else 0.0,
+            'target_rate': 1.0 / self.interval,
+            'jitter_mean_ms': self._lateness_sum / self.run_count * 1000 if self.run_count else 0.0,
+            'jitter_max_ms': self._lateness_max * 1000,
+            'finished': self.finished
+        }
+    
+    def describe(self):
+        if self.action_type == 'mouse':
+            kind = "Double click" if self.clicks == 2 else "Click"
+            return f"{kind} {self.button} ({self.x}, {self.y})"
+        return f"Key {self.key}"
+    
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{key: value for key, value in data.items() if key in cls.FIELDS})
+
+
+class JobScheduler:
+    """Drive many jobs from a single thread using a deadline-ordered priority queue"""
+    
+    def __init__(self, execute, clock=None, spin_threshold=0.002):
+        self._execute = execute  # Callable(job) -> bool
+        self._clock = clock or time.perf_counter
+        self.spin_threshold = spin_threshold
+        self.jobs = {}
+        self._queue = []  # (deadline, sequence, generation, job)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._dispatching = None  # Job popped from the queue and not yet requeued
+        self._remaining = {}  # Job id -> seconds to its next deadline when last stopped
+        self._thread = None
+        self.running = False
+        self.dispatch_stats = LatencyStats()
+    
+    def add_job(self, job):
+        with self._condition:
+            job.generation += 1
+            self.jobs[job.job_id] = job
+            if self.running:
+                job.reset_stats()
+                self._push(job, self._clock())
+                self._condition.notify()
+    
+    def update_job(self, job_id, data):
+        """Change a job's settings in place without resetting its statistics; returns the job"""
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            interval = job.interval
+            was_finished = job.finished
+            job.update(data)
+            job.finished = bool(job.repeat and job.run_count >= job.repeat)
+            
+            # A job being dispatched is requeued by the scheduler thread with its new interval
+            if self.running and job is not self._dispatching and not job.finished and (
+                    job.interval != interval or was_finished):
+                job.generation += 1
+                self._push(job, self._clock() + (job.interval if job.run_count else 0.0))
+                self._condition.notify()
+            return job
+    
+    def reorder(self, job_ids):
+        """Put jobs in the given order (e.g. that of a profile); jobs not listed keep their place at the end"""
+        with self._condition:
+            ordered = {job_id: self.jobs[job_id] for job_id in job_ids if job_id in self.jobs}
+            ordered.update(self.jobs)
+            self.jobs = ordered
+    
+    def remove_job(self, job_id):
+        with self._condition:
+            job = self.jobs.pop(job_id, None)
+            if job is not None:
+                job.generation += 1  # Queue entries are discarded lazily
+                self._condition.notify()
+            return job
+    
+    def start(self, resume=False):
+        """Start all jobs afresh, or with resume continue where stop() left them
+        
+        Resumed jobs keep their runs and statistics, and their next deadline is
+        as far away as it was when they were stopped; jobs added since start afresh.
+        """
+        with self._condition:
+            if self.running:
+                return
+            self.running = True
+            self._queue = []
+            remaining = self._remaining if resume else {}
+            if not resume:
+                self.dispatch_stats.reset()
+            now = self._clock()
+            for job in self.jobs.values():
+                if job.job_id not in remaining:
+                    job.reset_stats()
+                    self._push(job, now)
+                elif not job.finished:
+                    self._push(job, now + remaining[job.job_id])
+        
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        with self._condition:
+            was_running = self.running
+            self.running = False
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        if was_running:
+            with self._condition:
+                self._remaining = self._time_to_deadlines()
+    
+    def _time_to_deadlines(self):
+        """Seconds from now to each job's next deadline (0 when already due)"""
+        now = self._clock()
+        remaining = {}
+        for deadline, _, generation, job in self._queue:
+            if generation == job.generation and job.job_id in self.jobs:
+                remaining[job.job_id] = max(0.0, deadline - now)
+        for job in self.jobs.values():
+            if job.job_id not in remaining:
+                # Finished, or dispatched while stopping and so never requeued
+                last_run = job.last_run_at
+                remaining[job.job_id] = max(0.0, last_run + job.interval - now) if last_run is not None else 0.0
+        return remaining
+    
+    def active_count(self):
+        return sum(1 for job in self.jobs.values() if not job.finished)
+    
+    def _push(self, job, deadline):
+        heapq.heappush(self._queue, (deadline, next(self._sequence), job.generation, job))
+    
+    def _next_due(self):
+        """Wait for the earliest deadline; returns (deadline, job) or None when stopped"""
+        with self._condition:
+            while True:
+                if not self.running:
+                    return None
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                
+                deadline, _, generation, job = self._queue[0]
+                if generation != job.generation or job.job_id not in self.jobs:
+                    heapq.heappop(self._queue)  # Removed or re-added job
+                    continue
+                
+                remaining = deadline - self._clock()
+                if remaining > self.spin_threshold:
+                    # Woken early if a job with a nearer deadline is added
+                    self._condition.wait(remaining - self.spin_threshold)
+                    continue
+                
+                heapq.heappop(self._queue)
+                self._dispatching = job
+                return deadline, job
+    
+    def _run(self):
+        with HighResolutionTimer():
+            while True:
+                due = self._next_due()
+                if due is None:
+                    break
+                deadline, job = due
+                
+                # Final spin for sub-millisecond accuracy
+                now = self._clock()
+                while now < deadline:
+                    now = self._clock()
+                
+                dispatch_start = self._clock()
+                try:
+                    success = bool(self._execute(job))
+                except Exception as e:
+                    logging.error(f"Error running job '{job.name}': {e}")
+                    success = False
+                dispatch_end = self._clock()
+                
+                job.record_run(now, now - deadline, success)
+                
+                with self._condition:
+                    self._dispatching = None
+                    if job.repeat and job.run_count >= job.repeat:
+                        job.finished = True
+                    elif self.running and job.job_id in self.jobs:
+                        next_deadline = deadline + job.interval
+                        if now - deadline > job.interval:
+                            # More than a full cycle behind: resync instead of bursting
+                            next_deadline = now + job.interval
+                        self._push(job, next_deadline)
+                
+                # Scheduler bookkeeping time, excluding the action itself
+                self.dispatch_stats.record(
+                    'dispatch', (dispatch_start - now) + (self._clock() - dispatch_end))
+    
+    def get_stats(self):
+        return {
+            'jobs': len(self.jobs),
+            'active': self.active_count(),
+            'dispatch': self.dispatch_stats.get_stats().get('dispatch', {})
+        }
+
+
+# Compact macro representation: event type codes, button codes and binary file format
+MACRO_INPUT_TYPES = ('move', 'click', 'mouse_down', 'mouse_up', 'scroll', 'key_down', 'key_up')
+# Control flow, evaluated at playback: repeat/loop/sub open a block closed by end
+MACRO_CONTROL_TYPES = ('repeat', 'loop', 'end', 'sub', 'call', 'wait')
+MACRO_EVENT_TYPES = MACRO_INPUT_TYPES + MACRO_CONTROL_TYPES
+MACRO_EVENT_CODES = {name: code for code, name in enumerate(MACRO_EVENT_TYPES)}
+MACRO_FIRST_CONTROL_CODE = len(MACRO_INPUT_TYPES)
+# Events whose arg holds an index into the key/name table
+MACRO_NAMED_CODES = frozenset(MACRO_EVENT_CODES[name] for name in ('key_down', 'key_up', 'sub', 'call'))
+MACRO_BUTTONS = ('left', 'right', 'middle', 'x', 'x2')
+MACRO_BUTTON_CODES = {name: code for code, name in enumerate(MACRO_BUTTONS)}
+
+MACRO_FILE_MAGIC = b'ACMF'
+# Version 2 adds control flow events and 3 the recording origin; files are written
+# with the lowest version that holds their content, so older readers still open them
+MACRO_FILE_VERSION = 3
+MACRO_FILE_HEADER = struct.Struct('<4sHHI')  # magic, version, flags, reserved
+MACRO_FLAG_ORIGIN = 0x1  # The header is followed by MACRO_ORIGIN
+MACRO_ORIGIN = struct.Struct('<ii')  # Screen position of the recorded window's client (0, 0)
+MACRO_CHUNK_MAGIC = b'CHNK'
+MACRO_CHUNK_HEADER = struct.Struct('<4sIqiiBBBBI')  # magic, count, base t/x/y, column widths, key table size
+MACRO_CHUNK_SIZE = 65536
+# On disk the arg of a named event packs (scan code << 16 | index into the chunk's key table)
+MACRO_MAX_SCAN_CODE = 0xFFFF
+MACRO_MAX_CHUNK_KEYS = 0x10000
+
+_UNSIGNED_FORMATS = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+_SIGNED_FORMATS = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
+
+
+# bytes.translate table marking events whose arg refers to the key/name table with 1
+_NAMED_CODE_FLAGS = bytes(int(code in MACRO_NAMED_CODES) for code in range(256))
+
+
+def _column_width(minimum, maximum):
+    """Smallest fixed width (bytes) that holds every value of a column"""
+    for width in (1, 2, 4, 8):
+        bits = width * 8
+        if minimum >= 0 and maximum < (1 << bits):
+            return width
+        if -(1 << (bits - 1)) <= minimum and maximum < (1 << (bits - 1)):
+            return width
+    raise OverflowError("Macro column value out of range")
+
+
+def _column_format(width, minimum):
+    return _UNSIGNED_FORMATS[width] if minimum >= 0 else _SIGNED_FORMATS[width]
+
+
+def _deltas(values, start, end):
+    """Delta-encode values[start:end] relative to the first element"""
+    out = array('q', [0])
+    out.extend(map(operator.sub, values[start + 1:end], values[start:end - 1]))
+    return out
+
+
+def _pad8(size):
+    return (-size) % 8
+
+
+def _macro_file_header(version, origin=None):
+    """File header bytes, followed by the recording origin when there is one"""
+    if origin is None:
+        return MACRO_FILE_HEADER.pack(MACRO_FILE_MAGIC, version, 0, 0)
+    return MACRO_FILE_HEADER.pack(MACRO_FILE_MAGIC, 3, MACRO_FLAG_ORIGIN, 0) + MACRO_ORIGIN.pack(*origin)
+
+
+class MacroStore:
+    """Struct-of-arrays macro storage: one typed array per field instead of a dict per event"""
+    
+    def __init__(self):
+        self.types = array('B')
+        self.t_us = array('q')  # Microseconds since recording start
+        self.x = array('i')
+        self.y = array('i')
+        self.arg = array('i')  # Button code, scroll delta (1/120 notch), control operand or key index
+        self.scan_codes = array('H')  # Hardware scan code of key events, 0 for other events
+        self.keys = []
+        self._key_index = {}
+        self.origin = None  # Screen position of the recorded window's client (0, 0), if known
+    
+    def __len__(self):
+        return len(self.types)
+    
+    def __bool__(self):
+        return len(self.types) > 0
+    
+    def __iter__(self):
+        for i in range(len(self.types)):
+            yield self[i]
+    
+    def __getitem__(self, i):
+        """Materialize one event as an action dict"""
+        if i < 0:
+            i += len(self.types)
+        event_type = MACRO_EVENT_TYPES[self.types[i]]
+        t = self.t_us[i] / 1e6
+        delay = (self.t_us[i] - self.t_us[i - 1]) / 1e6 if i > 0 else t
+        action = {'type': event_type}
+        
+        if event_type in ('key_down', 'key_up'):
+            action['key'] = self.keys[self.arg[i]]
+            action['scan_code'] = self.scan_codes[i]
+        elif event_type in MACRO_CONTROL_TYPES:
+            if event_type in ('sub', 'call'):
+                action['name'] = self.keys[self.arg[i]]
+            elif event_type == 'repeat':
+                action['count'] = self.arg[i]
+            elif event_type in ('loop', 'wait'):
+                action['seconds'] = self.arg[i] / 1000
+        else:
+            action['x'] = self.x[i]
+            action['y'] = self.y[i]
+            if event_type == 'scroll':
+                action['delta'] = self.arg[i] / 120
+            elif event_type != 'move':
+                action['button'] = MACRO_BUTTONS[self.arg[i]]
+        
+        action['t'] = t
+        action['delay'] = delay
+        return action
+    
+    def _intern_key(self, key):
+        index = self._key_index.get(key)
+        if index is None:
+            index = self._key_index[key] = len(self.keys)
+            self.keys.append(key)
+        return index
+    
+    def append(self, action, t=None):
+        """Append an action dict; t (seconds) defaults to action['t'] or previous t + delay"""
+        event_type = action['type']
+        code = MACRO_EVENT_CODES.get(event_type)
+        if code is None:
+            raise ValueError(f"Unknown macro action type: {event_type}")
+        
+        if t is None:
+            t = action.get('t')
+        if t is None:
+            previous = self.t_us[-1] / 1e6 if self.t_us else 0.0
+            t = previous + action.get('delay', 0.0)
+        
+        scan_code = 0
+        if event_type in ('key_down', 'key_up'):
+            x = y = 0
+            key = action['key']
+            if not isinstance(key, str) or not key:
+                raise ValueError(f"Invalid key: {key!r}")
+            scan_code = int(action.get('scan_code') or 0)
+            if not 0 <= scan_code <= MACRO_MAX_SCAN_CODE:
+                raise ValueError(f"Invalid scan code: {scan_code}")
+            arg = self._intern_key(key)
+        elif event_type in MACRO_CONTROL_TYPES:
+            x = y = 0
+            arg = self._control_arg(event_type, action)
+        else:
+            x = int(action['x'])
+            y = int(action['y'])
+            if event_type == 'scroll':
+                arg = int(round(action['delta'] * 120))
+            elif event_type == 'move':
+                arg = 0
+            else:
+                arg = MACRO_BUTTON_CODES.get(action.get('button', 'left'))
+                if arg is None:
+                    raise ValueError(f"Unknown mouse button: {action.get('button')!r}")
+        
+        self.types.append(code)
+        self.t_us.append(int(round(t * 1e6)))
+        self.x.append(x)
+        self.y.append(y)
+        self.arg.append(arg)
+        self.scan_codes.append(scan_code)
+    
+    def _control_arg(self, event_type, action):
+        """Operand of a control flow event: repeat count (0 = until stopped), milliseconds or name index"""
+        if event_type in ('sub', 'call'):
+            name = action['name']
+            if not isinstance(name, str) or not name or '\n' in name:
+                raise ValueError(f"Invalid sub-macro name: {name!r}")
+            return self._intern_key(name)
+        if event_type == 'repeat':
+            count = int(action['count'])
+            if count < 0:
+                raise ValueError(f"Invalid repeat count: {count}")
+            return count
+        if event_type in ('loop', 'wait'):
+            milliseconds = int(round(float(action['seconds']) * 1000))
+            if milliseconds < 0 or (event_type == 'loop' and milliseconds == 0):
+                raise ValueError(f"Invalid {event_type} time: {action['seconds']}")
+            return milliseconds
+        return 0
+    
+    def extend(self, actions):
+        for action in actions:
+            self.append(action)
+    
+    def insert(self, index, action):
+        """Insert an action dict before index, timed at the preceding event (e.g. a control flow event)"""
+        store = MacroStore()
+        store.keys, store._key_index = self.keys, self._key_index
+        if self.t_us:
+            t_us = self.t_us[index - 1] if index > 0 else self.t_us[0]
+        else:
+            t_us = 0
+        store.append(action, t=t_us / 1e6)
+        for column in ('types', 't_us', 'x', 'y', 'arg', 'scan_codes'):
+            getattr(self, column).insert(index, getattr(store, column)[0])
+    
+    def has_control_flow(self):
+        return bool(self.types) and max(self.types) >= MACRO_FIRST_CONTROL_CODE
+    
+    @classmethod
+    def from_actions(cls, actions):
+        """Build a store from a list of action dicts (e.g. a legacy JSON macro); raises ValueError if malformed"""
+        store = cls()
+        for index, action in enumerate(actions):
+            try:
+                store.append(action)
+            except KeyError as e:
+                raise ValueError(f"Macro event {index + 1}: missing {e}") from None
+            except (TypeError, ValueError, AttributeError) as e:
+                raise ValueError(f"Macro event {index + 1}: {e}") from None
+        return store
+    
+    def to_actions(self):
+        return list(self)
+    
+    def find_time(self, seconds):
+        """Index of the first event at or after the given time offset"""
+        return bisect.bisect_left(self.t_us, int(round(seconds * 1e6)))
+    
+    def select(self, indices):
+        """Return a new store containing only the events at the given indices"""
+        store = MacroStore()
+        store.types = array('B', (self.types[i] for i in indices))
+        store.t_us = array('q', (self.t_us[i] for i in indices))
+        store.x = array('i', (self.x[i] for i in indices))
+        store.y = array('i', (self.y[i] for i in indices))
+        store.arg = array('i', (self.arg[i] for i in indices))
+        store.scan_codes = array('H', (self.scan_codes[i] for i in indices))
+        store.keys = list(self.keys)
+        store._key_index = dict(self._key_index)
+        store.origin = self.origin
+        return store
+    
+    def memory_usage(self):
+        """Approximate bytes held by the column arrays"""
+        return sum(column.itemsize * len(column) for column in
+                   (self.types, self.t_us, self.x, self.y, self.arg, self.scan_codes))
+    
+    # Binary file format ---------------------------------------------------
+    
+    def save(self, filename, chunk_size=MACRO_CHUNK_SIZE):
+        """Write the versioned binary format: a file header followed by chunks"""
+        with open(filename, 'wb') as f:
+            f.write(_macro_file_header(2 if self.has_control_flow() else 1, self.origin))
+            for start in range(0, len(self), chunk_size):
+                self._write_chunk(f, start, min(len(self), start + chunk_size))
+    
+    def _write_chunk(self, f, start, end):
+        """Write events [start, end) as delta-encoded fixed-width columns"""
+        dt = _deltas(self.t_us, start, end)
+        dx = _deltas(self.x, start, end)
+        dy = _deltas(self.y, start, end)
+        
+        # Keys are re-indexed per chunk so every chunk decodes on its own
+        chunk_keys = []
+        chunk_key_index = {}
+        arg = array('q')
+        for i in range(start, end):
+            value = self.arg[i]
+            if self.types[i] in MACRO_NAMED_CODES:
+                key = self.keys[value]
+                index = chunk_key_index.get(key)
+                if index is None:
+                    if len(chunk_keys) == MACRO_MAX_CHUNK_KEYS:
+                        raise ValueError(f"More than {MACRO_MAX_CHUNK_KEYS} key and sub-macro names in one chunk")
+                    index = chunk_key_index[key] = len(chunk_keys)
+                    chunk_keys.append(key)
+                value = (self.scan_codes[i] << 16) | index
+            arg.append(value)
+        
+        key_table = '\n'.join(chunk_keys).encode('utf-8')
+        columns = [(self.types[start:end], 1, 0)]
+        for column in (dt, dx, dy, arg):
+            minimum, maximum = (min(column), max(column)) if column else (0, 0)
+            width = _column_width(minimum, maximum)
+            columns.append((array(_column_format(width, minimum), column), width, minimum))
+        
+        f.write(MACRO_CHUNK_HEADER.pack(
+            MACRO_CHUNK_MAGIC, end - start, self.t_us[start], self.x[start], self.y[start],
+            columns[1][1] | (columns[1][2] < 0) << 7,
+            columns[2][1] | (columns[2][2] < 0) << 7,
+            columns[3][1] | (columns[3][2] < 0) << 7,
+            columns[4][1] | (columns[4][2] < 0) << 7,
+            len(key_table)))
+        f.write(key_table)
+        f.write(b'\0' * _pad8(MACRO_CHUNK_HEADER.size + len(key_table)))
+        for column, _, _ in columns:
+            data = column.tobytes()
+            f.write(data)
+            f.write(b'\0' * _pad8(len(data)))
+    
+    @staticmethod
+    def is_binary_file(filename):
+        with open(filename, 'rb') as f:
+            return f.read(len(MACRO_FILE_MAGIC)) == MACRO_FILE_MAGIC
+    
+    @classmethod
+    def load(cls, filename):
+        """Load a binary macro by memory-mapping it and decoding columns in place"""
+        store = cls()
+        with open(filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= MACRO_FILE_HEADER.size:
+                cls._check_header(f.read())
+                return store
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    offset, store.origin = cls._check_header(view[:MACRO_FILE_HEADER.size + MACRO_ORIGIN.size])
+                    while offset < len(view):
+                        offset = store._read_chunk(view, offset)
+                finally:
+                    view.release()
+        return store
+    
+    @staticmethod
+    def _check_header(data):
+        """Validate the file header; returns (offset of the first chunk, recording origin or None)"""
+        magic, version, flags, _ = MACRO_FILE_HEADER.unpack(bytes(data[:MACRO_FILE_HEADER.size]))
+        if magic != MACRO_FILE_MAGIC:
+            raise ValueError("Not a binary macro file")
+        if version > MACRO_FILE_VERSION:
+            raise ValueError(f"Unsupported macro file version {version}")
+        if flags & MACRO_FLAG_ORIGIN:
+            end = MACRO_FILE_HEADER.size + MACRO_ORIGIN.size
+            if len(data) < end:
+                raise ValueError("Corrupt macro file: truncated header")
+            return end, MACRO_ORIGIN.unpack(bytes(data[MACRO_FILE_HEADER.size:end]))
+        return MACRO_FILE_HEADER.size, None
+    
+    def _read_chunk(self, view, offset):
+        """Decode one chunk starting at offset; returns the offset of the next chunk"""
+        magic, count, base_t, base_x, base_y, w_dt, w_dx, w_dy, w_arg, key_size = \
+            MACRO_CHUNK_HEADER.unpack_from(view, offset)
+        if magic != MACRO_CHUNK_MAGIC:
+            raise ValueError(f"Corrupt macro file: bad chunk at offset {offset}")
+        start = offset
+        offset += MACRO_CHUNK_HEADER.size
+        
+        key_table = bytes(view[offset:offset + key_size]).decode('utf-8')
+        chunk_keys = key_table.split('\n') if key_size else []
+        offset += key_size + _pad8(MACRO_CHUNK_HEADER.size + key_size)
+        
+        def column(width_flags):
+            nonlocal offset
+            width = width_flags & 0x7F
+            fmt = _SIGNED_FORMATS[width] if width_flags & 0x80 else _UNSIGNED_FORMATS[width]
+            size = count * width
+            values = view[offset:offset + size].cast(fmt)
+            offset += size + _pad8(size)
+            return values
+        
+        types = column(1)
+        dt, dx, dy, arg = column(w_dt), column(w_dx), column(w_dy), column(w_arg)
+        
+        # Prefix sums run in C via itertools.accumulate
+        self.types.extend(types)
+        self.t_us.extend(itertools.islice(itertools.accumulate(dt, initial=base_t), 1, None))
+        self.x.extend(itertools.islice(itertools.accumulate(dx, initial=base_x), 1, None))
+        self.y.extend(itertools.islice(itertools.accumulate(dy, initial=base_y), 1, None))
+        
+        # Named events split into a key index into self.keys and a scan code; they are
+        # found with bytes.find and the operands between them are copied in runs
+        remap = [self._intern_key(key) for key in chunk_keys]
+        named = bytes(types).translate(_NAMED_CODE_FLAGS)
+        first = len(self.scan_codes)
+        self.scan_codes.frombytes(bytes(2 * count))
+        copied = 0
+        i = named.find(1)
+        while i >= 0:
+            value = arg[i]
+            if (value & 0xFFFF) >= len(remap) or value >> 16 > MACRO_MAX_SCAN_CODE:
+                raise ValueError(f"Corrupt macro file: bad key reference in chunk at offset {start}")
+            self.arg.extend(arg[copied:i])
+            self.arg.append(remap[value & 0xFFFF])
+            self.scan_codes[first + i] = value >> 16
+            copied = i + 1
+            i = named.find(1, copied)
+        self.arg.extend(arg[copied:])
+        
+        for values in (types, dt, dx, dy, arg):
+            values.release()
+        return offset
+
+
+class MacroStreamWriter:
+    """Append events to a binary macro file one chunk at a time"""
+    
+    def __init__(self, filename, chunk_size=MACRO_CHUNK_SIZE, origin=None):
+        self.filename = filename
+        self.chunk_size = max(1, chunk_size)
+        self.origin = origin
+        self.count = 0
+        self._buffer = MacroStore()
+        self._last_t = 0.0
+        self._file = open(filename, 'wb')
+        self._file.write(_macro_file_header(1, origin))
+        self._control_flow = False
+    
+    def append(self, action, t=None):
+        """Buffer one event, writing a chunk to disk whenever the buffer is full"""
+        if t is None:
+            t = action.get('t')
+        if t is None:
+            t = self._last_t + action.get('delay', 0.0)
+        # Timestamps must be monotonic for delta encoding across late-arriving events
+        t = max(t, self._last_t)
+        self._last_t = t
+        
+        self._buffer.append(action, t=t)
+        self._control_flow = self._control_flow or action['type'] in MACRO_CONTROL_TYPES
+        self.count += 1
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+    
+    def write_store(self, store):
+        """Write a whole MacroStore, bypassing per-event appends"""
+        if not store:
+            return
+        if store.t_us[0] / 1e6 < self._last_t:
+            raise ValueError("Macro events must be written in timestamp order")
+        self.flush()
+        self._control_flow = self._control_flow or store.has_control_flow()
+        for start in range(0, len(store), self.chunk_size):
+            store._write_chunk(self._file, start, min(len(store), start + self.chunk_size))
+        self.count += len(store)
+        self._last_t = store.t_us[-1] / 1e6
+    
+    def flush(self):
+        if self._buffer:
+            self._buffer._write_chunk(self._file, 0, len(self._buffer))
+            self._buffer = MacroStore()
+        self._file.flush()
+    
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            if self._control_flow and self.origin is None:
+                # A header with an origin already has a version that allows control flow
+                self._file.seek(0)
+                self._file.write(_macro_file_header(2))
+            self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class MacroFile:
+    """Lazy view of a binary macro file that decodes one chunk at a time"""
+    
+    def __init__(self, filename):
+        self.filename = filename
+        self._chunk_offsets = []
+        self._chunk_starts = []  # Index of the first event in each chunk
+        self._chunk_base_times = []  # Timestamp (us) of the first event in each chunk
+        self._chunk_end_times = {}  # Timestamp (us) of the last event of each chunk decoded so far
+        self._count = 0
+        self._cached_chunk = (None, None)
+        self.origin = None
+        self._scan_chunks()
+    
+    def _scan_chunks(self):
+        """Walk chunk headers only, so opening is fast regardless of file size"""
+        with open(self.filename, 'rb') as f:
+            offset, self.origin = MacroStore._check_header(f.read(MACRO_FILE_HEADER.size + MACRO_ORIGIN.size))
+            f.seek(offset)
+            while True:
+                header = f.read(MACRO_CHUNK_HEADER.size)
+                if len(header) < MACRO_CHUNK_HEADER.size:
+                    break
+                magic, count, base_t, _, _, w_dt, w_dx, w_dy, w_arg, key_size = MACRO_CHUNK_HEADER.unpack(header)
+                if magic != MACRO_CHUNK_MAGIC:
+                    raise ValueError(f"Corrupt macro file: bad chunk at offset {offset}")
+                
+                self._chunk_offsets.append(offset)
+                self._chunk_starts.append(self._count)
+                self._chunk_base_times.append(base_t)
+                self._count += count
+                
+                size = MACRO_CHUNK_HEADER.size + key_size + _pad8(MACRO_CHUNK_HEADER.size + key_size)
+                for width_flags in (1, w_dt, w_dx, w_dy, w_arg):
+                    column_size = count * (width_flags & 0x7F)
+                    size += column_size + _pad8(column_size)
+                offset += size
+                f.seek(offset)
+    
+    def __len__(self):
+        return self._count
+    
+    def __bool__(self):
+        return self._count > 0
+    
+    def _read_chunks(self, first_chunk=0):
+        with open(self.filename, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for chunk_index in range(first_chunk, len(self._chunk_offsets)):
+                        chunk = MacroStore()
+                        chunk._read_chunk(view, self._chunk_offsets[chunk_index])
+                        yield chunk_index, chunk
+                finally:
+                    view.release()
+    
+    def iter_chunks(self):
+        """Yield each chunk as a MacroStore; only one chunk is decoded at a time"""
+        for _, chunk in self._read_chunks():
+            yield chunk
+    
+    def __iter__(self):
+        previous_t_us = 0
+        for chunk in self.iter_chunks():
+            for i, t_us in enumerate(chunk.t_us):
+                action = chunk[i]
+                # Chunk-local delays don't know the previous chunk's last event
+                action['delay'] = (t_us - previous_t_us) / 1e6
+                previous_t_us = t_us
+                yield action
+    
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("macro event index out of range")
+        
+        chunk_index = bisect.bisect_right(self._chunk_starts, i) - 1
+        chunk = self._decode_chunk(chunk_index)
+        
+        local_index = i - self._chunk_starts[chunk_index]
+        action = chunk[local_index]
+        if local_index == 0 and i > 0:
+            # The delay needs the previous chunk's last timestamp; decoding that chunk
+            # through the cache would evict this one and decode both again next time
+            previous_end = self._chunk_end_times.get(chunk_index - 1)
+            if previous_end is None:
+                _, previous_chunk = next(self._read_chunks(chunk_index - 1))
+                previous_end = self._chunk_end_times[chunk_index - 1] = previous_chunk.t_us[-1]
+            action['delay'] = (chunk.t_us[0] - previous_end) / 1e6
+        return action
+    
+    def find_time(self, seconds):
+        """Index of the first event at or after the given time offset"""
+        t_us = int(round(seconds * 1e6))
+        chunk_index = max(0, bisect.bisect_right(self._chunk_base_times, t_us) - 1)
+        if chunk_index >= len(self._chunk_starts):
+            return self._count
+        chunk = self._decode_chunk(chunk_index)
+        return self._chunk_starts[chunk_index] + bisect.bisect_left(chunk.t_us, t_us)
+    
+    def chunk_containing(self, i):
+        """(index of its first event, decoded chunk) of the chunk holding event i; not cached"""
+        chunk_index = bisect.bisect_right(self._chunk_starts, i) - 1
+        _, chunk = next(self._read_chunks(chunk_index))
+        return self._chunk_starts[chunk_index], chunk
+    
+    def _decode_chunk(self, chunk_index):
+        cached_index, chunk = self._cached_chunk
+        if cached_index != chunk_index:
+            _, chunk = next(self._read_chunks(chunk_index))
+            self._cached_chunk = (chunk_index, chunk)
+            if chunk.t_us:
+                self._chunk_end_times[chunk_index] = chunk.t_us[-1]
+        return chunk
+    
+    def to_actions(self):
+        return list(self)
+    
+    def save(self, filename):
+        """Copy the underlying binary file"""
+        if os.path.abspath(filename) != os.path.abspath(self.filename):
+            shutil.copyfile(self.filename, filename)
+
+
+class MacroRecorder:
+    """Event-driven macro recorder built on global low-level mouse and keyboard hooks"""
+    
+    def __init__(self, clock=None, position_getter=None):
+        self._clock = clock or time.perf_counter
+        self._position_getter = position_getter or (lambda: tuple(win32api.GetCursorPos()))
+        self._mouse_events = collections.deque()
+        self._key_events = collections.deque()
+        self._start_time = None
+        self._writer = None
+        self._flush_event = threading.Event()
+        self._stop_flush = threading.Event()  # Set once the hooks are removed
+        self._flush_thread = None
+        self.chunk_size = MACRO_CHUNK_SIZE
+        self.recent_events = collections.deque(maxlen=1000)
+        self.event_count = 0
+        self.spill_file = None
+        self.is_recording = False
+        self.mouse_hooked = False
+    
+    def start(self, filename=None, chunk_size=None, origin=None):
+        """Install hooks and spill events to a binary macro file in chunks as they arrive
+        
+        origin is the screen position of the target window's client (0, 0), stored so
+        the macro can later be played relative to other windows.
+        """
+        self.discard()
+        if chunk_size is not None:
+            self.chunk_size = max(1, chunk_size)
+        if filename is None:
+            fd, filename = tempfile.mkstemp(prefix='autoclick_rec_', suffix='.acmacro')
+            os.close(fd)
+        
+        self.spill_file = filename
+        self._writer = MacroStreamWriter(filename, self.chunk_size, origin)
+        self._mouse_events.clear()
+        self._key_events.clear()
+        self.recent_events.clear()
+        self.event_count = 0
+        self._flush_event.clear()
+        self._stop_flush.clear()
+        self._start_time = self._clock()
+        self.is_recording = True
+        
+        # Disk writes happen on this thread, never on the hook threads
+        self._flush_thread = threading.Thread(target=self._flush_worker, daemon=True)
+        self._flush_thread.start()
+        
+        keyboard.hook(self._on_key_event)
+        if MOUSE_HOOKS_AVAILABLE:
+            mouse_hooks.hook(self._on_mouse_event)
+            self.mouse_hooked = True
+        else:
+            logging.warning("Mouse hooks unavailable: recording keyboard events only")
+    
+    def stop(self):
+        """Remove hooks, flush the remaining events and return the recording as a MacroFile"""
+        if not self.is_recording:
+            return MacroStore()
+        
+        # Hooks go first so every event they deliver is buffered before the flusher's last pass
+        try:
+            keyboard.unhook(self._on_key_event)
+        except Exception as e:
+            logging.error(f"Error removing keyboard hook: {e}")
+        if self.mouse_hooked:
+            try:
+                mouse_hooks.unhook(self._on_mouse_event)
+            except Exception as e:
+                logging.error(f"Error removing mouse hook: {e}")
+            self.mouse_hooked = False
+        self.is_recording = False
+        
+        self._stop_flush.set()
+        self._flush_event.set()
+        self._flush_thread.join()
+        self._writer.close()
+        logging.info(f"Recorded {self._writer.count} events to {self.spill_file}")
+        return MacroFile(self.spill_file)
+    
+    def discard(self):
+        """Delete the previous recording's spill file"""
+        if self.spill_file and not self.is_recording:
+            try:
+                os.remove(self.spill_file)
+            except OSError:
+                pass
+            self.spill_file = None
+    
+    def _on_key_event(self, event):
+        # Runs on the hook thread: stamp and append only (deque.append is thread-safe)
+        timestamp = self._clock()
+        event_type = 'key_down' if event.event_type == keyboard.KEY_DOWN else 'key_up'
+        action = {'type': event_type, 'key': event.name, 'scan_code': event.scan_code}
+        self._key_events.append((timestamp, action))
+        self._note_event(timestamp, action)
+    
+    def _on_mouse_event(self, event):
+        timestamp = self._clock()
+        if isinstance(event, mouse_hooks.MoveEvent):
+            action = {'type': 'move', 'x': event.x, 'y': event.y}
+        elif isinstance(event, mouse_hooks.ButtonEvent):
+            x, y = self._position_getter()
+            event_type = 'mouse_up' if event.event_type == mouse_hooks.UP else 'mouse_down'
+            action = {'type': event_type, 'x': x, 'y': y, 'button': event.button}
+        elif isinstance(event, mouse_hooks.WheelEvent):
+            x, y = self._position_getter()
+            action = {'type': 'scroll', 'x': x, 'y': y, 'delta': event.delta}
+        else:
+            return
+        self._mouse_events.append((timestamp, action))
+        self._note_event(timestamp, action)
+    
+    def _note_event(self, timestamp, action):
+        """Keep a short tail for the live view and wake the flusher when a chunk is full"""
+        self.recent_events.append((timestamp - self._start_time, action))
+        self.event_count += 1
+        if len(self._mouse_events) + len(self._key_events) >= self.chunk_size:
+            self._flush_event.set()
+    
+    def live_view(self):
+        """Indexable view of the recording in progress (only the recent tail is available)"""
+        return RecordingTail(self)
+    
+    def _flush_worker(self):
+        """Sleep until a chunk's worth of events is buffered, then merge and spill it"""
+        while True:
+            self._flush_event.wait()
+            self._flush_event.clear()
+            # Read before spilling: a stop signalled during the spill gets another pass
+            stopping = self._stop_flush.is_set()
+            try:
+                self._spill_events(final=stopping)
+            except Exception as e:
+                logging.error(f"Error spilling macro events: {e}")
+            if stopping:
+                break
+    
+    def _spill_events(self, final=False):
+        """Merge the buffered per-stream events by timestamp and hand them to the writer"""
+        mouse_events = [self._mouse_events.popleft() for _ in range(len(self._mouse_events))]
+        key_events = [self._key_events.popleft() for _ in range(len(self._key_events))]
+        
+        for timestamp, action in heapq.merge(mouse_events, key_events, key=lambda item: item[0]):
+            self._writer.append(action, t=timestamp - self._start_time)
+        if final:
+            self._writer.flush()
+
+
+class PathSimplifier:
+    """Ramer-Douglas-Peucker simplification of recorded mouse movement
+    
+    Only runs of consecutive moves are simplified. Clicks, scrolls and key events
+    are kept exactly, as are the first and last move of every run; a run also ends
+    at any pause longer than pause_threshold so idle time stays anchored. After RDP,
+    a move is re-added at least every max_interval seconds to keep the speed profile.
+    """
+    
+    def __init__(self, tolerance=2.0, max_interval=0.1, pause_threshold=0.25):
+        self.tolerance = max(0.0, float(tolerance))
+        self.max_interval = max_interval
+        self.pause_threshold = pause_threshold
+    
+    def keep_indices(self, store):
+        """Return the sorted indices of the events to keep from a MacroStore"""
+        count = len(store)
+        if count == 0:
+            return []
+        
+        move_code = MACRO_EVENT_CODES['move']
+        pause_us = int(self.pause_threshold * 1e6)
+        types, t_us = store.types, store.t_us
+        keep = []
+        run_start = None
+        
+        for i in range(count + 1):
+            is_move = i < count and types[i] == move_code
+            # A run of moves ends at a non-move event, a long pause or the end of the store
+            if run_start is not None and (not is_move or t_us[i] - t_us[i - 1] > pause_us):
+                keep.extend(self._simplify_run(store, run_start, i))
+                run_start = None
+            if i == count:
+                break
+            if is_move:
+                if run_start is None:
+                    run_start = i
+            else:
+                keep.append(i)
+        
+        keep.sort()
+        return keep
+    
+    def _simplify_run(self, store, start, end):
+        """Simplify moves [start, end); returns the kept absolute indices"""
+        if end - start <= 2:
+            return list(range(start, end))
+        
+        if NUMPY_AVAILABLE:
+            kept = self._rdp_numpy(store.x[start:end], store.y[start:end])
+        else:
+            kept = self._rdp_python(store.x[start:end], store.y[start:end])
+        
+        if self.max_interval:
+            kept = self._resample(store.t_us[start:end], kept)
+        return [start + i for i in kept]
+    
+    def _rdp_numpy(self, xs, ys):
+        """Iterative RDP with vectorized point-to-segment distances"""
+        x = numpy.frombuffer(xs, dtype=numpy.int32).astype(numpy.float64)
+        y = numpy.frombuffer(ys, dtype=numpy.int32).astype(numpy.float64)
+        keep = numpy.zeros(len(x), dtype=bool)
+        keep[0] = keep[-1] = True
+        
+        stack = [(0, len(x) - 1)]
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+            dx, dy = x[last] - x[first], y[last] - y[first]
+            px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+            length = numpy.hypot(dx, dy)
+            if length == 0:
+                distances = numpy.hypot(px, py)
+            else:
+                distances = numpy.abs(dx * py - dy * px) / length
+            
+            farthest = int(numpy.argmax(distances))
+            if distances[farthest] > self.tolerance:
+                split = first + 1 + farthest
+                keep[split] = True
+                stack.append((first, split))
+                stack.append((split, last))
+        
+        return numpy.flatnonzero(keep).tolist()
+    
+    def _rdp_python(self, x, y):
+        """Pure-Python RDP used when NumPy is not installed"""
+        keep = [False] * len(x)
+        keep[0] = keep[-1] = True
+        
+        stack = [(0, len(x) - 1)]
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+            x0, y0 = x[first], y[first]
+            dx, dy = x[last] - x0, y[last] - y0
+            length = (dx * dx + dy * dy) ** 0.5
+            
+            farthest, max_distance = first, -1.0
+            for i in range(first + 1, last):
+                px, py = x[i] - x0, y[i] - y0
+                if length == 0:
+                    distance = (px * px + py * py) ** 0.5
+                else:
+                    distance = abs(dx * py - dy * px) / length
+                if distance > max_distance:
+                    farthest, max_distance = i, distance
+            
+            if max_distance > self.tolerance:
+                keep[farthest] = True
+                stack.append((first, farthest))
+                stack.append((farthest, last))
+        
+        return [i for i, kept in enumerate(keep) if kept]
+    
+    def _resample(self, t_us, kept):
+        """Re-add original moves so kept points are at most max_interval apart"""
+        step_us = int(self.max_interval * 1e6)
+        resampled = [kept[0]]
+        for following in kept[1:]:
+            previous = resampled[-1]
+            target = t_us[previous] + step_us
+            while target < t_us[following]:
+                i = bisect.bisect_left(t_us, target, previous + 1, following)
+                if i >= following:
+                    break
+                resampled.append(i)
+                previous = i
+                target = t_us[i] + step_us
+            resampled.append(following)
+        return resampled
+    
+    def simplify(self, macro, filename=None):
+        """Simplify a MacroStore or MacroFile; returns (simplified macro, removed count)
+        
+        MacroFiles are processed chunk by chunk and streamed to filename (or a
+        temporary file), so large recordings are never fully loaded.
+        """
+        if isinstance(macro, MacroStore):
+            simplified = macro.select(self.keep_indices(macro))
+            return simplified, len(macro) - len(simplified)
+        
+        if filename is None:
+            fd, filename = tempfile.mkstemp(prefix='autoclick_simplified_', suffix='.acmacro')
+            os.close(fd)
+        with MacroStreamWriter(filename, origin=macro.origin) as writer:
+            for chunk in macro.iter_chunks():
+                writer.write_store(chunk.select(self.keep_indices(chunk)))
+        simplified = MacroFile(filename)
+        return simplified, len(macro) - len(simplified)
+
+
+class RecordingTail:
+    """Read-only window onto a recording in progress, for the live macro view"""
+    
+    def __init__(self, recorder):
+        self.recorder = recorder
+    
+    def __len__(self):
+        return self.recorder.event_count
+    
+    def __getitem__(self, i):
+        # Events older than the tail have already been spilled to disk
+        recent = self.recorder.recent_events
+        offset = i - (self.recorder.event_count - len(recent))
+        try:
+            if not 0 <= offset < len(recent):
+                return None
+            t, action = recent[offset]
+            previous_t = recent[offset - 1][0] if offset > 0 else t
+        except IndexError:
+            # The hook threads rotated the tail while we were reading it
+            return None
+        return dict(action, t=t, delay=t - previous_t)
+
+
+MACRO_CATCH_UP_POLICIES = ('drop_moves', 'compress')
+
+# Playback position; iteration/iterations describe the innermost repeat or loop (iterations 0: unbounded)
+MacroProgress = collections.namedtuple('MacroProgress', 'position total iteration iterations executed')
+
+
+class CompiledMacro:
+    """A validated macro lowered to flat arrays: one opcode, deadline and operand set per event
+    
+    Opcodes are MACRO_EVENT_CODES; t holds deadlines in seconds from the first event
+    and arg the button code, scroll amount (1/120 notch), repeat count, milliseconds
+    or index into keys (key and sub-macro names). jump links every block opener and
+    its end, and every call to its sub-macro, so control flow never searches.
+    """
+    
+    def __init__(self, start=0):
+        self.start = start  # Index of the first event within the whole macro, for error messages
+        self.ops = array('B')
+        self.t = array('d')
+        self.x = array('i')
+        self.y = array('i')
+        self.arg = array('i')
+        self.jump = array('i')
+        self.keys = []
+        self._key_index = {}
+        self._base_t_us = None
+        self.origin = None  # Recording origin of the source macro
+        self.has_waits = False  # Whether a wait moves the timeline, set by link()
+    
+    def __len__(self):
+        return len(self.ops)
+    
+    def __bool__(self):
+        return len(self.ops) > 0
+    
+    def extend(self, store):
+        """Validate and append the events of a MacroStore (e.g. one chunk of a macro file)"""
+        first = self.start + len(self.ops)
+        key_indexes = []
+        for key in store.keys:
+            index = self._key_index.get(key)
+            if index is None:
+                index = self._key_index[key] = len(self.keys)
+                self.keys.append(key)
+            key_indexes.append(index)
+        
+        event_types = len(MACRO_EVENT_TYPES)
+        buttons = len(MACRO_BUTTONS)
+        scroll, move = MACRO_EVENT_CODES['scroll'], MACRO_EVENT_CODES['move']
+        args = array('i', store.arg)
+        for i, (code, arg) in enumerate(zip(store.types, store.arg)):
+            if code >= event_types:
+                raise ValueError(f"Macro event {first + i + 1}: unknown event code {code}")
+            if code in MACRO_NAMED_CODES:
+                if not 0 <= arg < len(key_indexes):
+                    raise ValueError(f"Macro event {first + i + 1}: name index {arg} out of range")
+                args[i] = key_indexes[arg]
+            elif code >= MACRO_FIRST_CONTROL_CODE:
+                if arg < 0:
+                    raise ValueError(f"Macro event {first + i + 1}: invalid {MACRO_EVENT_TYPES[code]} operand {arg}")
+            elif code != scroll and code != move and not 0 <= arg < buttons:
+                raise ValueError(f"Macro event {first + i + 1}: unknown mouse button code {arg}")
+        
+        if store.t_us and self._base_t_us is None:
+            self._base_t_us = store.t_us[0]
+        base = self._base_t_us
+        self.ops.extend(store.types)
+        self.t.extend((t_us - base) / 1e6 for t_us in store.t_us)
+        self.x.extend(store.x)
+        self.y.extend(store.y)
+        self.arg.extend(args)
+    
+    def link(self):
+        """Match blocks with their ends and calls with sub-macros; raises ValueError if malformed"""
+        ops, t, arg = self.ops, self.t, self.arg
+        events = [(pc, op, t[pc], arg[pc]) for pc, op in enumerate(ops) if op >= MACRO_FIRST_CONTROL_CODE]
+        jump = array('i', bytes(4 * len(ops)))
+        for pc, target in link_control_flow(events, self.keys).items():
+            jump[pc] = target
+        self.jump = jump
+        self.has_waits = _has_waits(events)
+    
+    def segment(self, pc):
+        """(index of the first event, compiled events) holding pc: the whole macro is one segment"""
+        return 0, self
+    
+    def control(self, pc):
+        """(opcode, time, operand, jump) of the control flow event at pc"""
+        return self.ops[pc], self.t[pc], self.arg[pc], self.jump[pc]
+    
+    @property
+    def end_time(self):
+        return self.t[-1] if self.t else 0.0
+
+
+def link_control_flow(events, keys):
+    """Match blocks with their ends and calls with sub-macros; returns {pc: jump target}
+    
+    events are the (pc, opcode, time, operand) of the control flow events only, in
+    order, so a streamed macro can be linked without keeping its input events.
+    Raises ValueError if the control flow is malformed, including a timed loop or
+    a repeat until stopped whose iteration takes no time and so would spin.
+    """
+    repeat, loop, end, sub, call, wait = (MACRO_EVENT_CODES[name] for name in
+                                          ('repeat', 'loop', 'end', 'sub', 'call', 'wait'))
+    jump = {}
+    openers = {}
+    open_blocks = []
+    subs = {}
+    calls = []
+    # Per block: whether an iteration moves the timeline (its own span or a wait), and
+    # the sub-macros called inside it, which move it if their own blocks do
+    timed = {}
+    block_calls = {}
+    unbounded = []  # Blocks that only stop on the clock or when cancelled
+    
+    for pc, op, t, arg in events:
+        if op == repeat or op == loop or op == sub:
+            if op == sub:
+                name = keys[arg]
+                if open_blocks:
+                    raise ValueError(f"Macro event {pc + 1}: sub-macro {name!r} is defined inside a block")
+                if name in subs:
+                    raise ValueError(f"Macro event {pc + 1}: sub-macro {name!r} is defined twice")
+                subs[name] = pc
+            open_blocks.append(pc)
+            openers[pc] = (op, t)
+            timed[pc] = False
+            block_calls[pc] = []
+            if op == loop or (op == repeat and arg == 0):
+                unbounded.append(pc)
+        elif op == end:
+            if not open_blocks:
+                raise ValueError(f"Macro event {pc + 1}: end without a repeat, loop or sub")
+            opener = open_blocks.pop()
+            opener_t = openers[opener][1]
+            timed[opener] = timed[opener] or t > opener_t
+            if open_blocks:
+                timed[open_blocks[-1]] = timed[open_blocks[-1]] or timed[opener]
+                block_calls[open_blocks[-1]].extend(block_calls[opener])
+            jump[opener] = pc
+            jump[pc] = opener
+        elif op == call:
+            calls.append((pc, keys[arg]))
+            if open_blocks:
+                block_calls[open_blocks[-1]].append(keys[arg])
+        elif op == wait and arg > 0 and open_blocks:
+            timed[open_blocks[-1]] = True
+    if open_blocks:
+        raise ValueError(f"Macro event {open_blocks[-1] + 1}: "
+                         f"{MACRO_EVENT_TYPES[openers[open_blocks[-1]][0]]} has no end")
+    
+    # Sub-macros are top level, so the one enclosing a call is the last one starting before it
+    sub_starts = sorted(subs.values())
+    sub_names = {start: name for name, start in subs.items()}
+    callees = {start: set() for start in sub_starts}
+    for pc, name in calls:
+        if name not in subs:
+            raise ValueError(f"Macro event {pc + 1}: no sub-macro named {name!r}")
+        jump[pc] = subs[name]
+        index = bisect.bisect_right(sub_starts, pc) - 1
+        if index >= 0 and jump[sub_starts[index]] > pc:
+            callees[sub_starts[index]].add(subs[name])
+    
+    # Recursion would grow the call stack without bound
+    done = set()
+    for root in sub_starts:
+        path, stack = {root}, [(root, iter(callees[root]))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                path.discard(node)
+                done.add(node)
+            elif child in path:
+                raise ValueError(f"Sub-macro {sub_names[child]!r} calls itself")
+            elif child not in done:
+                path.add(child)
+                stack.append((child, iter(callees[child])))
+    
+    # Without recursion, whether a sub-macro takes time resolves callees first
+    sub_timed = {}
+    
+    def takes_time(name):
+        if name not in sub_timed:
+            start = subs[name]
+            sub_timed[name] = timed[start] or any(takes_time(callee) for callee in block_calls[start])
+        return sub_timed[name]
+    
+    for opener in unbounded:
+        if not timed[opener] and not any(takes_time(name) for name in block_calls[opener]):
+            kind = 'timed loop' if openers[opener][0] == loop else 'repeat until stopped'
+            raise ValueError(f"Macro event {opener + 1}: {kind} has no duration to repeat")
+    return jump
+
+
+def _has_waits(events):
+    wait = MACRO_EVENT_CODES['wait']
+    return any(op == wait and arg > 0 for _, op, _, arg in events)
+
+
+class StreamedMacro:
+    """A macro file validated in one streaming pass and compiled one chunk at a time at playback
+    
+    Only the key/name table and the control flow events are kept, so memory stays
+    bounded by the chunk size however long the file is.
+    """
+    
+    def __init__(self, macro_file):
+        self.macro_file = macro_file
+        self.origin = macro_file.origin
+        self.keys = []
+        self._key_index = {}
+        self._base_t_us = None
+        self._count = 0
+        self.end_time = 0.0
+        
+        events = []
+        for chunk in macro_file.iter_chunks():
+            compiled = self._compile_chunk(self._count, chunk)
+            if compiled and max(compiled.ops) >= MACRO_FIRST_CONTROL_CODE:
+                events.extend((self._count + i, op, compiled.t[i], compiled.arg[i])
+                              for i, op in enumerate(compiled.ops) if op >= MACRO_FIRST_CONTROL_CODE)
+            if compiled:
+                self.end_time = compiled.t[-1]
+            self._count += len(compiled)
+        jump = link_control_flow(events, self.keys)
+        self._controls = {pc: (op, t, arg, jump.get(pc, 0)) for pc, op, t, arg in events}
+        self.has_waits = _has_waits(events)
+    
+    def __len__(self):
+        return self._count
+    
+    def __bool__(self):
+        return self._count > 0
+    
+    def _compile_chunk(self, start, chunk):
+        # Keys and the time base are shared, so every chunk compiles to the same indexes and timeline
+        if self._base_t_us is None and chunk.t_us:
+            self._base_t_us = chunk.t_us[0]
+        compiled = CompiledMacro(start)
+        compiled.keys, compiled._key_index, compiled._base_t_us = self.keys, self._key_index, self._base_t_us
+        compiled.extend(chunk)
+        return compiled
+    
+    def segment(self, pc):
+        """(index of the first event, compiled events) of the chunk holding pc"""
+        start, chunk = self.macro_file.chunk_containing(pc)
+        return start, self._compile_chunk(start, chunk)
+    
+    def control(self, pc):
+        """(opcode, time, operand, jump) of the control flow event at pc"""
+        return self._controls[pc]
+
+
+def compile_macro(macro):
+    """Validate a macro (MacroStore, MacroFile or list of action dicts) and compile it for playback
+    
+    Raises ValueError for malformed events, so errors surface before playback starts.
+    A MacroFile is validated in a streaming pass and compiled chunk by chunk as it plays.
+    """
+    if isinstance(macro, (CompiledMacro, StreamedMacro)):
+        return macro
+    if isinstance(macro, MacroFile):
+        return StreamedMacro(macro)
+    store = macro if isinstance(macro, MacroStore) else MacroStore.from_actions(macro)
+    compiled = CompiledMacro()
+    compiled.extend(store)
+    compiled.link()
+    compiled.origin = store.origin
+    return compiled
+
+
+class MacroPlayer:
+    """Play compiled macros against an absolute timeline of precomputed deadlines
+    
+    Control flow is evaluated lazily: repeats, loops and calls jump within the
+    compiled arrays and shift the timeline by an offset, so memory stays
+    proportional to the macro source rather than to the number of events played.
+    A macro file is played one compiled chunk at a time.
+    """
+    
+    MIN_SPEED = 0.1
+    MAX_SPEED = 100.0
+    
+    def __init__(self, mouse_handler, scheduler=None, speed=1.0, catch_up='drop_moves', max_lag=0.02,
+                 progress=None, progress_interval=0.25):
+        self.mouse_handler = mouse_handler
+        self.scheduler = scheduler or ActionScheduler()
+        self.speed = min(self.MAX_SPEED, max(self.MIN_SPEED, float(speed)))
+        self.catch_up = catch_up if catch_up in MACRO_CATCH_UP_POLICIES else 'drop_moves'
+        self.max_lag = max_lag  # Lag (seconds) beyond which the catch-up policy kicks in
+        self.failsafe_check_every = 32
+        self.progress = progress  # Called with a MacroProgress at most every progress_interval seconds
+        self.progress_interval = progress_interval
+    
+    def play(self, macro, should_continue=None):
+        """Play a macro (compiled first if needed) in order; returns timeline statistics
+        
+        When playback falls more than max_lag behind, late events run back to back
+        (compressing the recorded gaps) and, with 'drop_moves', moves that are
+        immediately followed by another move are skipped entirely.
+        """
+        program = compile_macro(macro)
+        handlers = self._handlers(program)
+        count = len(program)
+        # Events come from one compiled segment at a time: the whole macro, or one chunk of a file
+        first, segment = program.segment(0) if count else (0, program)
+        ops, deadlines, xs, ys, args = segment.ops, segment.t, segment.x, segment.y, segment.arg
+        size = len(ops)
+        
+        scheduler = self.scheduler
+        now = scheduler.now
+        wait_until = scheduler.wait_until
+        failsafe_triggered = self.mouse_handler.failsafe_triggered
+        failsafe_check_every = self.failsafe_check_every
+        scale = 1.0 / self.speed
+        max_lag = self.max_lag
+        drop_moves = self.catch_up == 'drop_moves'
+        move = MACRO_EVENT_CODES['move']
+        first_control = MACRO_FIRST_CONTROL_CODE
+        progress = self.progress
+        next_progress = 0.0
+        
+        executed = dropped = 0
+        lag_sum = lag_max = final_error = 0.0
+        cancelled = False
+        offset = 0.0  # Timeline shift (seconds) from repeats, loops, waits and calls
+        frames = []  # Active blocks and calls: [opener, iteration, limit, (return pc, caller offset)]
+        pc = 0
+        start = base = now()
+        
+        while pc < count:
+            i = pc - first
+            if not 0 <= i < size:
+                first, segment = program.segment(pc)
+                ops, deadlines, xs, ys, args = segment.ops, segment.t, segment.x, segment.y, segment.arg
+                size = len(ops)
+                i = pc - first
+            op = ops[i]
+            if op >= first_control:
+                pc, offset = self._control(program, pc, offset, frames, should_continue)
+                if pc < 0:
+                    cancelled = True
+                    break
+                base = start + offset * scale
+                if progress is not None and now() >= next_progress:
+                    next_progress = now() + self.progress_interval
+                    progress(self._progress(program, pc, frames, executed))
+                continue
+            
+            target = base + deadlines[i] * scale
+            lag = now() - target
+            
+            if lag > max_lag and drop_moves and op == move and i + 1 < size and ops[i + 1] == move:
+                dropped += 1
+                pc += 1
+                continue
+            
+            if lag < 0:
+                current = wait_until(target, should_continue)
+                if current is None:
+                    cancelled = True
+                    break
+                lag = current - target
+            elif should_continue is not None and not should_continue():
+                cancelled = True
+                break
+            
+            if executed % failsafe_check_every == 0:
+                if failsafe_triggered():
+                    raise RuntimeError("Failsafe triggered: mouse moved to a screen corner")
+                if progress is not None and target + lag >= next_progress:
+                    next_progress = target + lag + self.progress_interval
+                    progress(self._progress(program, pc, frames, executed))
+            
+            handlers[op](xs[i], ys[i], args[i])
+            executed += 1
+            lag_sum += lag
+            if lag > lag_max:
+                lag_max = lag
+            final_error = lag
+            pc += 1
+        
+        if count and not cancelled:
+            # A trailing wait still takes its time
+            end_target = start + (program.end_time + offset) * scale
+            if now() < end_target and wait_until(end_target, should_continue) is None:
+                cancelled = True
+        
+        return {
+            'executed': executed,
+            'dropped': dropped,
+            'cancelled': cancelled,
+            'speed': self.speed,
+            'duration': now() - start if count else 0.0,
+            'final_error_ms': final_error * 1000,
+            'mean_lag_ms': lag_sum / executed * 1000 if executed else 0.0,
+            'max_lag_ms': lag_max * 1000
+        }
+    
+    def _control(self, program, pc, offset, frames, should_continue):
+        """Run the control flow event at pc; returns (next pc, timeline offset), next pc -1 when cancelled"""
+        op, t, arg, jump = program.control(pc)
+        event_type = MACRO_EVENT_TYPES[op]
+        
+        if event_type == 'repeat':
+            frames.append([pc, 1, arg, None])
+        elif event_type == 'loop':
+            # Bounded by timeline time, so the loop scales with playback speed like everything else
+            frames.append([pc, 1, t + offset + arg / 1000, None])
+        elif event_type == 'wait':
+            offset += arg / 1000
+        elif event_type == 'sub':
+            # Definitions are skipped in normal flow, along with the time they span
+            return jump + 1, offset - (program.control(jump)[1] - t)
+        elif event_type == 'call':
+            frames.append([jump, 1, 0, (pc + 1, offset)])
+            return jump + 1, t + offset - program.control(jump)[1]
+        elif event_type == 'end':
+            frame = frames[-1]
+            opener = frame[0]
+            opener_op, opener_t = program.control(opener)[:2]
+            duration = t - opener_t
+            opener_type = MACRO_EVENT_TYPES[opener_op]
+            if opener_type == 'sub':
+                frames.pop()
+                return_pc, caller_offset = frame[3]
+                return return_pc, caller_offset + duration
+            if opener_type == 'repeat':
+                again = frame[2] == 0 or frame[1] < frame[2]
+            else:
+                again = t + offset < frame[2]
+            if not again:
+                frames.pop()
+            elif should_continue is not None and not should_continue():
+                return -1, offset
+            else:
+                frame[1] += 1
+                return opener + 1, offset + duration
+        return pc + 1, offset
+    
+    @staticmethod
+    def _progress(program, pc, frames, executed):
+        """MacroProgress for the innermost repeat or loop (calls are skipped)"""
+        for frame in reversed(frames):
+            if frame[3] is None:
+                # Timed loops have no fixed iteration count
+                repeat = program.control(frame[0])[0] == MACRO_EVENT_CODES['repeat']
+                return MacroProgress(pc, len(program), frame[1], frame[2] if repeat else 0, executed)
+        return MacroProgress(pc, len(program), 1, 1, executed)
+    
+    def _handlers(self, program):
+        """Opcode -> callable(x, y, arg) bound to the input backend, with keys resolved once"""
+        backend = self.mouse_handler.backend
+        move, click_many, mouse_button, scroll, key = (
+            backend.move, backend.click_many, backend.mouse_button, backend.scroll, backend.key)
+        keys = [backend.resolve_key(name) for name in program.keys]
+        buttons = MACRO_BUTTONS
+        handlers = {
+            'move': lambda x, y, arg: move(x, y),
+            'click': lambda x, y, arg: click_many(((x, y),), buttons[arg], 1),
+            'mouse_down': lambda x, y, arg: mouse_button(x, y, buttons[arg], True),
+            'mouse_up': lambda x, y, arg: mouse_button(x, y, buttons[arg], False),
+            'scroll': lambda x, y, arg: scroll(x, y, arg),
+            'key_down': lambda x, y, arg: key(keys[arg], True),
+            'key_up': lambda x, y, arg: key(keys[arg], False),
+        }
+        return tuple(handlers[name] for name in MACRO_INPUT_TYPES)
+
+
+class ParallelMacroPlayer:
+    """Play one macro against several windows at once, each from its own worker thread
+    
+    Events are posted as window messages, so no window needs the foreground or the
+    cursor. Points are made window-relative against the macro's recording origin: a
+    point recorded at client (x, y) of the recorded window is sent to every window at
+    its own client (x, y). Macros without an origin (e.g. legacy JSON) fall back to
+    the reference window's current position, the first window by default.
+    """
+    
+    def __init__(self, windows, speed=1.0, catch_up='drop_moves', max_workers=8, reference=None,
+                 message_sender=None, progress=None, progress_interval=0.25, scheduler_factory=None):
+        self.windows = list(windows)  # (hwnd, title) pairs, as returned by find_target_window
+        self.speed = speed
+        self.catch_up = catch_up
+        self.max_workers = max(1, int(max_workers))
+        self.reference = reference
+        self.message_sender = message_sender or WindowMessageSender()
+        self.progress = progress  # Called with {hwnd: MacroProgress} as any window advances
+        self.progress_interval = progress_interval
+        # Sleep-only waits: many threads spinning the final milliseconds would contend for the GIL
+        self.scheduler_factory = scheduler_factory or (lambda: ActionScheduler(spin_threshold=0.0))
+        self._lock = threading.Lock()
+        self._progress = {}
+    
+    def play(self, macro, should_continue=None):
+        """Play the macro in every window; returns combined and per-window statistics"""
+        if not self.windows:
+            raise ValueError("No target windows to play the macro in")
+        program = compile_macro(macro)
+        origin = program.origin
+        if origin is None:
+            reference = self.reference or self.windows[0][0]
+            logging.warning(f"Macro has no recording origin: playing it relative to window {reference}'s "
+                            f"current position")
+            origin = win32gui.ClientToScreen(reference, (0, 0))
+        with self._lock:
+            self._progress = {}
+        
+        start = time.perf_counter()
+        results = {}
+        workers = min(self.max_workers, len(self.windows))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='macro') as pool:
+            futures = {pool.submit(self._play_window, program, hwnd, origin, start, should_continue): (hwnd, title)
+                       for hwnd, title in self.windows}
+            for future in concurrent.futures.as_completed(futures):
+                hwnd, title = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    logging.error(f"Error playing macro in window {title!r}: {e}")
+                    stats = {'error': str(e), 'executed': 0, 'cancelled': False}
+                stats['title'] = title
+                results[hwnd] = stats
+        return self._summary(results, time.perf_counter() - start)
+    
+    def _play_window(self, program, hwnd, origin, start, should_continue):
+        """Worker: play the whole macro into one window"""
+        started = time.perf_counter()
+        backend = WindowInputBackend(hwnd, origin, self.message_sender)
+        player = MacroPlayer(MouseHandler(backend), scheduler=self.scheduler_factory(), speed=self.speed,
+                             catch_up=self.catch_up, progress_interval=self.progress_interval,
+                             progress=lambda progress: self._report(hwnd, progress))
+        stats = player.play(program, should_continue)
+        # Windows beyond the worker count wait for a free worker
+        stats['start_delay_ms'] = (started - start) * 1000
+        return stats
+    
+    def _report(self, hwnd, progress):
+        with self._lock:
+            self._progress[hwnd] = progress
+            snapshot = dict(self._progress)
+        if self.progress is not None:
+            self.progress(snapshot)
+    
+    def get_progress(self):
+        """Latest MacroProgress of each window"""
+        with self._lock:
+            return dict(self._progress)
+    
+    @staticmethod
+    def _summary(results, duration):
+        played = [stats for stats in results.values() if 'error' not in stats]
+        return {
+            'windows': len(results),
+            'completed': sum(1 for stats in played if not stats['cancelled']),
+            'failed': len(results) - len(played),
+            'cancelled': any(stats['cancelled'] for stats in played),
+            'executed': sum(stats['executed'] for stats in played),
+            'dropped': sum(stats['dropped'] for stats in played),
+            'duration': duration,
+            'max_final_error_ms': max((abs(stats['final_error_ms']) for stats in played), default=0.0),
+            'max_lag_ms': max((stats['max_lag_ms'] for stats in played), default=0.0),
+            'mean_lag_ms': sum(stats['mean_lag_ms'] for stats in played) / len(played) if played else 0.0,
+            'per_window': results
+        }
+
+
+def format_parallel_progress(progress, windows):
+    """One status line for {hwnd: MacroProgress} across windows: the window furthest behind"""
+    if not progress:
+        return f"Starting in {windows} windows..."
+    slowest = min(progress.values(), key=lambda item: item.executed)
+    return f"{len(progress)}/{windows} windows, slowest: {format_macro_progress(slowest)}"
+
+
+def format_macro_progress(progress):
+    """One status line for a MacroProgress"""
+    text = f"Event {progress.position + 1:,}/{progress.total:,}"
+    if progress.iterations != 1:
+        of = f"/{progress.iterations:,}" if progress.iterations else ""
+        text += f", iteration {progress.iteration:,}{of}"
+    return f"{text} ({progress.executed:,} played)"
+
+
+def format_macro_action(index, action):
+    """Format one macro action as a single display line"""
+    if action is None:
+        return f"{index+1}. ..."
+    
+    prefix = f"{index+1}. [{action['t']:.3f}s]" if action.get('t') is not None else f"{index+1}."
+    event_type = action['type']
+    if event_type == 'move':
+        return f"{prefix} Move to ({action['x']}, {action['y']}) - Delay: {action['delay']:.3f}s"
+    elif event_type == 'click':
+        return f"{prefix} Click at ({action['x']}, {action['y']}) - Button: {action['button']}"
+    elif event_type in ('mouse_down', 'mouse_up'):
+        state = "down" if event_type == 'mouse_down' else "up"
+        return f"{prefix} Button {action['button']} {state} at ({action['x']}, {action['y']}) - Delay: {action['delay']:.3f}s"
+    elif event_type == 'scroll':
+        return f"{prefix} Scroll {action['delta']:+g} at ({action['x']}, {action['y']}) - Delay: {action['delay']:.3f}s"
+    elif event_type in ('key_down', 'key_up'):
+        state = "down" if event_type == 'key_down' else "up"
+        return f"{prefix} Key {action['key']} {state} - Delay: {action['delay']:.3f}s"
+    elif event_type == 'repeat':
+        return f"{prefix} Repeat {action['count'] or 'until stopped'}{' times' if action['count'] else ''}:"
+    elif event_type == 'loop':
+        return f"{prefix} Loop for {action['seconds']:g}s:"
+    elif event_type == 'end':
+        return f"{prefix} End"
+    elif event_type == 'sub':
+        return f"{prefix} Sub-macro {action['name']}:"
+    elif event_type == 'call':
+        return f"{prefix} Call {action['name']}"
+    elif event_type == 'wait':
+        return f"{prefix} Wait {action['seconds']:g}s"
+    return f"{prefix} {event_type}: {action}"
+
+
+class VirtualListView(ttk.Frame):
+    """Scrollable list that only formats and renders the rows currently visible
+    
+    The source only needs __len__ and __getitem__, so a MacroStore or a lazily
+    decoded MacroFile of any size can be browsed without building every line.
+    """
+    
+    def __init__(self, parent, formatter, rows=15, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.formatter = formatter
+        self.source = ()
+        self.first_row = 0
+        self.visible_rows = rows
+        self.follow_tail = False
+        self.highlight_row = None
+        
+        self.listbox = tk.Listbox(self, height=rows, activestyle="none", exportselection=False)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.listbox.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        
+        self._line_height = max(1, tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1)
+        self.listbox.bind("<Configure>", self._on_resize)
+        self.listbox.bind("<MouseWheel>", lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        self.listbox.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll_by(3))
+        self.listbox.bind("<Prior>", lambda e: self.scroll_by(-self.visible_rows))
+        self.listbox.bind("<Next>", lambda e: self.scroll_by(self.visible_rows))
+        self.listbox.bind("<Home>", lambda e: self.scroll_to(0))
+        self.listbox.bind("<End>", lambda e: self.scroll_to(len(self.source)))
+    
+    def set_source(self, source, follow_tail=False):
+        """Show a new data source from the top (or the tail when following appends)"""
+        self.source = source
+        self.follow_tail = follow_tail
+        self.highlight_row = None
+        self.first_row = 0
+        self.refresh()
+    
+    def refresh(self):
+        """Re-render after the source grew; cheap enough to call while recording"""
+        if self.follow_tail:
+            self.first_row = max(0, len(self.source) - self.visible_rows)
+        self.render()
+    
+    def scroll_to(self, row):
+        self.first_row = max(0, min(row, len(self.source) - self.visible_rows))
+        self.render()
+    
+    def scroll_by(self, rows):
+        self.scroll_to(self.first_row + rows)
+        return "break"
+    
+    def goto_row(self, row):
+        """Scroll so row is visible near the top and highlight it"""
+        if not len(self.source):
+            return
+        row = max(0, min(row, len(self.source) - 1))
+        self.highlight_row = row
+        self.scroll_to(row - 2)
+    
+    def goto_time(self, seconds):
+        """Jump to the first row at or after the given time offset"""
+        if hasattr(self.source, 'find_time'):
+            row = self.source.find_time(seconds)
+        else:
+            row = bisect.bisect_left(range(len(self.source)), seconds,
+                                     key=lambda i: self.source[i].get('t') or 0.0)
+        self.goto_row(row)
+    
+    def render(self):
+        count = len(self.source)
+        end = min(count, self.first_row + self.visible_rows)
+        lines = [self.formatter(i, self.source[i]) for i in range(self.first_row, end)]
+        
+        self.listbox.delete(0, tk.END)
+        if lines:
+            self.listbox.insert(tk.END, *lines)
+        if self.highlight_row is not None and self.first_row <= self.highlight_row < end:
+            self.listbox.selection_set(self.highlight_row - self.first_row)
+        
+        if count:
+            self.scrollbar.set(self.first_row / count, end / count)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+    
+    def _on_scrollbar(self, *args):
+        count = len(self.source)
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * count))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self.visible_rows if args[2] == "pages" else 1)
+            self.scroll_by(step)
+    
+    def _on_resize(self, event):
+        rows = max(1, event.height // self._line_height)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.refresh()
+
+
+# Exit codes for headless mode
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_STOPPED = 3
+EXIT_INTERRUPTED = 130
+
+CONFIG_FILE = "autoclick_config.json"
+PROFILE_DB = "autoclick_profiles.db"
+DEFAULT_PROFILE = "Default"
+
+DEFAULT_CONFIG = {
+    'click_interval': 1.0,
+    'rate_mode': 'interval',
+    'clicks_per_second': 10.0,
+    'action_type': 'mouse',
+    'mouse_button': 'left',
+    'click_type': 'single',
+    'x_coordinate': 100,
+    'y_coordinate': 100,
+    'keyboard_key': 'space',
+    'template_file': '',
+    'template_threshold': 0.8,
+    'template_region': '',
+    'condition_mode': 'none',
+    'condition_region': '',
+    'condition_color': '#ff0000',
+    'condition_tolerance': 16,
+    'condition_coverage': 0.0,
+    'condition_interval_ms': 100,
+    'target_window': '',
+    'hotkey_start_stop': 'f6',
+    'emergency_stop_hotkey': 'f12',
+    'auto_resize_window': True,
+    'input_backend': 'sendinput',
+    'delivery_mode': 'foreground',
+    'macro_chunk_size': MACRO_CHUNK_SIZE,
+    'macro_speed': 1.0,
+    'macro_catch_up': 'drop_moves',
+    'path_tolerance': 2.0,
+    'simplify_on_save': False,
+    'macro_wait_condition': False,
+    'macro_parallel_windows': False,
+    'macro_parallel_workers': 8,
+    'jobs': [],
+    'metrics_enabled': False,
+    'metrics_port': 9464,
+    'theme': 'arc'
+}
+
+
+class ConditionSpec(collections.namedtuple('ConditionSpec', (
+        'mode', 'region', 'color', 'tolerance', 'coverage', 'interval'))):
+    """Immutable trigger condition: a region of the target window (or screen) to watch for a change or a color"""
+    
+    __slots__ = ()
+    
+    @classmethod
+    def from_config(cls, config):
+        """The configured condition, or None when actions are not conditional"""
+        mode = config.get('condition_mode', 'none')
+        if mode not in RegionCondition.MODES:
+            return None
+        return cls(
+            mode=mode,
+            region=parse_region(config.get('condition_region', '')),
+            color=parse_color(config.get('condition_color', '#ff0000')) if mode == 'color' else None,
+            tolerance=int(config.get('condition_tolerance', 16)),
+            coverage=float(config.get('condition_coverage', 0.0)),
+            interval=max(0.01, float(config.get('condition_interval_ms', 100)) / 1000)
+        )
+    
+    def create(self):
+        return RegionCondition(self.mode, self.color, self.tolerance, self.coverage)
+
+
+class ActionSnapshot(collections.namedtuple('ActionSnapshot', (
+        'action_type', 'target_window', 'x', 'y', 'button', 'clicks', 'key', 'interval', 'delivery_mode',
+        'template_file', 'template_region', 'template_threshold', 'condition'), defaults=('', None, 0.8, None))):
+    """Immutable parameters of the main action, safe to read from worker threads"""
+    
+    __slots__ = ()
+    
+    @classmethod
+    def from_config(cls, config):
+        if config.get('rate_mode') == "cps":
+            interval = 1.0 / max(0.1, float(config.get('clicks_per_second', 10.0)))
+        else:
+            interval = float(config.get('click_interval', 1.0))
+        return cls(
+            action_type=config.get('action_type', 'mouse'),
+            target_window=config.get('target_window', ''),
+            x=int(config.get('x_coordinate', 100)),
+            y=int(config.get('y_coordinate', 100)),
+            button=config.get('mouse_button', 'left'),
+            clicks=2 if config.get('click_type') == "double" else 1,
+            key=config.get('keyboard_key', 'space'),
+            interval=max(0.001, interval),
+            delivery_mode=config.get('delivery_mode', 'foreground'),
+            template_file=config.get('template_file', ''),
+            template_region=parse_region(config.get('template_region', '')),
+            template_threshold=float(config.get('template_threshold', 0.8)),
+            condition=ConditionSpec.from_config(config)
+        )
+
+
+class UIUpdateQueue:
+    """Coalescing queue of UI updates from worker threads, polled and drained by the Tk main loop"""
+    
+    def __init__(self, max_pending=256):
+        # Posting never touches Tk: the main loop polls, so no Tcl call is made off the main thread
+        self._keyed = {}  # key -> newest callback (older ones are superseded)
+        self._pending = collections.deque(maxlen=max_pending)  # Floods drop the oldest
+        self.posted = 0
+        self.coalesced = 0
+        self.dropped = 0
+    
+    def post(self, callback, key=None):
+        """Queue callback to run on the main loop; with a key, only the newest per key runs"""
+        # deque and dict operations are atomic, so producers never take a lock
+        self.posted += 1
+        if key is None:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(callback)
+        else:
+            if self._keyed.get(key) is not None:
+                self.coalesced += 1
+            self._keyed[key] = callback
+    
+    def drain(self):
+        """Run all pending callbacks (main thread only); returns how many ran"""
+        callbacks = []
+        for key in list(self._keyed):
+            callback = self._keyed.pop(key, None)
+            if callback is not None:
+                callbacks.append(callback)
+        while self._pending:
+            try:
+                callbacks.append(self._pending.popleft())
+            except IndexError:
+                break
+        
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Error in UI update: {e}")
+        return len(callbacks)
+    
+    def get_stats(self):
+        return {'posted': self.posted, 'coalesced': self.coalesced, 'dropped': self.dropped}
+
+
+def read_config(filename):
+    """Read a configuration file merged over the defaults"""
+    with open(filename, 'r') as f:
+        loaded_config = json.load(f)
+    if not isinstance(loaded_config, dict):
+        raise ValueError(f"{filename} is not a configuration file")
+    
+    # Merge with defaults
+    for key, value in DEFAULT_CONFIG.items():
+        if key not in loaded_config:
+            loaded_config[key] = value
+    return loaded_config
+
+
+def write_config(filename, config):
+    """Write a configuration file atomically (readers never see a partial file)"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_name = tempfile.mkstemp(prefix='.autoclick_', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(config, f, indent=2)
+        os.replace(temp_name, filename)
+    except BaseException:
+        os.remove(temp_name)
+        raise
+
+
+class ProfileStore:
+    """Named configurations in one SQLite file, cached in memory for instant switching"""
+    
+    def __init__(self, filename=PROFILE_DB):
+        import sqlite3
+        self.filename = filename
+        self._integrity_error = sqlite3.IntegrityError
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS profiles ("
+                             "name TEXT PRIMARY KEY, hotkey TEXT, config TEXT NOT NULL, updated REAL NOT NULL)")
+            self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS profiles_hotkey ON profiles(hotkey) "
+                             "WHERE hotkey IS NOT NULL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self._profiles = {}  # name -> (hotkey, config)
+        self.reload()
+    
+    def reload(self):
+        """Re-read all profiles (e.g. after another process changed the file)"""
+        with self._lock:
+            rows = self._db.execute("SELECT name, hotkey, config FROM profiles").fetchall()
+            active = self._db.execute("SELECT value FROM settings WHERE key = 'active'").fetchone()
+        profiles = {}
+        for name, hotkey, config in rows:
+            try:
+                profiles[name] = (hotkey, json.loads(config))
+            except ValueError as e:
+                logging.error(f"Skipping profile {name}: {e}")
+        self._profiles = profiles
+        self._active = active[0] if active else None
+    
+    def names(self):
+        return sorted(self._profiles, key=str.lower)
+    
+    def __contains__(self, name):
+        return name in self._profiles
+    
+    def get(self, name):
+        """Configuration of a profile merged over the defaults"""
+        config = DEFAULT_CONFIG.copy()
+        config.update(self._profiles[name][1])
+        return config
+    
+    def hotkeys(self):
+        """Map of profile name to its switching hotkey"""
+        return {name: hotkey for name, (hotkey, config) in self._profiles.items() if hotkey}
+    
+    @property
+    def active(self):
+        return self._active if self._active in self._profiles else None
+    
+    def save(self, name, config):
+        """Create or replace a profile's configuration in one transaction"""
+        data = json.dumps(config)
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO profiles (name, config, updated) VALUES (?, ?, ?) "
+                             "ON CONFLICT(name) DO UPDATE SET config = excluded.config, updated = excluded.updated",
+                             (name, data, time.time()))
+        hotkey = self._profiles.get(name, (None, None))[0]
+        self._profiles[name] = (hotkey, json.loads(data))
+    
+    def set_hotkey(self, name, hotkey):
+        """Assign a switching hotkey (None to clear); raises ValueError if another profile has it"""
+        hotkey = hotkey or None
+        try:
+            with self._lock, self._db:
+                self._db.execute("UPDATE profiles SET hotkey = ? WHERE name = ?", (hotkey, name))
+        except self._integrity_error:
+            raise ValueError(f"Hotkey {hotkey} is already used by another profile")
+        self._profiles[name] = (hotkey, self._profiles[name][1])
+    
+    def set_active(self, name):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('active', ?)", (name,))
+        self._active = name
+    
+    def delete(self, name):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM profiles WHERE name = ?", (name,))
+        self._profiles.pop(name, None)
+    
+    def data_version(self):
+        """Changes whenever another connection commits (our own writes do not count)"""
+        with self._lock:
+            return self._db.execute("PRAGMA data_version").fetchone()[0]
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_profile_store(filename=PROFILE_DB, legacy_config=CONFIG_FILE):
+    """Open the profile store, importing the legacy configuration file into an empty one"""
+    store = ProfileStore(filename)
+    if not store.names():
+        config = DEFAULT_CONFIG.copy()
+        if legacy_config and os.path.exists(legacy_config):
+            try:
+                config = read_config(legacy_config)
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not import {legacy_config}: {e}")
+        store.save(DEFAULT_PROFILE, config)
+        store.set_active(DEFAULT_PROFILE)
+    return store
+
+
+class FileWatcher:
+    """Poll cheap change signatures on a background thread and report changes"""
+    
+    def __init__(self, callback, interval=1.0):
+        # callback(key) runs on the watcher thread
+        self.callback = callback
+        self.interval = interval
+        self._checks = {}  # key -> (signature function, last signature)
+        self._stop = threading.Event()
+        self._thread = None
+    
+    @staticmethod
+    def file_signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def watch(self, key, signature):
+        """Watch any value: signature() is compared with its last result every interval"""
+        self._checks[key] = (signature, signature())
+    
+    def watch_file(self, path):
+        self.watch(path, lambda: self.file_signature(path))
+    
+    def unwatch(self, key):
+        self._checks.pop(key, None)
+    
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="FileWatcher", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for key, (signature, last) in list(self._checks.items()):
+                try:
+                    current = signature()
+                except Exception as e:
+                    logging.error(f"Error watching {key}: {e}")
+                    continue
+                if current != last and key in self._checks:
+                    self._checks[key] = (signature, current)
+                    try:
+                        self.callback(key)
+                    except Exception as e:
+                        logging.error(f"Error handling change of {key}: {e}")
+
+
+def open_macro(filename):
+    """Open a macro file: binary macros lazily, legacy JSON macros into a MacroStore"""
+    if MacroStore.is_binary_file(filename):
+        # Opened lazily: only chunk headers are read up front
+        return MacroFile(filename)
+    # Legacy JSON macro: list of action dicts
+    with open(filename, 'r') as f:
+        return MacroStore.from_actions(json.load(f))
+
+
+TemplateMatch = collections.namedtuple('TemplateMatch', 'found x y score mode match_ms')
+
+
+def _downscale(image):
+    """Half-size image by 2x2 box averaging (an odd last row/column is dropped)"""
+    height, width = image.shape[0] // 2 * 2, image.shape[1] // 2 * 2
+    image = image[:height, :width]
+    return (image[0::2, 0::2] + image[1::2, 0::2] + image[0::2, 1::2] + image[1::2, 1::2]) * 0.25
+
+
+def _window_sums(image, height, width):
+    """Sum of every height x width window, from an integral image"""
+    integral = numpy.zeros((image.shape[0] + 1, image.shape[1] + 1))
+    numpy.cumsum(image, axis=0, out=integral[1:, 1:])
+    numpy.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+    return (integral[height:, width:] - integral[:-height, width:]
+            - integral[height:, :-width] + integral[:-height, :-width])
+
+
+class TemplateMatcher:
+    """Find a grayscale template in frames by normalized cross-correlation on an image pyramid"""
+    
+    def __init__(self, template, threshold=0.8, max_levels=3, min_size=16, track_radius=16,
+                 change_threshold=12.0, change_step=4):
+        template = numpy.asarray(template, dtype=numpy.float64)
+        if template.ndim != 2 or min(template.shape) < 2:
+            raise ValueError("template must be a 2D grayscale image")
+        self.height, self.width = template.shape
+        self.threshold = threshold
+        self.track_radius = track_radius  # Pixels the template may move and still be tracked
+        self.change_threshold = change_threshold  # Gray levels a sampled pixel must change by
+        self.change_step = change_step  # Change detection samples every change_step-th pixel
+        
+        # Coarsest level keeps the template at least min_size pixels on each side
+        # (smaller coarse templates alias and can miss matches at odd offsets)
+        self.levels = 0
+        while self.levels < max_levels and min(template.shape) >> (self.levels + 1) >= min_size:
+            self.levels += 1
+        
+        self._templates = []  # Per level: (zero-mean template, its norm)
+        for level in range(self.levels + 1):
+            zero_mean = template - template.mean()
+            norm = float(numpy.sqrt((zero_mean * zero_mean).sum()))
+            if norm < 1e-6:
+                raise ValueError("template has no contrast")
+            self._templates.append((zero_mean, norm))
+            template = _downscale(template)
+        
+        self._spectra = {}  # Template spectrum per frame shape (frame size rarely changes)
+        self._reference = None  # Sampled pixels of the frame the last search or track ran on
+        self.last_match = None  # (found, left, top, score)
+        self.counts = {'cached': 0, 'tracked': 0, 'search': 0}
+    
+    def match(self, frame):
+        """Locate the template in a grayscale frame; returns a TemplateMatch with the center"""
+        start = time.perf_counter()
+        frame = numpy.asarray(frame, dtype=numpy.float32)
+        
+        # A sparse sample is enough to notice anything larger than change_step pixels
+        sample = frame[::self.change_step, ::self.change_step]
+        reference = self._reference
+        changed = (reference is None or reference.shape != sample.shape
+                   or float(numpy.abs(sample - reference).max()) > self.change_threshold)
+        
+        if not changed and self.last_match is not None:
+            mode = 'cached'
+        else:
+            self._reference = sample.copy()  # The capture buffer is reused
+            pyramid = [frame]
+            for _ in range(self.levels):
+                pyramid.append(_downscale(pyramid[-1]))
+            result = None
+            mode = 'tracked'
+            if self.last_match is not None and self.last_match[0]:
+                result = self._track(pyramid)
+            if result is None or result[2] < self.threshold:
+                mode = 'search'
+                result = self._search(pyramid)
+            if result is None:
+                self.last_match = (False, 0, 0, 0.0)
+            else:
+                left, top, score = result
+                self.last_match = (score >= self.threshold, left, top, score)
+        
+        self.counts[mode] += 1
+        found, left, top, score = self.last_match
+        return TemplateMatch(found, left + self.width // 2, top + self.height // 2, score, mode,
+                             (time.perf_counter() - start) * 1000)
+    
+    def reset(self):
+        """Forget the last match so the next frame is searched from scratch"""
+        self._reference = None
+        self.last_match = None
+    
+    def _scores(self, image, level):
+        """NCC of the level's template at every position of image, computed with FFTs"""
+        zero_mean, norm = self._templates[level]
+        height, width = zero_mean.shape
+        if image.shape[0] < height or image.shape[1] < width:
+            return None
+        
+        key = (level, image.shape)
+        spectrum = self._spectra.get(key)
+        if spectrum is None:
+            spectrum = numpy.conj(numpy.fft.rfft2(zero_mean, s=image.shape))
+            self._spectra[key] = spectrum
+        # Circular correlation is exact where the template does not wrap around
+        numerator = numpy.fft.irfft2(numpy.fft.rfft2(image) * spectrum, s=image.shape)
+        numerator = numerator[:image.shape[0] - height + 1, :image.shape[1] - width + 1]
+        return self._normalize(numerator, _window_sums(image, height, width),
+                               _window_sums(image * image, height, width), height * width, norm)
+    
+    def _local_scores(self, image, level):
+        """NCC at every position of a small patch, computed directly"""
+        zero_mean, norm = self._templates[level]
+        height, width = zero_mean.shape
+        windows = numpy.lib.stride_tricks.sliding_window_view(image, (height, width))
+        numerator = numpy.tensordot(windows, zero_mean, axes=((2, 3), (0, 1)))
+        return self._normalize(numerator, windows.sum(axis=(2, 3)), (windows * windows).sum(axis=(2, 3)),
+                               height * width, norm)
+    
+    @staticmethod
+    def _normalize(numerator, sums, squares, count, norm):
+        variance = squares - sums * sums / count
+        scores = numpy.zeros_like(numerator)
+        # Flat windows (no variance) cannot match a template with contrast
+        numpy.divide(numerator, numpy.sqrt(numpy.maximum(variance, 0.0)) * norm, out=scores,
+                     where=variance > 1e-6 * count)
+        return numpy.clip(scores, -1.0, 1.0, out=scores)
+    
+    def _search(self, pyramid, candidates=3):
+        """Full search: best peaks on the coarsest level, each refined down to full resolution"""
+        level = self.levels
+        scores = self._scores(pyramid[level], level)
+        if scores is None:
+            return None
+        
+        # Keep a few well-separated peaks: the coarse level can rank the true match second
+        spacing = max(1, min(self._templates[level][0].shape) // 2)
+        flat = scores.ravel()
+        top = numpy.argpartition(flat, -min(flat.size, 64))[-min(flat.size, 64):]
+        peaks = []
+        for index in top[numpy.argsort(flat[top])[::-1]]:
+            y, x = divmod(int(index), scores.shape[1])
+            if all(abs(y - py) > spacing or abs(x - px) > spacing for py, px in peaks):
+                peaks.append((y, x))
+                if len(peaks) == candidates:
+                    break
+        
+        best = None
+        for y, x in peaks:
+            result = self._refine(pyramid, level, x, y, 1)
+            if best is None or result[2] > best[2]:
+                best = result
+        return best
+    
+    def _track(self, pyramid):
+        """Search near the last match only, starting on the coarsest level"""
+        level = self.levels
+        found, left, top, score = self.last_match
+        if pyramid[0].shape[0] < self.height or pyramid[0].shape[1] < self.width:
+            return None
+        return self._refine(pyramid, level, left >> level, top >> level, (self.track_radius >> level) + 1)
+    
+    def _refine(self, pyramid, level, x, y, radius):
+        """Best position within radius of (x, y), then within 2 pixels on each finer level"""
+        while True:
+            x, y, score = self._local_best(pyramid[level], level, x, y, radius)
+            if level == 0:
+                return x, y, score
+            level -= 1
+            x, y, radius = x * 2, y * 2, 2
+    
+    def _local_best(self, image, level, x, y, radius):
+        height, width = self._templates[level][0].shape
+        max_top, max_left = image.shape[0] - height, image.shape[1] - width
+        top, bottom = min(max(y - radius, 0), max_top), min(max(y + radius, 0), max_top)
+        left, right = min(max(x - radius, 0), max_left), min(max(x + radius, 0), max_left)
+        scores = self._local_scores(image[top:bottom + height, left:right + width], level)
+        iy, ix = numpy.unravel_index(int(numpy.argmax(scores)), scores.shape)
+        return left + int(ix), top + int(iy), float(scores[iy, ix])
+
+
+def load_template(filename):
+    """Load a template image as a grayscale array (.npy, or any image format Pillow reads)"""
+    if filename.lower().endswith('.npy'):
+        image = numpy.load(filename)
+    else:
+        with PIL_Image.open(filename) as picture:
+            image = numpy.asarray(picture.convert('L'))
+    if image.ndim == 3:
+        image = image[..., :3] @ numpy.array([0.299, 0.587, 0.114])
+    return image.astype(numpy.float32)
+
+
+def save_template(filename, image):
+    """Save a grayscale template as .npy or, with Pillow, an image file"""
+    if filename.lower().endswith('.npy'):
+        numpy.save(filename, image)
+    else:
+        PIL_Image.fromarray(numpy.clip(image, 0, 255).astype(numpy.uint8)).save(filename)
+
+
+def parse_region(text):
+    """Parse "x, y, width, height" (blank means no region)"""
+    if not text or not str(text).strip():
+        return None
+    values = [int(float(value)) for value in str(text).replace(';', ',').split(',')]
+    if len(values) != 4 or values[2] <= 0 or values[3] <= 0:
+        raise ValueError(f"region must be x, y, width, height: {text!r}")
+    return tuple(values)
+
+
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [('biSize', ctypes.c_uint32),
+                ('biWidth', ctypes.c_int32),
+                ('biHeight', ctypes.c_int32),
+                ('biPlanes', ctypes.c_uint16),
+                ('biBitCount', ctypes.c_uint16),
+                ('biCompression', ctypes.c_uint32),
+                ('biSizeImage', ctypes.c_uint32),
+                ('biXPelsPerMeter', ctypes.c_int32),
+                ('biYPelsPerMeter', ctypes.c_int32),
+                ('biClrUsed', ctypes.c_uint32),
+                ('biClrImportant', ctypes.c_uint32)]
+
+
+SRCCOPY = 0x00CC0020
+CAPTUREBLT = 0x40000000
+
+# Watched regions are compared with the previous frame in square tiles of this size
+REGION_TILE_SIZE = 32
+
+
+class ScreenCapture:
+    """Capture screen rectangles with GDI into a DIB section and gray buffers reused between frames"""
+    
+    def __init__(self):
+        handle = ctypes.c_void_p
+        self._user32 = ctypes.WinDLL('user32')
+        self._gdi32 = ctypes.WinDLL('gdi32')
+        self._user32.GetDC.restype = handle
+        self._user32.GetDC.argtypes = (handle,)
+        self._user32.ReleaseDC.argtypes = (handle, handle)
+        self._gdi32.CreateCompatibleDC.restype = handle
+        self._gdi32.CreateCompatibleDC.argtypes = (handle,)
+        self._gdi32.CreateDIBSection.restype = handle
+        self._gdi32.CreateDIBSection.argtypes = (handle, ctypes.c_void_p, ctypes.c_uint,
+                                                 ctypes.POINTER(ctypes.c_void_p), handle, ctypes.c_uint32)
+        self._gdi32.SelectObject.restype = handle
+        self._gdi32.SelectObject.argtypes = (handle, handle)
+        self._gdi32.BitBlt.argtypes = (handle, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                       handle, ctypes.c_int, ctypes.c_int, ctypes.c_uint32)
+        self._gdi32.DeleteObject.argtypes = (handle,)
+        self._gdi32.DeleteDC.argtypes = (handle,)
+        self._size = None
+        self._screen_dc = self._memory_dc = self._bitmap = self._previous = None
+    
+    @classmethod
+    def is_available(cls):
+        return os.name == 'nt' and hasattr(ctypes, 'WinDLL')
+    
+    def _allocate(self, width, height):
+        self.close()
+        self._screen_dc = self._user32.GetDC(None)
+        self._memory_dc = self._gdi32.CreateCompatibleDC(self._screen_dc)
+        header = BITMAPINFOHEADER(biSize=ctypes.sizeof(BITMAPINFOHEADER), biWidth=width,
+                                  biHeight=-height, biPlanes=1, biBitCount=32)  # Top-down BGRA
+        bits = ctypes.c_void_p()
+        self._bitmap = self._gdi32.CreateDIBSection(self._memory_dc, ctypes.byref(header), 0,
+                                                    ctypes.byref(bits), None, 0)
+        if not self._bitmap:
+            raise OSError("CreateDIBSection failed")
+        self._previous = self._gdi32.SelectObject(self._memory_dc, self._bitmap)
+        
+        # The arrays view the DIB memory directly: BitBlt fills them without a copy
+        pixels = (ctypes.c_uint8 * (width * height * 4)).from_address(bits.value)
+        self._pixels = numpy.frombuffer(pixels, dtype=numpy.uint8).reshape(height, width, 4)
+        self._gray = numpy.empty((height, width), dtype=numpy.float32)
+        self._scratch = numpy.empty((height, width), dtype=numpy.float32)
+        self._size = (width, height)
+    
+    def grab_bgra(self, left, top, width, height):
+        """Capture a screen rectangle as BGRA pixels (the returned array is reused by the next grab)"""
+        if self._size != (width, height):
+            self._allocate(width, height)
+        if not self._gdi32.BitBlt(self._memory_dc, 0, 0, width, height, self._screen_dc, left, top,
+                                  SRCCOPY | CAPTUREBLT):
+            raise OSError("BitBlt failed")
+        return self._pixels
+    
+    def grab(self, left, top, width, height):
+        """Capture a screen rectangle as grayscale (the returned array is reused by the next grab)"""
+        self.grab_bgra(left, top, width, height)
+        numpy.multiply(self._pixels[..., 2], numpy.float32(0.299), out=self._gray)
+        numpy.multiply(self._pixels[..., 1], numpy.float32(0.587), out=self._scratch)
+        self._gray += self._scratch
+        numpy.multiply(self._pixels[..., 0], numpy.float32(0.114), out=self._scratch)
+        self._gray += self._scratch
+        return self._gray
+    
+    def close(self):
+        if self._memory_dc:
+            self._gdi32.SelectObject(self._memory_dc, self._previous)
+            self._gdi32.DeleteObject(self._bitmap)
+            self._gdi32.DeleteDC(self._memory_dc)
+            self._user32.ReleaseDC(None, self._screen_dc)
+        self._size = None
+        self._screen_dc = self._memory_dc = self._bitmap = self._previous = None
+
+
+class TemplateLocator:
+    """Find template images on screen: capture only the region of interest, then match"""
+    
+    def __init__(self, latency_stats=None, capture=None):
+        self.latency_stats = latency_stats  # Receives 'capture' and 'match' samples
+        self._capture = capture  # Created on first use (GDI capture needs Windows)
+        self._matchers = {}  # (template file, threshold) -> TemplateMatcher
+        self.last_capture_ms = 0.0
+        self.last_match = None
+    
+    @property
+    def capture(self):
+        if self._capture is None:
+            self._capture = ScreenCapture()
+        return self._capture
+    
+    def matcher(self, template_file, threshold):
+        key = (template_file, threshold)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            matcher = TemplateMatcher(load_template(template_file), threshold=threshold)
+            self._matchers[key] = matcher
+        return matcher
+    
+    def locate(self, template_file, region, threshold=0.8):
+        """Screen position of the template's center within region (left, top, width, height), or None"""
+        matcher = self.matcher(template_file, threshold)
+        
+        start = time.perf_counter()
+        frame = self.capture.grab(*region)
+        capture_time = time.perf_counter() - start
+        result = matcher.match(frame)
+        
+        self.last_capture_ms = capture_time * 1000
+        self.last_match = result
+        if self.latency_stats is not None:
+            self.latency_stats.record('capture', capture_time)
+            self.latency_stats.record('match', result.match_ms / 1000)
+        if not result.found:
+            return None
+        return region[0] + result.x, region[1] + result.y
+    
+    def clear(self):
+        """Drop loaded templates (e.g. after the template file changed)"""
+        self._matchers.clear()
+
+
+def parse_color(text):
+    """Parse '#rrggbb' or 'r,g,b' into an (r, g, b) tuple"""
+    text = str(text).strip()
+    try:
+        if text.startswith('#') and len(text) == 7:
+            values = tuple(int(text[i:i + 2], 16) for i in (1, 3, 5))
+        else:
+            values = tuple(int(part) for part in text.split(','))
+    except ValueError:
+        values = ()
+    if len(values) != 3 or not all(0 <= value <= 255 for value in values):
+        raise ValueError(f"Invalid color {text!r}, expected #rrggbb or r,g,b")
+    return values
+
+
+class RegionCondition:
+    """Decide when a screen region changes or turns a color, re-checking only the tiles that changed
+    
+    Frames are split into square tiles and compared with the previous frame; only
+    tiles with changed pixels are evaluated again. update() returns True when the
+    condition becomes met. A 'change' condition then takes the current frame as its
+    new reference, so each further change fires again.
+    """
+    
+    MODES = ('change', 'color')
+    
+    def __init__(self, mode='change', color=None, tolerance=16, coverage=0.0, tile_size=REGION_TILE_SIZE):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown condition mode: {mode}")
+        if mode == 'color' and color is None:
+            raise ValueError("A color condition needs a color")
+        self.mode = mode
+        self.color = color  # (r, g, b)
+        self.tolerance = min(255, max(0, int(tolerance)))  # Largest per-channel difference that counts as equal
+        self.coverage = float(coverage)  # Fraction of tiles (change) or pixels (color) required, 0 = any
+        self.tile_size = int(tile_size)
+        self.met = False
+        self.frames = 0
+        self.fires = 0
+        self.tiles_checked = 0
+        self.tiles_seen = 0
+        self._shape = None
+        self._has_previous = False
+        self._has_reference = False
+    
+    def reset(self):
+        """Re-arm: evaluate every tile again and, for 'change', take the next frame as reference"""
+        self.met = False
+        self._has_previous = False
+        self._has_reference = False
+    
+    def _allocate(self, height, width):
+        size = self.tile_size
+        rows, columns = -(-height // size), -(-width // size)
+        # One uint32 per BGRA pixel, padded to whole tiles; the padding stays zero in every buffer
+        shape = (rows * size, columns * size)
+        self._current = numpy.zeros(shape, dtype=numpy.uint32)
+        self._previous = numpy.zeros(shape, dtype=numpy.uint32)
+        self._reference = numpy.zeros(shape, dtype=numpy.uint32)
+        self._changed = numpy.empty(shape, dtype=bool)
+        self._grid = (rows, columns)
+        self._shape = (height, width)
+        self._pixels = height * width
+        
+        if self.mode == 'change':
+            self._state = numpy.zeros(self._grid, dtype=bool)  # Tile differs from the reference
+        else:
+            self._state = numpy.zeros(self._grid, dtype=numpy.int64)  # Pixels of the color per tile
+            # One tile-sized block of the color per tile, so comparisons need no broadcasting
+            color = numpy.array(self.color[::-1] + (0,), dtype=numpy.uint8).view(numpy.uint32)[0]
+            self._color_tiles = numpy.full((rows * columns, size, size), color, dtype=numpy.uint32)
+            # Zero padding would count as black pixels
+            valid = numpy.zeros(shape, dtype=numpy.int64)
+            valid[:height, :width] = 1
+            padding = size * size - self._tiles(valid).sum(axis=(1, 3))
+            self._padding_matches = padding if max(self.color) <= self.tolerance else None
+        self.reset()
+    
+    def _tiles(self, image):
+        """(rows, size, columns, size) view of a padded image"""
+        rows, columns = self._grid
+        return image.reshape(rows, self.tile_size, columns, self.tile_size)
+    
+    def update(self, frame):
+        """Evaluate a BGRA frame (height, width, 4) of the region; returns True when the condition just became met"""
+        height, width = frame.shape[:2]
+        if self._shape != (height, width):
+            self._allocate(height, width)
+        current = self._current
+        # Whole pixels compare as single uint32 values
+        current[:height, :width] = frame.view(numpy.uint32)[..., 0]
+        
+        if self._has_previous:
+            numpy.not_equal(current, self._previous, out=self._changed)
+            # Reducing down each tile's rows first (contiguous) is far faster than over both axes at once
+            rows, columns = self._grid
+            changed = self._changed.reshape(rows, self.tile_size, -1).any(axis=1)
+            changed = changed.reshape(rows, columns, self.tile_size).any(axis=2)
+        else:
+            changed = numpy.ones(self._grid, dtype=bool)
+        
+        if self.mode == 'change' and not self._has_reference:
+            numpy.copyto(self._reference, current)
+            self._state[:] = False
+            self._has_reference = True
+        elif changed.any():
+            self._evaluate(changed)
+        
+        self._current, self._previous = self._previous, current
+        self._has_previous = True
+        self.frames += 1
+        self.tiles_checked += int(changed.sum())
+        self.tiles_seen += changed.size
+        
+        if self.mode == 'change':
+            met = self._state.any() and self._state.mean() >= self.coverage
+        else:
+            matched = self._state.sum()
+            met = matched > 0 and matched / self._pixels >= self.coverage
+        fired = met and not self.met
+        self.met = met
+        if fired:
+            self.fires += 1
+            if self.mode == 'change':
+                # Re-arm against the frame that fired
+                numpy.copyto(self._reference, current)
+                self._state[:] = False
+                self.met = False
+        return fired
+    
+    @staticmethod
+    def _channels(pixels):
+        """BGRA channels of uint32 pixels"""
+        return pixels.view(numpy.uint8).reshape(*pixels.shape, 4)
+    
+    def _evaluate(self, changed):
+        rows, columns = numpy.nonzero(changed)
+        # Advanced indexing gathers only the changed tiles: (n, size, size) pixels
+        tiles = self._tiles(self._current)[rows, :, columns]
+        if self.mode == 'change':
+            other = self._tiles(self._reference)[rows, :, columns]
+        else:
+            other = self._color_tiles[:len(rows)]
+        
+        # Per-channel absolute difference, kept in uint8
+        current, other = self._channels(tiles), self._channels(other)
+        difference = numpy.maximum(current, other)
+        difference -= numpy.minimum(current, other)
+        difference[..., 3] = 0  # Alpha is not compared
+        # A pixel is within the tolerance when none of its four channel flags is set
+        exceeds = difference > numpy.uint8(self.tolerance)
+        within = exceeds.view(numpy.uint32).reshape(len(rows), -1) == 0
+        
+        if self.mode == 'change':
+            self._state[rows, columns] = ~within.all(axis=1)
+        else:
+            matches = numpy.count_nonzero(within, axis=1)
+            if self._padding_matches is not None:
+                matches -= self._padding_matches[rows, columns]
+            self._state[rows, columns] = matches
+    
+    def get_stats(self):
+        return {
+            'frames': self.frames,
+            'fires': self.fires,
+            'tiles_checked_ratio': self.tiles_checked / self.tiles_seen if self.tiles_seen else 0.0,
+        }
+
 
-class PerformanceMonitor:
-    """Monitor and optimize application performance"""
+class RegionWatch:
+    """A watched screen region: its condition, sampling interval and CPU cost"""
     
-    def __init__(self):
-        self.last_update_time = time.time()
-        self.update_count = 0
-        self.adaptive_interval = 100  # Start with 100ms
-        
-    def should_update(self):
-        """Adaptive update frequency based on activity"""
-        current_time = time.time()
-        if current_time - self.last_update_time >= self.adaptive_interval / 1000:
-            self.last_update_time = current_time
-            self.update_count += 1
-            return True
+    def __init__(self, name, region, condition, interval=0.1, callback=None, capture=None):
+        self.name = name
+        self.region = tuple(region)  # Screen (left, top, width, height)
+        self.condition = condition
+        self.interval = max(0.001, float(interval))
+        self.callback = callback  # Called from the watcher thread with the watch when it fires
+        self._capture = capture
+        self._fired = threading.Event()
+        self.next_due = 0.0
+        self.added = None
+        self.samples = 0
+        self.errors = 0
+        self.cpu_seconds = 0.0
+        self.late_sum = self.late_max = 0.0
+    
+    @property
+    def capture(self):
+        # Each watch keeps its own capture buffers, sized to its region
+        if self._capture is None:
+            self._capture = ScreenCapture()
+        return self._capture
+    
+    def sample(self, late=0.0):
+        """Capture and evaluate the region once; returns whether the condition fired"""
+        start = time.thread_time()
+        try:
+            fired = self.condition.update(self.capture.grab_bgra(*self.region))
+        finally:
+            self.cpu_seconds += time.thread_time() - start
+            self.samples += 1
+            self.late_sum += late
+            self.late_max = max(self.late_max, late)
+        if fired:
+            self._fired.set()
+            if self.callback is not None:
+                self.callback(self)
+        return fired
+    
+    def wait(self, should_continue=None, poll=0.1):
+        """Block until the condition fires (consuming it); returns False once should_continue() is false"""
+        while should_continue is None or should_continue():
+            if self._fired.wait(poll):
+                self._fired.clear()
+                return True
         return False
     
-    def adjust_frequency(self, is_active):
-        """Adjust update frequency based on activity"""
-        if is_active:
-            self.adaptive_interval = max(50, self.adaptive_interval - 10)  # Increase frequency when active
-        else:
-            self.adaptive_interval = min(200, self.adaptive_interval + 5)  # Decrease when idle
+    def close(self):
+        if self._capture is not None:
+            self._capture.close()
+    
+    def get_stats(self, now=None):
+        if now is None:
+            now = time.perf_counter()
+        elapsed = now - self.added if self.added is not None else 0.0
+        return {
+            'samples': self.samples,
+            'errors': self.errors,
+            'cpu_percent': self.cpu_seconds / elapsed * 100 if elapsed > 0 else 0.0,
+            'cpu_per_sample_ms': self.cpu_seconds / self.samples * 1000 if self.samples else 0.0,
+            'late_mean_ms': self.late_sum / self.samples * 1000 if self.samples else 0.0,
+            'late_max_ms': self.late_max * 1000,
+            **self.condition.get_stats(),
+        }
 
 
-class WindowManager:
-    """Handle window-related operations with caching for performance"""
+class RegionWatcher:
+    """Sample any number of watched regions, each on its own cadence, from one background thread"""
     
-    def __init__(self):
-        self._window_cache = {}
-        self._cache_time = 0
-        self._cache_timeout = 2.0  # Cache for 2 seconds
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._watches = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
     
-    @lru_cache(maxsize=128)
-    def get_open_window_titles(self):
-        """Get all currently open and visible window titles (cached)"""
-        current_time = time.time()
-        if current_time - self._cache_time < self._cache_timeout and self._window_cache:
-            return self._window_cache.get('titles', [])
-        
-        titles = []
+    def add(self, watch):
+        """Start sampling watch (replacing any watch with the same name)"""
+        watch.added = watch.next_due = self.clock()
+        with self._lock:
+            previous = self._watches.get(watch.name)
+            self._watches[watch.name] = watch
+        if previous is not None:
+            previous.close()
+        self.start()
+        self._wake.set()
+        return watch
+    
+    def remove(self, name):
+        with self._lock:
+            watch = self._watches.pop(name, None)
+        if watch is not None:
+            watch.close()
+        return watch
+    
+    def __contains__(self, name):
+        return name in self._watches
+    
+    def poll(self):
+        """Sample the watches that are due; returns seconds until the next one is due, or None"""
+        with self._lock:
+            watches = list(self._watches.values())
+        for watch in watches:
+            now = self.clock()
+            if now < watch.next_due:
+                continue
+            try:
+                watch.sample(now - watch.next_due)
+            except Exception as e:
+                watch.errors += 1
+                logging.error(f"Error sampling watched region {watch.name}: {e}")
+            # Missed samples are skipped rather than run back to back
+            watch.next_due = max(watch.next_due + watch.interval, now)
+        if not watches:
+            return None
+        return max(0.0, min(watch.next_due for watch in watches) - self.clock())
+    
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="RegionWatcher", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        with self._lock:
+            watches, self._watches = list(self._watches.values()), {}
+        for watch in watches:
+            watch.close()
+    
+    def _run(self):
+        while self._running:
+            delay = self.poll()
+            self._wake.wait(delay)
+            self._wake.clear()
+    
+    def get_stats(self):
+        now = self.clock()
+        with self._lock:
+            return {name: watch.get_stats(now) for name, watch in self._watches.items()}
+
+
+class ActionEngine:
+    """UI-independent click and key delivery shared by the GUI and headless mode"""
+    
+    def __init__(self, input_backend=None):
+        self.window_manager = WindowManager()
+        self.target_resolver = TargetWindowResolver(self.window_manager)
+        self.latency_stats = LatencyStats()
+        self.focus_tracker = FocusTracker(self.latency_stats)
+        self.message_sender = WindowMessageSender()
+        self.mouse_handler = MouseHandler(create_input_backend(input_backend))
+        self.template_locator = TemplateLocator(self.latency_stats)
+        self.region_watcher = RegionWatcher()
+    
+    def parallel_macro_player(self, target_window, **kwargs):
+        """ParallelMacroPlayer for every window whose title contains target_window; raises ValueError if none"""
+        if not target_window:
+            raise ValueError("set a target window to play in every matching window")
+        windows = self.window_manager.find_target_window(target_window)
+        if not windows:
+            raise ValueError(f"no window matches {target_window!r}")
+        return ParallelMacroPlayer(windows, message_sender=self.message_sender, **kwargs)
+    
+    def client_origin(self, target_window):
+        """Screen position of the target window's client (0, 0), or None if unset or not found"""
+        hwnd = self.resolve(target_window)
+        if not hwnd:
+            return None
+        return tuple(win32gui.ClientToScreen(hwnd, (0, 0)))
+    
+    def resolve(self, target_window, resolver=None):
+        """Resolve a window title to a handle (None if unset or not found)"""
+        if not target_window:
+            return None
+        start = time.perf_counter()
+        hwnd = (resolver or self.target_resolver).resolve(target_window)
+        self.latency_stats.record('resolve', time.perf_counter() - start)
+        return hwnd
+    
+    def perform_click(self, hwnd, x, y, button, clicks, delivery_mode):
+        """Click at (x, y) in the foreground or by posting to hwnd; returns success"""
+        if hwnd and delivery_mode == "background":
+            # Post straight to the target window without stealing focus
+            start = time.perf_counter()
+            try:
+                self.message_sender.click(hwnd, x, y, button, clicks)
+                success = True
+            except Exception as e:
+                logging.error(f"Error posting click to window: {e}")
+                success = False
+            self.latency_stats.record('background_click', time.perf_counter() - start)
+            return success
         
-        def enum_windows_callback(hwnd, lParam):
-            if win32gui.IsWindowVisible(hwnd):
-                title = win32gui.GetWindowText(hwnd)
-                if title.strip():
-                    titles.append(title)
-            return True
+        # Focus target window only if it lost the foreground
+        if hwnd:
+            self.focus_tracker.ensure_focus(hwnd)
         
-        try:
-            win32gui.EnumWindows(enum_windows_callback, None)
-            unique_titles = sorted(list(set(titles)))
-            self._window_cache['titles'] = unique_titles
-            self._cache_time = current_time
-            return unique_titles
-        except Exception as e:
-            logging.error(f"Error getting window titles: {e}")
-            return []
+        start = time.perf_counter()
+        success = self.mouse_handler.click_at_position(x, y, button, clicks)
+        self.latency_stats.record('foreground_click', time.perf_counter() - start)
+        return success
     
-    def find_target_window(self, target_window_name):
-        """Find target windows in the system"""
-        found_windows = []
+    def perform_key_press(self, hwnd, key, delivery_mode):
+        """Press key in the foreground or by posting to hwnd; returns success"""
+        background = bool(hwnd) and delivery_mode == "background"
         
-        def enum_windows_callback(hwnd, lParam):
-            if win32gui.IsWindowVisible(hwnd):
-                window_title = win32gui.GetWindowText(hwnd)
-                if window_title and target_window_name.lower() in window_title.lower():
-                    found_windows.append((hwnd, window_title))
-            return True
+        if hwnd and not background:
+            self.focus_tracker.ensure_focus(hwnd)
         
+        start = time.perf_counter()
         try:
-            win32gui.EnumWindows(enum_windows_callback, None)
+            if background:
+                self.message_sender.press_key(hwnd, key)
+            else:
+                pyautogui.press(key, _pause=False)
         except Exception as e:
-            logging.error(f"Error finding window: {e}")
-        
-        return found_windows
+            logging.error(f"Error pressing key {key}: {e}")
+            return False
+        self.latency_stats.record('background_key' if background else 'foreground_key',
+                                  time.perf_counter() - start)
+        return True
     
-    def clear_cache(self):
-        """Clear the window cache"""
-        self._window_cache.clear()
-        self.get_open_window_titles.cache_clear()
-
-
-class KeyboardHandler:
-    """Handle keyboard input efficiently"""
+    def perform_action(self, snapshot):
+        """Perform the action described by an ActionSnapshot; returns success"""
+        hwnd = self.resolve(snapshot.target_window)
+        if snapshot.action_type == "mouse":
+            return self.perform_click(hwnd, snapshot.x, snapshot.y, snapshot.button, snapshot.clicks,
+                                      snapshot.delivery_mode)
+        if snapshot.action_type == "image":
+            return self.perform_image_click(hwnd, snapshot)
+        return self.perform_key_press(hwnd, snapshot.key, snapshot.delivery_mode)
     
-    def __init__(self):
-        self.registered_hotkeys = set()
+    def capture_region(self, hwnd, region=None):
+        """Screen rectangle to search: region within hwnd's client area, or within the screen
+        
+        Returns None when there is nothing on screen to capture: a minimized target
+        (its client area is 0x0) or a region that does not overlap the client area.
+        """
+        if hwnd:
+            if win32gui.IsIconic(hwnd):
+                return None
+            left, top = win32gui.ClientToScreen(hwnd, (0, 0))
+            width, height = win32gui.GetClientRect(hwnd)[2:]
+        else:
+            left = win32api.GetSystemMetrics(win32con.SM_XVIRTUALSCREEN)
+            top = win32api.GetSystemMetrics(win32con.SM_YVIRTUALSCREEN)
+            width = win32api.GetSystemMetrics(win32con.SM_CXVIRTUALSCREEN)
+            height = win32api.GetSystemMetrics(win32con.SM_CYVIRTUALSCREEN)
+        if region:
+            x, y, region_width, region_height = region
+            x, y = min(max(x, 0), width - 1), min(max(y, 0), height - 1)
+            left, top = left + x, top + y
+            width, height = min(region_width, width - x), min(region_height, height - y)
+        if width <= 0 or height <= 0:
+            return None
+        return left, top, width, height
     
-    def register_hotkey(self, hotkey, callback):
-        """Register a hotkey with error handling"""
+    def perform_image_click(self, hwnd, snapshot):
+        """Click the center of the template image if it is found; returns whether it was clicked"""
+        if not snapshot.template_file:
+            return False
+        # The capture reads the screen, so a foreground target must be on top first
+        if hwnd and snapshot.delivery_mode != "background":
+            self.focus_tracker.ensure_focus(hwnd)
+        region = self.capture_region(hwnd, snapshot.template_region)
+        if region is None:
+            logging.debug("Image click skipped: the target window is minimized or the region is empty")
+            return False
         try:
-            if hotkey in self.registered_hotkeys:
-                keyboard.remove_hotkey(hotkey)
-            keyboard.add_hotkey(hotkey, callback)
-            self.registered_hotkeys.add(hotkey)
-            return True
+            point = self.template_locator.locate(snapshot.template_file, region, snapshot.template_threshold)
         except Exception as e:
-            logging.error(f"Failed to register hotkey {hotkey}: {e}")
+            logging.error(f"Error locating template {snapshot.template_file}: {e}")
+            return False
+        if point is None:
             return False
+        return self.perform_click(hwnd, point[0], point[1], snapshot.button, snapshot.clicks,
+                                  snapshot.delivery_mode)
     
-    def unregister_all(self):
-        """Unregister all hotkeys"""
-        for hotkey in self.registered_hotkeys.copy():
-            try:
-                keyboard.remove_hotkey(hotkey)
-                self.registered_hotkeys.remove(hotkey)
-            except Exception as e:
-                logging.error(f"Failed to unregister hotkey {hotkey}: {e}")
+    def watch_condition(self, name, target_window, condition, callback=None):
+        """Start sampling a ConditionSpec's region of the target window (or screen); returns the RegionWatch"""
+        region = self.capture_region(self.resolve(target_window), condition.region)
+        if region is None:
+            raise ValueError(f"window {target_window!r} is minimized or the region is outside its client area")
+        return self.region_watcher.add(RegionWatch(name, region, condition.create(), condition.interval, callback))
+    
+    def execute_job(self, job):
+        """Run one job action (called from the job scheduler thread)"""
+        hwnd = self.resolve(job.target_window, job.resolver)
+        if job.action_type == "mouse":
+            return self.perform_click(hwnd, job.x, job.y, job.button, job.clicks, job.delivery_mode)
+        return self.perform_key_press(hwnd, job.key, job.delivery_mode)
+    
+    def new_job_resolver(self):
+        return TargetWindowResolver(self.window_manager)
 
 
-class MouseHandler:
-    """Handle mouse operations with optimizations"""
+class HeadlessRunner:
+    """Run a configuration, its jobs or a macro without building the Tk UI"""
     
-    def __init__(self):
-        self.last_position = None
-        self.position_cache_time = 0
-        self.cache_duration = 0.05  # Cache position for 50ms
+    def __init__(self, config, macro=None, run_jobs=False, duration=None, count=None, repeat=1,
+                 use_hotkeys=True, start_paused=False, metrics_port=None):
+        self.config = config
+        self.macro = macro
+        self.run_jobs = run_jobs
+        self.duration = duration
+        self.count = count
+        self.repeat = repeat  # Macro passes, 0 = until stopped
+        self.use_hotkeys = use_hotkeys
+        
+        self.engine = ActionEngine(config.get('input_backend'))
+        self.scheduler = ActionScheduler(latency_stats=self.engine.latency_stats)
+        self.job_scheduler = JobScheduler(self.engine.execute_job)
+        self.metrics_server = MetricsServer(self.render_metrics, metrics_port) if metrics_port else None
+        self.keyboard_handler = KeyboardHandler()
+        
+        self.active = threading.Event()  # Toggled by the start/stop hotkey
+        self.stopped = threading.Event()
+        if not start_paused:
+            self.active.set()
+        self.exit_code = EXIT_OK
+        self.action_count = 0
     
-    def get_mouse_position(self, force_update=False):
-        """Get mouse position with caching"""
-        current_time = time.time()
-        if not force_update and self.last_position and (current_time - self.position_cache_time) < self.cache_duration:
-            return self.last_position
+    def render_metrics(self):
+        return render_metrics(self.engine.latency_stats, self.scheduler, self.job_scheduler,
+                              running=self.active.is_set() and not self.stopped.is_set(),
+                              actions=self.action_count, region_watcher=self.engine.region_watcher)
+    
+    def toggle(self):
+        """Pause or resume (start/stop hotkey)"""
+        if self.active.is_set():
+            self.active.clear()
+            logging.info("Headless run paused")
+        else:
+            self.active.set()
+            logging.info("Headless run resumed")
+    
+    def emergency_stop(self):
+        """Stop immediately (emergency hotkey)"""
+        self.exit_code = EXIT_STOPPED
+        self.stopped.set()
+        self.active.set()  # Release anything waiting for resume
+        logging.warning("Headless run stopped by emergency hotkey")
+    
+    def _should_continue(self):
+        return self.active.is_set() and not self.stopped.is_set()
+    
+    def _wait_active(self):
+        """Block while paused; returns False once stopped"""
+        while not self.active.wait(0.1):
+            if self.stopped.is_set():
+                return False
+        return not self.stopped.is_set()
+    
+    def _run_actions(self):
+        """Repeat the configured action on absolute deadlines, or each time its condition fires"""
+        snapshot = ActionSnapshot.from_config(self.config)
+        if snapshot.condition is not None:
+            watch = self.engine.watch_condition('actions', snapshot.target_window, snapshot.condition)
+            try:
+                while self._wait_active():
+                    while watch.wait(self._should_continue):
+                        if not self.engine.perform_action(snapshot):
+                            self.exit_code = EXIT_ERROR
+                        self.action_count += 1
+                        if self.count and self.action_count >= self.count:
+                            return
+            finally:
+                logging.info(f"Condition watch: {watch.get_stats()}")
+                self.engine.region_watcher.remove(watch.name)
+            return
         
+        with HighResolutionTimer():
+            while self._wait_active():
+                self.scheduler.reset(snapshot.interval)
+                while self.scheduler.wait_next(self._should_continue):
+                    if not self.engine.perform_action(snapshot):
+                        self.exit_code = EXIT_ERROR
+                    self.action_count += 1
+                    if self.count and self.action_count >= self.count:
+                        return
+    
+    def _run_macro(self):
+        """Play the macro the requested number of passes"""
         try:
-            position = pyautogui.position()
-            self.last_position = position
-            self.position_cache_time = current_time
-            return position
-        except Exception as e:
-            logging.error(f"Error getting mouse position: {e}")
-            return (0, 0)
+            speed = float(self.config.get('macro_speed', 1.0))
+        except (TypeError, ValueError):
+            speed = 1.0
+        catch_up = self.config.get('macro_catch_up', 'drop_moves')
+        if self.config.get('macro_parallel_windows'):
+            player = self.engine.parallel_macro_player(
+                self.config.get('target_window', ''), speed=speed, catch_up=catch_up,
+                max_workers=self.config.get('macro_parallel_workers', 8), progress_interval=10.0)
+            windows = len(player.windows)
+            player.progress = lambda progress: logging.info(
+                f"Macro progress: {format_parallel_progress(progress, windows)}")
+        else:
+            player = MacroPlayer(self.engine.mouse_handler, speed=speed, catch_up=catch_up,
+                                 progress=lambda progress: logging.info(f"Macro progress: {format_macro_progress(progress)}"),
+                                 progress_interval=10.0)
+        condition = ConditionSpec.from_config(self.config) if self.config.get('macro_wait_condition') else None
+        watch = None
+        if condition is not None:
+            watch = self.engine.watch_condition('macro', self.config.get('target_window', ''), condition)
+        try:
+            self._play_passes(player, watch)
+        finally:
+            if watch is not None:
+                logging.info(f"Condition watch: {watch.get_stats()}")
+                self.engine.region_watcher.remove(watch.name)
     
-    def click_at_position(self, x, y, button='left', clicks=1):
-        """Optimized click operation"""
+    def _play_passes(self, player, watch=None):
+        """Play the macro passes, each one once the condition fires when watch is given"""
+        passes = 0
+        while (not self.repeat or passes < self.repeat) and self._wait_active():
+            # Each pass starts when the condition fires
+            if watch is not None and not watch.wait(self._should_continue):
+                continue
+            with HighResolutionTimer():
+                stats = player.play(self.macro, self._should_continue)
+            logging.info(f"Headless macro pass {passes + 1}: {stats}")
+            if stats.get('failed'):
+                self.exit_code = EXIT_ERROR
+            self.action_count += stats['executed']
+            # A pass paused midway restarts from the beginning on resume
+            if not stats['cancelled']:
+                passes += 1
+    
+    def _run_jobs(self):
+        """Run the configured jobs until they finish or the run is stopped"""
+        for job_config in self.config.get('jobs', []):
+            job = ClickJob.from_dict(job_config)
+            job.resolver = self.engine.new_job_resolver()
+            self.job_scheduler.add_job(job)
+        
         try:
-            pyautogui.click(x, y, clicks=clicks, button=button)
-            return True
+            resume = False
+            while self.job_scheduler.jobs and self._wait_active():
+                # Resuming after a pause keeps each job's runs and next deadline
+                self.job_scheduler.start(resume=resume)
+                resume = True
+                while self._should_continue() and self.job_scheduler.active_count():
+                    self.stopped.wait(0.1)
+                self.job_scheduler.stop()
+                if not self.job_scheduler.active_count():
+                    break
+        finally:
+            self.job_scheduler.stop()
+            self.action_count = sum(job.run_count for job in self.job_scheduler.jobs.values())
+    
+    def _worker(self):
+        try:
+            if self.macro is not None:
+                self._run_macro()
+            elif self.run_jobs:
+                self._run_jobs()
+            else:
+                self._run_actions()
         except Exception as e:
-            logging.error(f"Error clicking at ({x}, {y}): {e}")
-            return False
+            logging.error(f"Error in headless run: {e}", exc_info=True)
+            self.exit_code = EXIT_ERROR
+        finally:
+            self.stopped.set()
+    
+    def run(self):
+        """Run until finished, the duration elapses or a hotkey stops it; returns the exit code"""
+        if self.use_hotkeys:
+            self.keyboard_handler.register_hotkey(self.config.get('hotkey_start_stop', 'f6'), self.toggle)
+            self.keyboard_handler.register_hotkey(self.config.get('emergency_stop_hotkey', 'f12'),
+                                                  self.emergency_stop)
+        if self.metrics_server is not None and not self.metrics_server.start():
+            return EXIT_USAGE
+        
+        worker = threading.Thread(target=self._worker, daemon=True)
+        worker.start()
+        deadline = time.perf_counter() + self.duration if self.duration else None
+        
+        try:
+            # Short waits keep Ctrl+C responsive on Windows
+            while not self.stopped.wait(0.2):
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+        except KeyboardInterrupt:
+            self.exit_code = EXIT_INTERRUPTED
+        finally:
+            self.stopped.set()
+            self.active.set()
+            worker.join(timeout=2.0)
+            self.engine.region_watcher.stop()
+            self.keyboard_handler.unregister_all()
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+        
+        logging.info(f"Headless run finished: {self.action_count} actions, exit code {self.exit_code}, "
+                     f"latency {self.engine.latency_stats.get_stats()}")
+        print(f"{self.action_count} actions performed (exit code {self.exit_code})")
+        return self.exit_code
+
+
+def run_headless(args):
+    """Headless entry point: load the config and macro and run without the GUI"""
+    try:
+        if args.config:
+            config = read_config(args.config)
+        elif args.profile or os.path.exists(PROFILE_DB):
+            profiles = ProfileStore(PROFILE_DB)
+            name = args.profile or profiles.active
+            if name not in profiles:
+                raise ValueError(f"no profile named {name!r} (profiles: {', '.join(profiles.names()) or 'none'})")
+            config = profiles.get(name)
+            profiles.close()
+        elif os.path.exists(CONFIG_FILE):
+            config = read_config(CONFIG_FILE)
+        else:
+            config = DEFAULT_CONFIG.copy()
+        # Compiling validates every event before the run starts
+        macro = compile_macro(open_macro(args.macro)) if args.macro else None
+    except (OSError, ValueError) as e:
+        logging.error(f"Headless startup failed: {e}")
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    
+    if macro is not None and not len(macro):
+        print("Error: macro is empty", file=sys.stderr)
+        return EXIT_USAGE
+    if macro is not None and args.repeat == 0 and macro.end_time <= 0 and not macro.has_waits:
+        # Passes that take no time would replay back to back at full CPU
+        print("Error: --repeat 0 needs a macro that takes time to play (add a wait)", file=sys.stderr)
+        return EXIT_USAGE
+    if args.jobs and not config.get('jobs'):
+        print("Error: configuration has no jobs", file=sys.stderr)
+        return EXIT_USAGE
+    
+    runner = HeadlessRunner(config, macro=macro, run_jobs=args.jobs, duration=args.duration,
+                            count=args.count, repeat=args.repeat, use_hotkeys=not args.no_hotkeys,
+                            start_paused=args.paused,
+                            metrics_port=args.metrics_port or (config.get('metrics_port') if config.get('metrics_enabled') else None))
+    return runner.run()
+
+
+class StartupTimer:
+    """Record startup phase durations for the log"""
+    
+    def __init__(self, start=None):
+        self._start = start if start is not None else time.perf_counter()
+        self._last = self._start
+        self.phases = []
+    
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+    
+    def report(self):
+        phases = ", ".join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in self.phases)
+        return f"Startup: {phases}, total {(self._last - self._start) * 1000:.1f}ms"
+
+
+# Time between UI queue drains while work runs (coalesces bursts of worker updates)
+UI_DRAIN_INTERVAL = 0.05
+# Slowest drain while idle, when only hotkeys and the config file watcher post
+UI_IDLE_DRAIN_INTERVAL = 0.25
+
+# Edits are written to the active profile once they pause this long
+PROFILE_SAVE_DELAY_MS = 1000
+
+# Side of the square captured around the mouse by "Capture" in the image settings
+TEMPLATE_CAPTURE_SIZE = 48
 
 
 class AutoActionClicker:
     """Main application class with performance optimizations"""
     
-    def __init__(self):
+    # Configuration keys and the Tk variables that edit them
+    CONFIG_VARIABLES = (
+        ('click_interval', 'interval_var'),
+        ('rate_mode', 'rate_mode_var'),
+        ('clicks_per_second', 'cps_var'),
+        ('action_type', 'action_type_var'),
+        ('mouse_button', 'mouse_button_var'),
+        ('click_type', 'click_type_var'),
+        ('x_coordinate', 'x_var'),
+        ('y_coordinate', 'y_var'),
+        ('keyboard_key', 'keyboard_key_var'),
+        ('template_file', 'template_file_var'),
+        ('template_threshold', 'template_threshold_var'),
+        ('template_region', 'template_region_var'),
+        ('condition_mode', 'condition_mode_var'),
+        ('condition_region', 'condition_region_var'),
+        ('condition_color', 'condition_color_var'),
+        ('condition_tolerance', 'condition_tolerance_var'),
+        ('condition_coverage', 'condition_coverage_var'),
+        ('condition_interval_ms', 'condition_interval_var'),
+        ('target_window', 'target_window_var'),
+        ('hotkey_start_stop', 'start_hotkey_var'),
+        ('emergency_stop_hotkey', 'emergency_hotkey_var'),
+        ('auto_resize_window', 'auto_resize_var'),
+        ('delivery_mode', 'delivery_mode_var'),
+        ('macro_speed', 'macro_speed_var'),
+        ('macro_catch_up', 'macro_catch_up_var'),
+        ('path_tolerance', 'path_tolerance_var'),
+        ('simplify_on_save', 'simplify_on_save_var'),
+        ('macro_wait_condition', 'macro_wait_condition_var'),
+        ('macro_parallel_windows', 'macro_parallel_windows_var'),
+        ('macro_parallel_workers', 'macro_parallel_workers_var'),
+        ('metrics_enabled', 'metrics_enabled_var'),
+        ('metrics_port', 'metrics_port_var'),
+        ('theme', 'theme_var'),
+    )
+    
+    def __init__(self, profile=None):
+        # Module import time counts from the first line of the module
+        self.startup_timer = StartupTimer(_import_start)
+        self.startup_timer.mark('import')
+        
         # Initialize components
-        self.performance_monitor = PerformanceMonitor()
-        self.window_manager = WindowManager()
+        self.macro_recorder = MacroRecorder()
         self.keyboard_handler = KeyboardHandler()
-        self.mouse_handler = MouseHandler()
         
         # Application state
         self.is_clicking = False
+        self._click_run = 0  # Incremented per start, so a worker from an earlier run stops
         self.is_recording_macro = False
-        self.recorded_actions = []
+        self.is_playing_macro = False
+        self.recorded_actions = MacroStore()
+        self._compiled_macro = (None, 0, None)  # (source macro, event count, CompiledMacro)
+        self._temp_macro_files = []
         self.click_count = 0
         self.start_time = None
+        self.action_snapshot = None  # Replaced (never mutated) on start and on Apply
+        
+        # Worker threads reach the UI only through this queue
+        self.ui_queue = UIUpdateQueue()
         
         # Configuration
-        self.config_file = "autoclick_config.json"
-        self.default_config = {
-            'click_interval': 1.0,
-            'action_type': 'mouse',
-            'mouse_button': 'left',
-            'click_type': 'single',
-            'x_coordinate': 100,
-            'y_coordinate': 100,
-            'keyboard_key': 'space',
-            'target_window': '',
-            'hotkey_start_stop': 'f6',
-            'emergency_stop_hotkey': 'f12',
-            'auto_resize_window': True,
-            'theme': 'arc'
-        }
+        self.config_file = CONFIG_FILE
+        self.default_config = DEFAULT_CONFIG.copy()
+        self.profiles = None
+        self.profile_name = DEFAULT_PROFILE
+        self.linked_config_file = None  # JSON file followed by the file watcher after Load Config
+        self._profile_hotkeys = []
+        self._profile_save_job = None
+        self._applying_config = False
         
         # Load configuration
-        self.config = self.load_config()
-          # Setup GUI
+        self.config = self.load_config(profile)
+        self.engine = ActionEngine(self.config.get('input_backend'))
+        self.window_manager = self.engine.window_manager
+        self.target_resolver = self.engine.target_resolver
+        self.latency_stats = self.engine.latency_stats
+        self.focus_tracker = self.engine.focus_tracker
+        self.message_sender = self.engine.message_sender
+        self.mouse_handler = self.engine.mouse_handler
+        self.scheduler = ActionScheduler(latency_stats=self.latency_stats)
+        self.job_scheduler = JobScheduler(self.engine.execute_job)
+        self.metrics_server = MetricsServer(self.render_metrics, self.config.get('metrics_port', 9464))
+        if self.config.get('metrics_enabled'):
+            self.metrics_server.start()
+        for job_config in self.config.get('jobs', []):
+            self._add_job(ClickJob.from_dict(job_config))
+        self.startup_timer.mark('init')
+        
+        # Setup GUI
         self._setup_window()
+        self.startup_timer.mark('window')
         self._create_widgets()
         self._setup_event_handlers()
         self._setup_hotkeys()
+        self.startup_timer.mark('widgets')
+        
+        # Refresh loops run only while visible and something can change
+        self.ui_refresh = UIRefreshController(
+            self.root.after, self.root.after_cancel, self._update_mouse_position, self._update_statistics,
+            frame_interval=1000 / display_refresh_rate())
+        # The UI queue is polled from the main loop, backing off while nothing is posted
+        self.ui_drain_loop = RefreshLoop(self.root.after, self.root.after_cancel, self._drain_ui_queue,
+                                         UI_DRAIN_INTERVAL * 1000, UI_IDLE_DRAIN_INTERVAL * 1000)
+        self.ui_drain_loop.set_enabled(True)
+        self._focus_check_pending = False
+        self._update_refresh_state()
         
-        # Start performance monitoring
-        self._start_performance_monitoring()
+        # Edits are saved to the active profile (debounced); outside changes are applied live
+        self._trace_config_variables()
+        self.file_watcher = FileWatcher(
+            lambda key: self.ui_queue.post(lambda: self._on_watched_change(key), key=f"watch:{key}"))
+        if self.profiles is not None:
+            self.file_watcher.watch('profiles', self.profiles.data_version)
+        self.file_watcher.start()
+        
+        # Idle callbacks run after Tk has drawn the first frame
+        self.root.after_idle(self._log_startup_time)
     
     def _setup_window(self):
         """Setup main window properties"""
-        if THEMES_AVAILABLE and ThemedTk is not None:
-            self.root = ThemedTk(theme=self.config.get('theme', 'arc'))
+        if THEMES_AVAILABLE:
+            self.root = ttkthemes.ThemedTk(theme=self.config.get('theme', 'arc'))
         else:
             self.root = tk.Tk()
         
@@ -275,17 +5142,71 @@ class AutoActionClicker:
         except Exception:
             pass
     
+    def _log_startup_time(self):
+        self.startup_timer.mark('first_paint')
+        logging.info(self.startup_timer.report())
+    
     def _create_widgets(self):
         """Create all GUI widgets"""
         # Main notebook for tabs
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill="both", expand=True, padx=10, pady=5)
         
-        # Create tabs
+        # Variables of the lazily built tabs exist from the start (config save/load uses them)
+        self._create_tab_variables()
+        
+        # Create tabs: only the visible one now, the others when first selected
+        self._lazy_tabs = {}
         self._create_main_tab()
-        self._create_settings_tab()
-        self._create_macro_tab()
-        self._create_about_tab()
+        self._add_lazy_tab("Settings", self._create_settings_tab)
+        self._add_lazy_tab("Macro Recorder", self._create_macro_tab)
+        self._add_lazy_tab("Statistics", self._create_statistics_tab)
+        self._add_lazy_tab("About", self._create_about_tab)
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+    
+    def _create_tab_variables(self):
+        """Create the Settings and Macro Recorder tab variables"""
+        self.start_hotkey_var = tk.StringVar(value=self.config.get('hotkey_start_stop', 'f6'))
+        self.emergency_hotkey_var = tk.StringVar(value=self.config.get('emergency_stop_hotkey', 'f12'))
+        self.auto_resize_var = tk.BooleanVar(value=self.config.get('auto_resize_window', True))
+        if THEMES_AVAILABLE:
+            self.theme_var = tk.StringVar(value=self.config.get('theme', 'arc'))
+        
+        self.macro_speed_var = tk.DoubleVar(value=self.config.get('macro_speed', 1.0))
+        self.macro_catch_up_var = tk.StringVar(value=self.config.get('macro_catch_up', 'drop_moves'))
+        self.macro_goto_var = tk.StringVar()
+        self.macro_block_from_var = tk.StringVar()
+        self.macro_block_to_var = tk.StringVar()
+        self.macro_repeat_count_var = tk.IntVar(value=10)
+        self.macro_block_seconds_var = tk.DoubleVar(value=1.0)
+        self.path_tolerance_var = tk.DoubleVar(value=self.config.get('path_tolerance', 2.0))
+        self.simplify_on_save_var = tk.BooleanVar(value=self.config.get('simplify_on_save', False))
+        self.macro_wait_condition_var = tk.BooleanVar(value=self.config.get('macro_wait_condition', False))
+        self.macro_parallel_windows_var = tk.BooleanVar(value=self.config.get('macro_parallel_windows', False))
+        self.macro_parallel_workers_var = tk.IntVar(value=self.config.get('macro_parallel_workers', 8))
+        
+        self.metrics_enabled_var = tk.BooleanVar(value=self.config.get('metrics_enabled', False))
+        self.metrics_port_var = tk.IntVar(value=self.config.get('metrics_port', 9464))
+        
+        self.profile_var = tk.StringVar(value=self.profile_name)
+        self.profile_hotkey_var = tk.StringVar(
+            value=self.profiles.hotkeys().get(self.profile_name, '') if self.profiles else '')
+    
+    def _add_lazy_tab(self, text, builder):
+        """Add an empty tab whose contents are built the first time it is selected"""
+        frame = ttk.Frame(self.notebook)
+        self.notebook.add(frame, text=text)
+        self._lazy_tabs[str(frame)] = builder
+    
+    def _on_tab_changed(self, event=None):
+        builder = self._lazy_tabs.pop(self.notebook.select(), None)
+        if builder is not None:
+            start = time.perf_counter()
+            builder(self.notebook.nametowidget(self.notebook.select()))
+            logging.info(f"Built {builder.__name__} in {(time.perf_counter() - start) * 1000:.1f}ms")
+        elif hasattr(self, 'latency_tree') and self.notebook.tab(self.notebook.select(), "text") == "Statistics":
+            # Not refreshed while idle, so bring it up to date when shown
+            self._update_statistics_tab()
     
     def _create_main_tab(self):
         """Create main control tab"""
@@ -297,13 +5218,25 @@ class AutoActionClicker:
         window_frame.pack(fill="x", padx=5, pady=5)
         
         self.target_window_var = tk.StringVar(value=self.config.get('target_window', ''))
+        # Windows are enumerated when the list is opened, not at startup
         self.window_combo = ttk.Combobox(window_frame, textvariable=self.target_window_var, 
-                                        state="readonly", width=50)
+                                        state="readonly", width=50, postcommand=self._update_window_list)
         self.window_combo.pack(side="left", fill="x", expand=True, padx=(0, 5))
         
         ttk.Button(window_frame, text="Refresh", 
                   command=self.refresh_windows).pack(side="right")
         
+        # Delivery mode: focus the window and inject input, or post messages in the background
+        delivery_frame = ttk.Frame(main_frame)
+        delivery_frame.pack(fill="x", padx=15)
+        
+        ttk.Label(delivery_frame, text="Delivery:").pack(side="left", padx=(0, 5))
+        self.delivery_mode_var = tk.StringVar(value=self.config.get('delivery_mode', 'foreground'))
+        ttk.Radiobutton(delivery_frame, text="Foreground", variable=self.delivery_mode_var,
+                       value="foreground").pack(side="left")
+        ttk.Radiobutton(delivery_frame, text="Background (no focus)", variable=self.delivery_mode_var,
+                       value="background").pack(side="left")
+        
         # Action type selection
         action_frame = ttk.LabelFrame(main_frame, text="Action Type", padding=10)
         action_frame.pack(fill="x", padx=5, pady=5)
@@ -313,14 +5246,17 @@ class AutoActionClicker:
                        value="mouse", command=self.on_action_type_change).pack(side="left")
         ttk.Radiobutton(action_frame, text="Keyboard Press", variable=self.action_type_var,
                        value="keyboard", command=self.on_action_type_change).pack(side="left")
+        ttk.Radiobutton(action_frame, text="Click Image", variable=self.action_type_var,
+                       value="image", command=self.on_action_type_change).pack(side="left")
         
         # Settings container
         self.settings_container = ttk.Frame(main_frame)
         self.settings_container.pack(fill="both", expand=True, padx=5, pady=5)
         
-        # Create mouse/keyboard settings sections
+        # Create mouse/keyboard/image settings sections
         self._create_mouse_settings_section()
         self._create_keyboard_settings_section()
+        self._create_image_settings_section()
         
         # Interval setting
         interval_frame = ttk.LabelFrame(main_frame, text="Click Interval", padding=10)
@@ -335,6 +5271,23 @@ class AutoActionClicker:
         self.interval_label.pack(side="right")
         interval_scale.configure(command=self.update_interval_label)
         
+        # Rate mode: fixed interval or clicks per second (allows sub-10ms intervals)
+        rate_frame = ttk.Frame(main_frame)
+        rate_frame.pack(fill="x", padx=15)
+        
+        self.rate_mode_var = tk.StringVar(value=self.config.get('rate_mode', 'interval'))
+        ttk.Radiobutton(rate_frame, text="Interval", variable=self.rate_mode_var,
+                       value="interval").pack(side="left")
+        ttk.Radiobutton(rate_frame, text="Clicks/sec", variable=self.rate_mode_var,
+                       value="cps").pack(side="left")
+        
+        self.cps_var = tk.DoubleVar(value=self.config.get('clicks_per_second', 10.0))
+        cps_spin = ttk.Spinbox(rate_frame, from_=0.1, to=1000, increment=1,
+                              textvariable=self.cps_var, width=8)
+        cps_spin.pack(side="left", padx=5)
+        
+        self._create_condition_section(main_frame)
+        
         # Control buttons
         control_frame = ttk.Frame(main_frame)
         control_frame.pack(fill="x", padx=5, pady=10)
@@ -347,6 +5300,10 @@ class AutoActionClicker:
                                           command=self.emergency_stop, style="TButton")
         self.emergency_button.pack(side="left", padx=5)
         
+        # Settings are captured when started; Apply hands edits to the running worker
+        ttk.Button(control_frame, text="Apply Changes",
+                  command=self.apply_action_settings).pack(side="left", padx=5)
+        
         # Status section
         status_frame = ttk.LabelFrame(main_frame, text="Status", padding=10)
         status_frame.pack(fill="x", padx=5, pady=5)
@@ -354,7 +5311,7 @@ class AutoActionClicker:
         self.status_label = ttk.Label(status_frame, text="Ready", font=("Arial", 10))
         self.status_label.pack()
         
-        self.stats_label = ttk.Label(status_frame, text="Clicks: 0 | Time: 0s", 
+        self.stats_label = ttk.Label(status_frame, text="Clicks: 0 | Time: 0s | Rate: 0.0/s | Jitter: 0.00ms", 
                                     font=("Arial", 8))
         self.stats_label.pack()
         
@@ -363,9 +5320,46 @@ class AutoActionClicker:
                                        font=("Arial", 8))
         self.position_label.pack()
         
+        self._create_jobs_section(main_frame)
+        
         # Show appropriate settings
         self.on_action_type_change()
     
+    def _create_jobs_section(self, parent):
+        """Create the concurrent jobs list with per-job statistics"""
+        jobs_frame = ttk.LabelFrame(parent, text="Jobs", padding=10)
+        jobs_frame.pack(fill="both", expand=True, padx=5, pady=5)
+        
+        columns = ("action", "target", "interval", "runs", "rate", "jitter", "status")
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=columns, height=5)
+        self.jobs_tree.heading("#0", text="Name")
+        self.jobs_tree.column("#0", width=70)
+        for column, heading, width in (("action", "Action", 130), ("target", "Target", 90),
+                                       ("interval", "Interval", 60), ("runs", "Runs", 60),
+                                       ("rate", "Rate/s", 70), ("jitter", "Jitter ms", 70),
+                                       ("status", "Status", 60)):
+            self.jobs_tree.heading(column, text=heading)
+            self.jobs_tree.column(column, width=width, anchor="w")
+        self.jobs_tree.pack(fill="both", expand=True)
+        
+        jobs_buttons_frame = ttk.Frame(jobs_frame)
+        jobs_buttons_frame.pack(fill="x", pady=(5, 0))
+        
+        ttk.Button(jobs_buttons_frame, text="Add Current as Job",
+                  command=self.add_current_as_job).pack(side="left", padx=2)
+        ttk.Label(jobs_buttons_frame, text="Repeat:").pack(side="left", padx=(10, 2))
+        self.job_repeat_var = tk.IntVar(value=0)
+        ttk.Spinbox(jobs_buttons_frame, from_=0, to=1000000, textvariable=self.job_repeat_var,
+                   width=7).pack(side="left")
+        ttk.Button(jobs_buttons_frame, text="Remove",
+                  command=self.remove_selected_jobs).pack(side="left", padx=(10, 2))
+        
+        self.jobs_button = ttk.Button(jobs_buttons_frame, text="Start Jobs", command=self.toggle_jobs)
+        self.jobs_button.pack(side="right", padx=2)
+        
+        for job in self.job_scheduler.jobs.values():
+            self._insert_job_row(job)
+    
     def _create_mouse_settings_section(self):
         """Create mouse settings section"""
         self.mouse_frame = ttk.LabelFrame(self.settings_container, text="Mouse Settings", padding=10)
@@ -426,10 +5420,114 @@ class AutoActionClicker:
             ttk.Button(common_frame, text=key, width=6,
                       command=lambda k=key: self.keyboard_key_var.set(k)).pack(side="left", padx=2)
     
-    def _create_settings_tab(self):
-        """Create settings tab"""
-        settings_frame = ttk.Frame(self.notebook)
-        self.notebook.add(settings_frame, text="Settings")
+    def _create_image_settings_section(self):
+        """Create image template settings section"""
+        self.image_frame = ttk.LabelFrame(self.settings_container, text="Image Settings", padding=10)
+        
+        # Template image
+        template_frame = ttk.Frame(self.image_frame)
+        template_frame.pack(fill="x", pady=5)
+        
+        ttk.Label(template_frame, text="Template:").pack(side="left", padx=(0, 5))
+        self.template_file_var = tk.StringVar(value=self.config.get('template_file', ''))
+        ttk.Entry(template_frame, textvariable=self.template_file_var, width=30).pack(side="left", padx=5)
+        ttk.Button(template_frame, text="Browse",
+                  command=self.browse_template).pack(side="left", padx=2)
+        ttk.Button(template_frame, text="Capture (3s)",
+                  command=self.capture_template).pack(side="left", padx=2)
+        
+        # Search region and match threshold
+        match_frame = ttk.Frame(self.image_frame)
+        match_frame.pack(fill="x", pady=5)
+        
+        ttk.Label(match_frame, text="Region x,y,w,h:").pack(side="left")
+        self.template_region_var = tk.StringVar(value=self.config.get('template_region', ''))
+        ttk.Entry(match_frame, textvariable=self.template_region_var, width=18).pack(side="left", padx=5)
+        ttk.Label(match_frame, text="Threshold:").pack(side="left", padx=(15, 0))
+        self.template_threshold_var = tk.DoubleVar(value=self.config.get('template_threshold', 0.8))
+        ttk.Spinbox(match_frame, from_=0.5, to=1.0, increment=0.05, textvariable=self.template_threshold_var,
+                   width=6).pack(side="left", padx=5)
+        
+        # Click button and type (shared with the mouse settings)
+        click_frame = ttk.Frame(self.image_frame)
+        click_frame.pack(fill="x", pady=5)
+        
+        ttk.Label(click_frame, text="Button:").pack(side="left", padx=(0, 5))
+        ttk.Combobox(click_frame, textvariable=self.mouse_button_var, values=['left', 'right', 'middle'],
+                    state="readonly", width=10).pack(side="left", padx=5)
+        ttk.Label(click_frame, text="Type:").pack(side="left", padx=(20, 5))
+        ttk.Combobox(click_frame, textvariable=self.click_type_var, values=['single', 'double'],
+                    state="readonly", width=10).pack(side="left", padx=5)
+        
+        self.match_label = ttk.Label(self.image_frame, text="Region empty = whole target window (or screen)",
+                                     font=("Arial", 8))
+        self.match_label.pack(anchor="w")
+    
+    def _create_condition_section(self, parent):
+        """Create trigger condition section: act when a region changes or shows a color"""
+        condition_frame = ttk.LabelFrame(parent, text="Trigger Condition", padding=10)
+        condition_frame.pack(fill="x", padx=5, pady=5)
+        
+        watch_frame = ttk.Frame(condition_frame)
+        watch_frame.pack(fill="x")
+        
+        ttk.Label(watch_frame, text="When:").pack(side="left")
+        self.condition_mode_var = tk.StringVar(value=self.config.get('condition_mode', 'none'))
+        ttk.Combobox(watch_frame, textvariable=self.condition_mode_var, values=['none', 'change', 'color'],
+                    state="readonly", width=8).pack(side="left", padx=5)
+        ttk.Label(watch_frame, text="Region x,y,w,h:").pack(side="left", padx=(10, 0))
+        self.condition_region_var = tk.StringVar(value=self.config.get('condition_region', ''))
+        ttk.Entry(watch_frame, textvariable=self.condition_region_var, width=18).pack(side="left", padx=5)
+        ttk.Label(watch_frame, text="Every (ms):").pack(side="left", padx=(10, 0))
+        self.condition_interval_var = tk.IntVar(value=self.config.get('condition_interval_ms', 100))
+        ttk.Spinbox(watch_frame, from_=10, to=10000, increment=10, textvariable=self.condition_interval_var,
+                   width=6).pack(side="left", padx=5)
+        
+        match_frame = ttk.Frame(condition_frame)
+        match_frame.pack(fill="x", pady=(5, 0))
+        
+        ttk.Label(match_frame, text="Color:").pack(side="left")
+        self.condition_color_var = tk.StringVar(value=self.config.get('condition_color', '#ff0000'))
+        ttk.Entry(match_frame, textvariable=self.condition_color_var, width=9).pack(side="left", padx=5)
+        ttk.Button(match_frame, text="Pick (3s)", command=self.pick_condition_color).pack(side="left", padx=2)
+        ttk.Label(match_frame, text="Tolerance:").pack(side="left", padx=(10, 0))
+        self.condition_tolerance_var = tk.IntVar(value=self.config.get('condition_tolerance', 16))
+        ttk.Spinbox(match_frame, from_=0, to=255, increment=1, textvariable=self.condition_tolerance_var,
+                   width=5).pack(side="left", padx=5)
+        ttk.Label(match_frame, text="Coverage:").pack(side="left", padx=(10, 0))
+        self.condition_coverage_var = tk.DoubleVar(value=self.config.get('condition_coverage', 0.0))
+        ttk.Spinbox(match_frame, from_=0.0, to=1.0, increment=0.05, textvariable=self.condition_coverage_var,
+                   width=5).pack(side="left", padx=5)
+        
+        self.condition_label = ttk.Label(condition_frame, text="none = act on the interval", font=("Arial", 8))
+        self.condition_label.pack(anchor="w")
+    
+    def _create_settings_tab(self, settings_frame):
+        """Create settings tab"""        
+        # Profiles section
+        profile_frame = ttk.LabelFrame(settings_frame, text="Profiles", padding=10)
+        profile_frame.pack(fill="x", padx=5, pady=5)
+        
+        profile_select_frame = ttk.Frame(profile_frame)
+        profile_select_frame.pack(fill="x", pady=2)
+        
+        ttk.Label(profile_select_frame, text="Profile:").pack(side="left")
+        self.profile_combo = ttk.Combobox(profile_select_frame, textvariable=self.profile_var, state="readonly",
+                                          width=20, postcommand=self._update_profile_list)
+        self.profile_combo.pack(side="left", padx=10)
+        self.profile_combo.bind("<<ComboboxSelected>>", lambda event: self.switch_profile(self.profile_var.get()))
+        ttk.Button(profile_select_frame, text="Save As...",
+                  command=self.save_profile_as).pack(side="left", padx=5)
+        ttk.Button(profile_select_frame, text="Delete",
+                  command=self.delete_profile).pack(side="left", padx=5)
+        
+        profile_hotkey_frame = ttk.Frame(profile_frame)
+        profile_hotkey_frame.pack(fill="x", pady=2)
+        
+        ttk.Label(profile_hotkey_frame, text="Switch Hotkey:").pack(side="left")
+        ttk.Entry(profile_hotkey_frame, textvariable=self.profile_hotkey_var, width=15).pack(side="left", padx=10)
+        ttk.Button(profile_hotkey_frame, text="Set",
+                  command=self.set_profile_hotkey).pack(side="left", padx=5)
         
         # Hotkeys section
         hotkey_frame = ttk.LabelFrame(settings_frame, text="Hotkeys", padding=10)
@@ -440,7 +5538,6 @@ class AutoActionClicker:
         start_hotkey_frame.pack(fill="x", pady=2)
         
         ttk.Label(start_hotkey_frame, text="Start/Stop Hotkey:").pack(side="left")
-        self.start_hotkey_var = tk.StringVar(value=self.config.get('hotkey_start_stop', 'f6'))
         start_hotkey_entry = ttk.Entry(start_hotkey_frame, textvariable=self.start_hotkey_var, width=15)
         start_hotkey_entry.pack(side="left", padx=10)
         
@@ -449,7 +5546,6 @@ class AutoActionClicker:
         emergency_hotkey_frame.pack(fill="x", pady=2)
         
         ttk.Label(emergency_hotkey_frame, text="Emergency Stop Hotkey:").pack(side="left")
-        self.emergency_hotkey_var = tk.StringVar(value=self.config.get('emergency_stop_hotkey', 'f12'))
         emergency_hotkey_entry = ttk.Entry(emergency_hotkey_frame, textvariable=self.emergency_hotkey_var, width=15)
         emergency_hotkey_entry.pack(side="left", padx=10)
         
@@ -457,7 +5553,6 @@ class AutoActionClicker:
         window_options_frame = ttk.LabelFrame(settings_frame, text="Window Options", padding=10)
         window_options_frame.pack(fill="x", padx=5, pady=5)
         
-        self.auto_resize_var = tk.BooleanVar(value=self.config.get('auto_resize_window', True))
         ttk.Checkbutton(window_options_frame, text="Auto-resize target window",
                        variable=self.auto_resize_var).pack(anchor="w")
         
@@ -466,7 +5561,6 @@ class AutoActionClicker:
             theme_frame = ttk.LabelFrame(settings_frame, text="Theme", padding=10)
             theme_frame.pack(fill="x", padx=5, pady=5)
             
-            self.theme_var = tk.StringVar(value=self.config.get('theme', 'arc'))
             theme_combo = ttk.Combobox(theme_frame, textvariable=self.theme_var,
                                       values=['arc', 'equilux', 'adapta', 'breeze'], 
                                       state="readonly")
@@ -474,6 +5568,15 @@ class AutoActionClicker:
             ttk.Button(theme_frame, text="Apply Theme", 
                       command=self.apply_theme).pack(side="left", padx=10)
         
+        # Metrics export
+        metrics_frame = ttk.LabelFrame(settings_frame, text="Metrics", padding=10)
+        metrics_frame.pack(fill="x", padx=5, pady=5)
+        
+        ttk.Checkbutton(metrics_frame, text="Serve Prometheus metrics on localhost, port",
+                       variable=self.metrics_enabled_var, command=self.apply_metrics_settings).pack(side="left")
+        ttk.Spinbox(metrics_frame, from_=1024, to=65535, textvariable=self.metrics_port_var,
+                   width=7).pack(side="left", padx=5)
+        
         # Save/Load configuration
         config_frame = ttk.LabelFrame(settings_frame, text="Configuration", padding=10)
         config_frame.pack(fill="x", padx=5, pady=5)
@@ -485,14 +5588,13 @@ class AutoActionClicker:
                   command=self.save_config).pack(side="left", padx=5)
         ttk.Button(config_buttons_frame, text="Load Config", 
                   command=self.load_config_file).pack(side="left", padx=5)
+        ttk.Button(config_buttons_frame, text="Export Config",
+                  command=self.export_config_file).pack(side="left", padx=5)
         ttk.Button(config_buttons_frame, text="Reset to Default", 
                   command=self.reset_config).pack(side="left", padx=5)
     
-    def _create_macro_tab(self):
-        """Create macro recording tab"""
-        macro_frame = ttk.Frame(self.notebook)
-        self.notebook.add(macro_frame, text="Macro Recorder")
-        
+    def _create_macro_tab(self, macro_frame):
+        """Create macro recording tab"""        
         # Recording controls
         record_frame = ttk.LabelFrame(macro_frame, text="Recording Controls", padding=10)
         record_frame.pack(fill="x", padx=5, pady=5)
@@ -507,20 +5609,59 @@ class AutoActionClicker:
         ttk.Button(record_buttons_frame, text="Clear Macro", 
                   command=self.clear_macro).pack(side="left", padx=5)
         
-        self.play_macro_button = ttk.Button(record_buttons_frame, text="Play Macro", 
-                                           command=self.play_macro, state="disabled")
+        self.play_macro_button = ttk.Button(record_buttons_frame, text="Play Macro", command=self.play_macro,
+                                           state="normal" if self.recorded_actions else "disabled")
         self.play_macro_button.pack(side="left", padx=5)
         
+        self.macro_progress_label = ttk.Label(record_buttons_frame, text="")
+        self.macro_progress_label.pack(side="right", padx=5)
+        
+        # Playback options
+        playback_frame = ttk.Frame(record_frame)
+        playback_frame.pack(fill="x", pady=(10, 0))
+        
+        ttk.Label(playback_frame, text="Speed:").pack(side="left", padx=(5, 0))
+        ttk.Spinbox(playback_frame, from_=MacroPlayer.MIN_SPEED, to=MacroPlayer.MAX_SPEED, increment=0.5,
+                   textvariable=self.macro_speed_var, width=6).pack(side="left", padx=5)
+        ttk.Label(playback_frame, text="x").pack(side="left")
+        
+        ttk.Label(playback_frame, text="When behind:").pack(side="left", padx=(20, 5))
+        ttk.Combobox(playback_frame, textvariable=self.macro_catch_up_var,
+                    values=list(MACRO_CATCH_UP_POLICIES), state="readonly", width=12).pack(side="left")
+        ttk.Checkbutton(playback_frame, text="Play each time the trigger condition fires",
+                       variable=self.macro_wait_condition_var).pack(side="left", padx=(20, 0))
+        
+        # Parallel playback: every window matching the target, by background messages
+        parallel_frame = ttk.Frame(record_frame)
+        parallel_frame.pack(fill="x", pady=(5, 0))
+        ttk.Checkbutton(parallel_frame, text="Play in every window matching the target window (background)",
+                       variable=self.macro_parallel_windows_var).pack(side="left", padx=(5, 0))
+        ttk.Label(parallel_frame, text="Workers:").pack(side="left", padx=(20, 5))
+        ttk.Spinbox(parallel_frame, from_=1, to=64, increment=1,
+                   textvariable=self.macro_parallel_workers_var, width=4).pack(side="left")
+        
         # Macro display
         macro_display_frame = ttk.LabelFrame(macro_frame, text="Recorded Actions", padding=10)
         macro_display_frame.pack(fill="both", expand=True, padx=5, pady=5)
         
-        self.macro_text = tk.Text(macro_display_frame, height=15, state="disabled")
-        macro_scrollbar = ttk.Scrollbar(macro_display_frame, orient="vertical", command=self.macro_text.yview)
-        self.macro_text.configure(yscrollcommand=macro_scrollbar.set)
+        # Navigation
+        macro_nav_frame = ttk.Frame(macro_display_frame)
+        macro_nav_frame.pack(fill="x", pady=(0, 5))
+        
+        ttk.Label(macro_nav_frame, text="Go to:").pack(side="left")
+        goto_entry = ttk.Entry(macro_nav_frame, textvariable=self.macro_goto_var, width=10)
+        goto_entry.pack(side="left", padx=5)
+        goto_entry.bind("<Return>", lambda e: self.goto_macro_row())
+        ttk.Button(macro_nav_frame, text="Row #",
+                  command=self.goto_macro_row).pack(side="left", padx=2)
+        ttk.Button(macro_nav_frame, text="Time (s)",
+                  command=self.goto_macro_time).pack(side="left", padx=2)
         
-        self.macro_text.pack(side="left", fill="both", expand=True)
-        macro_scrollbar.pack(side="right", fill="y")
+        self.macro_count_label = ttk.Label(macro_nav_frame, text="0 events")
+        self.macro_count_label.pack(side="right")
+        
+        self.macro_view = VirtualListView(macro_display_frame, format_macro_action)
+        self.macro_view.pack(fill="both", expand=True)
         
         # Save/Load macros
         macro_file_frame = ttk.Frame(macro_frame)
@@ -530,12 +5671,112 @@ class AutoActionClicker:
                   command=self.save_macro).pack(side="left", padx=5)
         ttk.Button(macro_file_frame, text="Load Macro", 
                   command=self.load_macro).pack(side="left", padx=5)
+        
+        # Control flow: repeat, loop and wait without copying events
+        control_frame = ttk.LabelFrame(macro_frame, text="Control Flow", padding=10)
+        control_frame.pack(fill="x", padx=5, pady=5)
+        
+        ttk.Label(control_frame, text="Rows:").pack(side="left")
+        ttk.Entry(control_frame, textvariable=self.macro_block_from_var, width=7).pack(side="left", padx=2)
+        ttk.Label(control_frame, text="to").pack(side="left")
+        ttk.Entry(control_frame, textvariable=self.macro_block_to_var, width=7).pack(side="left", padx=2)
+        
+        ttk.Spinbox(control_frame, from_=0, to=1000000, increment=1,
+                   textvariable=self.macro_repeat_count_var, width=8).pack(side="left", padx=(15, 2))
+        ttk.Button(control_frame, text="Repeat Rows",
+                  command=lambda: self.wrap_macro_rows('repeat')).pack(side="left", padx=2)
+        
+        ttk.Spinbox(control_frame, from_=0.1, to=86400, increment=0.5,
+                   textvariable=self.macro_block_seconds_var, width=6).pack(side="left", padx=(15, 2))
+        ttk.Label(control_frame, text="s").pack(side="left")
+        ttk.Button(control_frame, text="Loop Rows",
+                  command=lambda: self.wrap_macro_rows('loop')).pack(side="left", padx=2)
+        ttk.Button(control_frame, text="Insert Wait",
+                  command=self.insert_macro_wait).pack(side="left", padx=2)
+        
+        # Path simplification
+        simplify_frame = ttk.LabelFrame(macro_frame, text="Path Simplification", padding=10)
+        simplify_frame.pack(fill="x", padx=5, pady=5)
+        
+        ttk.Label(simplify_frame, text="Tolerance (px):").pack(side="left")
+        ttk.Spinbox(simplify_frame, from_=0.5, to=50, increment=0.5,
+                   textvariable=self.path_tolerance_var, width=6).pack(side="left", padx=5)
+        ttk.Button(simplify_frame, text="Simplify Path",
+                  command=self.simplify_macro_path).pack(side="left", padx=5)
+        
+        ttk.Checkbutton(simplify_frame, text="Simplify on save",
+                       variable=self.simplify_on_save_var).pack(side="left", padx=10)
+    
+    def _create_statistics_tab(self, stats_frame):
+        """Create statistics tab with per-stage latency percentiles"""
+        rate_frame = ttk.LabelFrame(stats_frame, text="Rate", padding=10)
+        rate_frame.pack(fill="x", padx=5, pady=5)
+        
+        self.rate_stats_label = ttk.Label(rate_frame, text="Not running")
+        self.rate_stats_label.pack(anchor="w")
+        
+        latency_frame = ttk.LabelFrame(stats_frame, text="Latency by Stage (ms)", padding=10)
+        latency_frame.pack(fill="both", expand=True, padx=5, pady=5)
+        
+        headings = (("count", "Count"), ("mean", "Mean"), ("p50", "p50"), ("p90", "p90"),
+                    ("p99", "p99"), ("max", "Max"))
+        self.latency_tree = ttk.Treeview(latency_frame, columns=[column for column, _ in headings], height=10)
+        self.latency_tree.heading("#0", text="Stage")
+        self.latency_tree.column("#0", width=130)
+        for column, heading in headings:
+            self.latency_tree.heading(column, text=heading)
+            self.latency_tree.column(column, width=70, anchor="e")
+        self.latency_tree.pack(fill="both", expand=True)
+        
+        ttk.Button(stats_frame, text="Reset Statistics",
+                  command=self.reset_statistics).pack(anchor="w", padx=5, pady=5)
+        
+        self._update_statistics_tab()
+    
+    def _update_statistics_tab(self):
+        """Refresh the Statistics tab from the latency histograms"""
+        stats = self.scheduler.get_stats()
+        if self.is_clicking:
+            self.rate_stats_label.config(
+                text=f"Achieved {stats['achieved_rate']:.2f}/s of {stats['target_rate']:.2f}/s requested "
+                     f"({stats['ticks']} actions, {stats['resyncs']} resyncs)")
+        else:
+            self.rate_stats_label.config(text="Not running")
+        
+        for stage, values in sorted(self.latency_stats.get_stats().items()):
+            row = (values['count'], f"{values['mean_ms']:.3f}", f"{values['p50_ms']:.3f}",
+                   f"{values['p90_ms']:.3f}", f"{values['p99_ms']:.3f}", f"{values['max_ms']:.3f}")
+            if self.latency_tree.exists(stage):
+                self.latency_tree.item(stage, values=row)
+            else:
+                self.latency_tree.insert("", tk.END, iid=stage, text=stage, values=row)
+    
+    def reset_statistics(self):
+        """Clear the latency histograms"""
+        self.latency_stats.reset()
+        self.latency_tree.delete(*self.latency_tree.get_children())
     
-    def _create_about_tab(self):
-        """Create about tab"""
-        about_frame = ttk.Frame(self.notebook)
-        self.notebook.add(about_frame, text="About")
+    def render_metrics(self):
+        """Metrics text for the Prometheus endpoint (called from the server thread)"""
+        return render_metrics(self.latency_stats, self.scheduler, self.job_scheduler,
+                              running=self.is_clicking, actions=self.click_count,
+                              region_watcher=self.engine.region_watcher)
+    
+    def apply_metrics_settings(self):
+        """Start or stop the metrics endpoint to match the settings"""
+        self.metrics_server.stop()
+        try:
+            self.metrics_server.port = int(self.metrics_port_var.get())
+        except (tk.TclError, ValueError):
+            self.metrics_port_var.set(self.metrics_server.port)
         
+        if self.metrics_enabled_var.get() and not self.metrics_server.start():
+            self.metrics_enabled_var.set(False)
+            messagebox.showerror("Metrics", f"Could not listen on port {self.metrics_server.port}; "
+                                            "it may be in use by another application.")
+    
+    def _create_about_tab(self, about_frame):
+        """Create about tab"""        
         # Title
         title_label = ttk.Label(about_frame, text="Auto Action Clicker v3.0", 
                                font=("Arial", 16, "bold"))
@@ -574,51 +5815,136 @@ Performance Features:
         """Setup event handlers"""
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
+        # Window state drives the refresh loops (see _update_refresh_state)
+        self.root.bind("<Map>", lambda event: self._on_window_mapped(event, True))
+        self.root.bind("<Unmap>", lambda event: self._on_window_mapped(event, False))
+        self.root.bind("<FocusIn>", self._on_focus_change)
+        self.root.bind("<FocusOut>", self._on_focus_change)
+        self.root.bind("<Motion>", lambda event: self.ui_refresh.wake())
+        
         # Bind window selection change
         self.window_combo.bind("<<ComboboxSelected>>", self.on_window_selection_change)
-        
-        # Refresh windows on startup
-        self.root.after(500, self.refresh_windows)
     
     def _setup_hotkeys(self):
         """Setup hotkeys with error handling"""
         start_hotkey = self.config.get('hotkey_start_stop', 'f6')
         emergency_hotkey = self.config.get('emergency_stop_hotkey', 'f12')
         
-        success1 = self.keyboard_handler.register_hotkey(start_hotkey, self.toggle_clicking)
-        success2 = self.keyboard_handler.register_hotkey(emergency_hotkey, self.emergency_stop)
+        # Hotkey callbacks run on the keyboard hook thread: hand them to the main loop
+        success1 = self.keyboard_handler.register_hotkey(
+            start_hotkey, lambda: self.ui_queue.post(self.toggle_clicking, key='toggle'))
+        success2 = self.keyboard_handler.register_hotkey(emergency_hotkey, self._on_emergency_hotkey)
+        
+        if not success1 or not success2:
+            messagebox.showwarning("Hotkey Warning", 
+                                 "Some hotkeys could not be registered. They may be in use by another application.")
+        
+        self._register_profile_hotkeys()
+    
+    def _register_profile_hotkeys(self):
+        """(Re)register the per-profile switching hotkeys"""
+        for hotkey in self._profile_hotkeys:
+            self.keyboard_handler.unregister_hotkey(hotkey)
+        self._profile_hotkeys = []
+        if self.profiles is None:
+            return
         
-        if not success1 or not success2:
-            messagebox.showwarning("Hotkey Warning", 
-                                 "Some hotkeys could not be registered. They may be in use by another application.")
+        reserved = {self.config.get('hotkey_start_stop', 'f6'), self.config.get('emergency_stop_hotkey', 'f12')}
+        for name, hotkey in self.profiles.hotkeys().items():
+            if hotkey in reserved:
+                logging.warning(f"Profile {name} hotkey {hotkey} is already used by a control hotkey")
+                continue
+            callback = lambda name=name: self.ui_queue.post(lambda: self.switch_profile(name), key='profile')
+            if self.keyboard_handler.register_hotkey(hotkey, callback):
+                self._profile_hotkeys.append(hotkey)
+    
+    def _on_emergency_hotkey(self):
+        """Stop the workers right away, then finish the emergency stop on the main loop"""
+        self.is_clicking = False
+        self.is_playing_macro = False
+        self.ui_queue.post(self.emergency_stop, key='emergency')
+    
+    def _drain_ui_queue(self):
+        """Run the updates posted by other threads; returns whether there were any"""
+        return self.ui_queue.drain() > 0
+    
+    def post_status(self, text, color=None):
+        """Update the status label from a worker thread (coalesced: the newest status wins)"""
+        self.ui_queue.post(lambda: self.update_status(text, color), key='status')
+    
+    def _update_refresh_state(self):
+        """Start or stop the statistics refresh and set the UI queue drain rate to match what is running"""
+        busy = self.is_clicking or self.job_scheduler.running
+        self.ui_refresh.update(busy=busy)
+        drain_busy = busy or self.is_playing_macro
+        self.ui_drain_loop.max_interval = (self.ui_drain_loop.min_interval if drain_busy
+                                           else math.ceil(UI_IDLE_DRAIN_INTERVAL * 1000))
+        self.ui_drain_loop.wake()
     
-    def _start_performance_monitoring(self):
-        """Start performance monitoring thread"""
-        self._update_mouse_position()
-        self._update_statistics()
+    def _on_window_mapped(self, event, visible):
+        # Toplevel bindings also fire for every child widget
+        if event.widget is self.root:
+            self.ui_refresh.update(visible=visible)
+    
+    def _on_focus_change(self, event=None):
+        # Focus also moves between widgets: check application focus once events settle
+        if not self._focus_check_pending:
+            self._focus_check_pending = True
+            self.root.after_idle(self._check_focus)
+    
+    def _check_focus(self):
+        self._focus_check_pending = False
+        try:
+            focused = self.root.focus_get() is not None
+        except (KeyError, tk.TclError):
+            focused = True  # focus_get fails on some popdowns, which means we have focus
+        self.ui_refresh.update(focused=focused)
     
     def _update_mouse_position(self):
-        """Update mouse position display with adaptive frequency"""
-        if self.performance_monitor.should_update():
-            try:
-                x, y = self.mouse_handler.get_mouse_position()
-                self.position_label.config(text=f"Mouse: ({x}, {y})")
-                
-                # Adjust frequency based on clicking state
-                self.performance_monitor.adjust_frequency(self.is_clicking)
-            except Exception as e:
-                logging.error(f"Error updating mouse position: {e}")
-        
-        # Schedule next update
-        self.root.after(50, self._update_mouse_position)
+        """Update the mouse position display; returns whether the position changed"""
+        x, y = self.mouse_handler.get_mouse_position(force_update=True)
+        text = f"Mouse: ({x}, {y})"
+        if self.position_label.cget("text") == text:
+            return False
+        self.position_label.config(text=text)
+        return True
     
     def _update_statistics(self):
         """Update statistics display"""
         if self.is_clicking and self.start_time:
             elapsed = time.time() - self.start_time
-            self.stats_label.config(text=f"Clicks: {self.click_count} | Time: {elapsed:.0f}s")
+            stats = self.scheduler.get_stats()
+            self.stats_label.config(
+                text=f"Clicks: {self.click_count} | Time: {elapsed:.0f}s | "
+                     f"Rate: {stats['achieved_rate']:.1f}/{stats['target_rate']:.1f}/s | "
+                     f"Jitter: {stats['jitter_mean_ms']:.2f}ms (max {stats['jitter_max_ms']:.2f}ms)")
+        
+        if self.job_scheduler.running:
+            self._update_job_rows()
+        
+        watches = self.engine.region_watcher.get_stats()
+        if watches:
+            self.condition_label.config(text=" | ".join(
+                f"{name}: {stats['samples']} samples, {stats['fires']} fired, CPU {stats['cpu_percent']:.1f}%, "
+                f"{stats['tiles_checked_ratio']:.0%} tiles checked" for name, stats in watches.items()))
+        
+        match = self.engine.template_locator.last_match
+        if self.is_clicking and match is not None:
+            self.match_label.config(
+                text=f"{'Found' if match.found else 'Not found'} ({match.score:.2f}, {match.mode}) | "
+                     f"capture {self.engine.template_locator.last_capture_ms:.1f}ms | match {match.match_ms:.1f}ms")
         
-        self.root.after(1000, self._update_statistics)
+        # Only refresh the Statistics tab while it is visible
+        if hasattr(self, 'latency_tree') and self.notebook.tab(self.notebook.select(), "text") == "Statistics":
+            self._update_statistics_tab()
+        return True
+    
+    def _update_window_list(self):
+        """Fill the window list from the (cached) window titles"""
+        try:
+            self.window_combo['values'] = self.window_manager.get_open_window_titles()
+        except Exception as e:
+            logging.error(f"Error listing windows: {e}")
     
     def refresh_windows(self):
         """Refresh the list of available windows"""
@@ -642,10 +5968,13 @@ Performance Features:
         # Hide all frames first
         self.mouse_frame.pack_forget()
         self.keyboard_frame.pack_forget()
+        self.image_frame.pack_forget()
         
         # Show appropriate frame
         if action_type == "mouse":
             self.mouse_frame.pack(fill="x", pady=5)
+        elif action_type == "image":
+            self.image_frame.pack(fill="x", pady=5)
         else:
             self.keyboard_frame.pack(fill="x", pady=5)
     
@@ -658,6 +5987,118 @@ Performance Features:
         """Update interval label"""
         self.interval_label.config(text=f"{float(value):.1f}s")
     
+    def get_action_interval(self):
+        """Get the effective action interval in seconds for the selected rate mode"""
+        if self.rate_mode_var.get() == "cps":
+            try:
+                cps = float(self.cps_var.get())
+            except (tk.TclError, ValueError):
+                cps = self.config.get('clicks_per_second', 10.0)
+            return 1.0 / max(0.1, cps)
+        try:
+            return max(0.001, float(self.interval_var.get()))
+        except (tk.TclError, ValueError):
+            return self.config.get('click_interval', 1.0)
+    
+    def take_condition(self):
+        """The trigger condition from the Tk variables, or None; raises ValueError if invalid (main thread only)"""
+        return ConditionSpec.from_config(self._config_from_ui())
+    
+    def take_action_snapshot(self, condition=None):
+        """Capture the main action settings from the Tk variables (main thread only)"""
+        try:
+            x, y = int(self.x_var.get()), int(self.y_var.get())
+        except (tk.TclError, ValueError):
+            x, y = self.config.get('x_coordinate', 100), self.config.get('y_coordinate', 100)
+        try:
+            region = parse_region(self.template_region_var.get())
+        except ValueError as e:
+            logging.error(f"Ignoring template region: {e}")
+            region = None
+        try:
+            threshold = float(self.template_threshold_var.get())
+        except (tk.TclError, ValueError):
+            threshold = self.config.get('template_threshold', 0.8)
+        return ActionSnapshot(
+            action_type=self.action_type_var.get(),
+            target_window=self.target_window_var.get(),
+            x=x,
+            y=y,
+            button=self.mouse_button_var.get(),
+            clicks=2 if self.click_type_var.get() == "double" else 1,
+            key=self.keyboard_key_var.get(),
+            interval=self.get_action_interval(),
+            delivery_mode=self.delivery_mode_var.get(),
+            template_file=self.template_file_var.get(),
+            template_region=region,
+            template_threshold=threshold,
+            condition=condition
+        )
+    
+    def apply_action_settings(self):
+        """Hand edited settings to the running action worker"""
+        # The condition being watched only changes on restart
+        snapshot = self.take_action_snapshot(self.action_snapshot.condition if self.action_snapshot else None)
+        if self.action_snapshot is not None and snapshot.target_window != self.action_snapshot.target_window:
+            self.target_resolver.invalidate()
+        self.action_snapshot = snapshot
+        if self.is_clicking:
+            self.update_status("Running (settings applied)", "green")
+    
+    def browse_template(self):
+        """Choose the template image to click"""
+        filetypes = [("NumPy arrays", "*.npy"), ("All files", "*.*")]
+        if PIL_AVAILABLE:
+            filetypes.insert(0, ("Images", "*.png *.bmp *.jpg"))
+        filename = filedialog.askopenfilename(filetypes=filetypes)
+        if filename:
+            self.template_file_var.set(filename)
+            self.engine.template_locator.clear()
+    
+    def capture_template(self):
+        """Save the screen around the mouse (after 3 seconds) as the template image"""
+        extension = ".png" if PIL_AVAILABLE else ".npy"
+        filename = filedialog.asksaveasfilename(defaultextension=extension,
+                                                filetypes=[("Template", f"*{extension}")])
+        if not filename:
+            return
+        self.update_status("Move the mouse over the target: capturing in 3s...", "blue")
+        self.root.after(3000, lambda: self._capture_template(filename))
+    
+    def _capture_template(self, filename):
+        x, y = self.mouse_handler.get_mouse_position(force_update=True)
+        half = TEMPLATE_CAPTURE_SIZE // 2
+        try:
+            capture = ScreenCapture()
+            image = capture.grab(x - half, y - half, TEMPLATE_CAPTURE_SIZE, TEMPLATE_CAPTURE_SIZE).copy()
+            capture.close()
+            save_template(filename, image)
+        except Exception as e:
+            logging.error(f"Error capturing template: {e}")
+            self.update_status(f"Template capture failed: {e}", "red")
+            return
+        self.template_file_var.set(filename)
+        self.engine.template_locator.clear()
+        self.update_status(f"Template saved: {os.path.basename(filename)}", "green")
+    
+    def pick_condition_color(self):
+        """Set the trigger color to the pixel under the mouse after 3 seconds"""
+        self.update_status("Move the mouse over the color: picking in 3s...", "blue")
+        self.root.after(3000, self._pick_condition_color)
+    
+    def _pick_condition_color(self):
+        x, y = self.mouse_handler.get_mouse_position(force_update=True)
+        try:
+            capture = ScreenCapture()
+            blue, green, red = capture.grab_bgra(x, y, 1, 1)[0, 0, :3]
+            capture.close()
+        except Exception as e:
+            logging.error(f"Error picking color: {e}")
+            self.update_status(f"Color pick failed: {e}", "red")
+            return
+        self.condition_color_var.set(f"#{red:02x}{green:02x}{blue:02x}")
+        self.update_status(f"Trigger color set at ({x}, {y})", "green")
+    
     def get_current_mouse_position(self):
         """Get current mouse position and set coordinates"""
         x, y = self.mouse_handler.get_mouse_position(force_update=True)
@@ -692,15 +6133,41 @@ Performance Features:
         if self.is_clicking:
             return
         
+        try:
+            condition = self.take_condition()
+            watch = self.engine.watch_condition('actions', self.target_window_var.get(), condition) \
+                if condition is not None else None
+        except Exception as e:
+            messagebox.showerror("Trigger Condition", f"Cannot watch the trigger condition: {e}")
+            return
+        
         self.is_clicking = True
         self.click_count = 0
+        self.action_snapshot = self.take_action_snapshot(condition)
+        
+        # A worker from a quick stop and restart may still be in its last wait: it sees the
+        # newer run and exits, and keeps its own scheduler so this run's reset can't disturb it
+        self._click_run += 1
+        run = self._click_run
+        self.scheduler = ActionScheduler(latency_stats=self.latency_stats)
+        
+        # Resolve the target window once per job
+        self.target_resolver.invalidate()
+        self.target_resolver.reset_stats()
+        self.focus_tracker.reset_stats()
+        self.latency_stats.reset()
         self.start_time = time.time()
         
         self.start_button.config(text="Stop (F6)")
         self.update_status("Running", "green")
+        self._update_refresh_state()
         
         # Start worker thread
-        self.worker_thread = threading.Thread(target=self._action_worker, daemon=True)
+        if watch is not None:
+            self.update_status("Waiting for the trigger condition", "green")
+            self.worker_thread = threading.Thread(target=self._condition_worker, args=(watch, run), daemon=True)
+        else:
+            self.worker_thread = threading.Thread(target=self._action_worker, args=(run, self.scheduler), daemon=True)
         self.worker_thread.start()
     
     def stop_clicking(self):
@@ -709,83 +6176,192 @@ Performance Features:
         
         self.start_button.config(text="Start (F6)")
         self.update_status("Stopped", "red")
+        self._update_refresh_state()
     
     def emergency_stop(self):
         """Emergency stop all actions"""
         self.is_clicking = False
-        self.is_recording_macro = False
+        self.is_playing_macro = False
+        self.job_scheduler.stop()
+        self.jobs_button.config(text="Start Jobs")
+        if self.is_recording_macro:
+            self.is_recording_macro = False
+            self.recorded_actions = self.macro_recorder.stop()
+            # Recording is only possible once the Macro Recorder tab exists
+            if self.recorded_actions:
+                self.play_macro_button.config(state="normal")
+            self.record_button.config(text="Start Recording")
+            self.display_recorded_actions()
         
         self.start_button.config(text="Start (F6)")
-        self.record_button.config(text="Start Recording")
         self.update_status("Emergency Stop!", "red")
+        self._update_refresh_state()
         
         messagebox.showwarning("Emergency Stop", "All actions have been stopped!")
     
-    def _action_worker(self):
-        """Worker thread for performing actions"""
-        while self.is_clicking:
-            try:
-                if self.action_type_var.get() == "mouse":
-                    self.perform_mouse_action()
-                else:
-                    self.perform_keyboard_action()
-                
+    def _report_action_failure(self, snapshot):
+        if snapshot.action_type == "mouse":
+            self.post_status("Click failed", "red")
+        elif snapshot.action_type == "image":
+            self.post_status("Template not found", "orange")
+        else:
+            self.post_status(f"Key press failed: {snapshot.key}", "red")
+    
+    def _condition_worker(self, watch, run):
+        """Worker thread performing the action each time the trigger condition fires"""
+        try:
+            while watch.wait(lambda: self.is_clicking and self._click_run == run):
+                snapshot = self.action_snapshot
+                if not self.engine.perform_action(snapshot):
+                    self._report_action_failure(snapshot)
                 self.click_count += 1
-                
-                # Sleep for the specified interval
-                time.sleep(self.interval_var.get())
-                
-            except Exception as e:
-                logging.error(f"Error in action worker: {e}")
-                self.root.after(0, lambda: self.update_status(f"Error: {e}", "red"))
-                break
+        except Exception as e:
+            logging.error(f"Error in condition worker: {e}")
+            self.post_status(f"Error: {e}", "red")
+        finally:
+            logging.info(f"Condition worker stopped: {self.click_count} actions, watch {watch.get_stats()}")
+            self.engine.region_watcher.remove(watch.name)
     
-    def perform_mouse_action(self):
-        """Perform mouse click action"""
-        target_window = self.target_window_var.get()
+    def _action_worker(self, run, scheduler):
+        """Worker thread for performing actions on absolute deadlines"""
+        # Reads only the immutable snapshot, never Tk variables
+        scheduler.reset(self.action_snapshot.interval)
+        running = lambda: self.is_clicking and self._click_run == run
         
-        # Focus target window if specified
-        if target_window:
-            windows = self.window_manager.find_target_window(target_window)
-            if windows:
+        with HighResolutionTimer():
+            while running():
                 try:
-                    hwnd = windows[0][0]
-                    win32gui.SetForegroundWindow(hwnd)
+                    # Wait for the next deadline instead of sleeping after the action,
+                    # so action time and sleep overshoot don't accumulate as drift
+                    if not scheduler.wait_next(running):
+                        break
+                    
+                    snapshot = self.action_snapshot
+                    if not self.engine.perform_action(snapshot):
+                        self._report_action_failure(snapshot)
+                    
+                    self.click_count += 1
+                    
+                    # Pick up interval changes applied while running
+                    scheduler.set_interval(snapshot.interval)
+                    
                 except Exception as e:
-                    logging.error(f"Error focusing window: {e}")
+                    logging.error(f"Error in action worker: {e}")
+                    self.post_status(f"Error: {e}", "red")
+                    break
         
-        # Perform click
-        x = self.x_var.get()
-        y = self.y_var.get()
-        button = self.mouse_button_var.get()
-        clicks = 2 if self.click_type_var.get() == "double" else 1
+        stats = scheduler.get_stats()
+        logging.info(f"Action worker stopped: {stats['ticks']} actions, "
+                     f"{stats['achieved_rate']:.2f}/s achieved (target {stats['target_rate']:.2f}/s), "
+                     f"jitter mean {stats['jitter_mean_ms']:.3f}ms max {stats['jitter_max_ms']:.3f}ms")
         
-        success = self.mouse_handler.click_at_position(x, y, button, clicks)
-        
-        if not success:
-            self.root.after(0, lambda: self.update_status("Click failed", "red"))
+        lookup_stats = self.target_resolver.get_stats()
+        logging.info(f"Target window lookups: {lookup_stats['hits']} hits, {lookup_stats['misses']} misses, "
+                     f"{lookup_stats['revalidation_failures']} revalidation failures")
+        logging.info(f"Focus: {self.focus_tracker.get_stats()} | Latency: {self.latency_stats.get_stats()}")
     
-    def perform_keyboard_action(self):
-        """Perform keyboard press action"""
-        target_window = self.target_window_var.get()
+    def _add_job(self, job):
+        job.resolver = self.engine.new_job_resolver()
+        self.job_scheduler.add_job(job)
+    
+    def _set_jobs(self, job_configs):
+        """Match jobs to the given configurations by name without stopping the scheduler
         
-        # Focus target window if specified
-        if target_window:
-            windows = self.window_manager.find_target_window(target_window)
-            if windows:
-                try:
-                    hwnd = windows[0][0]
-                    win32gui.SetForegroundWindow(hwnd)
-                except Exception as e:
-                    logging.error(f"Error focusing window: {e}")
+        Jobs whose settings are unchanged keep running with their statistics, changed
+        ones are updated in place, and the rest are added or removed.
+        """
+        existing = {}
+        for job in self.job_scheduler.jobs.values():
+            existing.setdefault(job.name, []).append(job)
+        
+        jobs = []
+        for job_config in job_configs:
+            matches = existing.get(job_config.get('name'))
+            if matches:
+                job = matches.pop(0)
+                self.job_scheduler.update_job(job.job_id, job_config)
+            else:
+                job = ClickJob.from_dict(job_config)
+                self._add_job(job)
+            jobs.append(job)
         
-        # Perform key press
-        key = self.keyboard_key_var.get()
+        kept = {job.job_id for job in jobs}
+        for job_id in [job_id for job_id in self.job_scheduler.jobs if job_id not in kept]:
+            self.job_scheduler.remove_job(job_id)
+        self.job_scheduler.reorder([job.job_id for job in jobs])
+        
+        self.jobs_tree.delete(*self.jobs_tree.get_children())
+        for job in jobs:
+            self._insert_job_row(job)
+        self._update_job_rows()
+    
+    def add_current_as_job(self):
+        """Add a job built from the current Main Controls settings"""
+        if self.action_type_var.get() == "image":
+            messagebox.showwarning("Warning", "Image clicks cannot be scheduled as jobs yet")
+            return
         try:
-            pyautogui.press(key)
-        except Exception as e:
-            logging.error(f"Error pressing key {key}: {e}")
-            self.root.after(0, lambda: self.update_status(f"Key press failed: {e}", "red"))
+            repeat = int(self.job_repeat_var.get())
+        except (tk.TclError, ValueError):
+            repeat = 0
+        
+        job = ClickJob(
+            action_type=self.action_type_var.get(),
+            target_window=self.target_window_var.get(),
+            x=self.x_var.get(),
+            y=self.y_var.get(),
+            button=self.mouse_button_var.get(),
+            clicks=2 if self.click_type_var.get() == "double" else 1,
+            key=self.keyboard_key_var.get(),
+            interval=self.get_action_interval(),
+            repeat=repeat,
+            delivery_mode=self.delivery_mode_var.get()
+        )
+        self._add_job(job)
+        self._insert_job_row(job)
+        self._schedule_profile_save()
+    
+    def remove_selected_jobs(self):
+        """Remove the jobs selected in the jobs list"""
+        for item in self.jobs_tree.selection():
+            self.job_scheduler.remove_job(int(item))
+            self.jobs_tree.delete(item)
+        self._schedule_profile_save()
+    
+    def toggle_jobs(self):
+        """Start or stop all jobs"""
+        if self.job_scheduler.running:
+            self.job_scheduler.stop()
+            self.jobs_button.config(text="Start Jobs")
+            logging.info(f"Jobs stopped: {self.job_scheduler.get_stats()}")
+        elif self.job_scheduler.jobs:
+            self.job_scheduler.start()
+            self.jobs_button.config(text="Stop Jobs")
+        self._update_job_rows()
+        self._update_refresh_state()
+    
+    def _insert_job_row(self, job):
+        target = job.target_window or "(any)"
+        self.jobs_tree.insert("", tk.END, iid=str(job.job_id), text=job.name,
+                             values=(job.describe(), target, f"{job.interval:g}s", 0, "0.0", "0.00", "idle"))
+    
+    def _update_job_rows(self):
+        """Refresh per-job statistics in the jobs list"""
+        now = time.perf_counter()
+        running = self.job_scheduler.running
+        for job in list(self.job_scheduler.jobs.values()):
+            item = str(job.job_id)
+            if not self.jobs_tree.exists(item):
+                continue
+            stats = job.get_stats(now)
+            repeat = f"/{job.repeat}" if job.repeat else ""
+            status = "done" if stats['finished'] else ("running" if running else "idle")
+            if stats['errors']:
+                status += f" ({stats['errors']} err)"
+            self.jobs_tree.set(item, "runs", f"{stats['runs']}{repeat}")
+            self.jobs_tree.set(item, "rate", f"{stats['achieved_rate']:.1f}/{stats['target_rate']:.1f}")
+            self.jobs_tree.set(item, "jitter", f"{stats['jitter_mean_ms']:.2f}")
+            self.jobs_tree.set(item, "status", status)
     
     def toggle_macro_recording(self):
         """Toggle macro recording"""
@@ -796,112 +6372,233 @@ Performance Features:
     
     def start_macro_recording(self):
         """Start macro recording"""
+        try:
+            # Stored with the macro so parallel playback can map it onto other windows
+            origin = self.engine.client_origin(self.target_window_var.get())
+            self.macro_recorder.start(chunk_size=self.config.get('macro_chunk_size', MACRO_CHUNK_SIZE), origin=origin)
+        except Exception as e:
+            logging.error(f"Error starting macro recording: {e}")
+            messagebox.showerror("Error", f"Failed to start recording: {e}")
+            return
+        
         self.is_recording_macro = True
-        self.recorded_actions = []
+        self.recorded_actions = MacroStore()
         
         self.record_button.config(text="Stop Recording")
         self.update_status("Recording macro...", "blue")
         
-        # Start recording thread
-        self.record_thread = threading.Thread(target=self._macro_recorder, daemon=True)
-        self.record_thread.start()
+        # Live tail of incoming events while recording
+        self.macro_view.set_source(self.macro_recorder.live_view(), follow_tail=True)
+        self._update_recording_view()
     
     def stop_macro_recording(self):
         """Stop macro recording"""
         self.is_recording_macro = False
+        self.recorded_actions = self.macro_recorder.stop()
         
         self.record_button.config(text="Start Recording")
         self.update_status("Recording stopped", "orange")
         
         if self.recorded_actions:
             self.play_macro_button.config(state="normal")
-            self.display_recorded_actions()
-    
-    def _macro_recorder(self):
-        """Record macro actions"""
-        last_time = time.time()
-        
-        while self.is_recording_macro:
-            try:
-                # Record mouse position changes
-                current_pos = self.mouse_handler.get_mouse_position(force_update=True)
-                current_time = time.time()
-                
-                # Record significant position changes
-                if len(self.recorded_actions) == 0 or \
-                   abs(current_pos[0] - self.recorded_actions[-1].get('x', 0)) > 5 or \
-                   abs(current_pos[1] - self.recorded_actions[-1].get('y', 0)) > 5:
-                    
-                    action = {
-                        'type': 'move',
-                        'x': current_pos[0],
-                        'y': current_pos[1],
-                        'delay': current_time - last_time
-                    }
-                    self.recorded_actions.append(action)
-                    last_time = current_time
-                
-                time.sleep(0.1)
-                
-            except Exception as e:
-                logging.error(f"Error recording macro: {e}")
-                break
+        self.display_recorded_actions()
     
     def display_recorded_actions(self):
-        """Display recorded actions in the text widget"""
-        self.macro_text.config(state="normal")
-        self.macro_text.delete(1.0, tk.END)
-        
-        for i, action in enumerate(self.recorded_actions):
-            if action['type'] == 'move':
-                text = f"{i+1}. Move to ({action['x']}, {action['y']}) - Delay: {action['delay']:.2f}s\n"
-            elif action['type'] == 'click':
-                text = f"{i+1}. Click at ({action['x']}, {action['y']}) - Button: {action['button']}\n"
+        """Display recorded actions in the virtualized list view"""
+        self.macro_view.set_source(self.recorded_actions)
+        self.macro_count_label.config(text=f"{len(self.recorded_actions):,} events")
+    
+    def _update_recording_view(self):
+        """Show the tail of the recording in progress"""
+        if not self.is_recording_macro:
+            return
+        self.macro_view.refresh()
+        self.macro_count_label.config(text=f"{self.macro_recorder.event_count:,} events")
+        self.root.after(250, self._update_recording_view)
+    
+    def goto_macro_row(self):
+        """Jump to the row number entered in the navigation box"""
+        try:
+            self.macro_view.goto_row(int(self.macro_goto_var.get()) - 1)
+        except ValueError:
+            messagebox.showwarning("Invalid Row", "Enter a row number.")
+    
+    def goto_macro_time(self):
+        """Jump to the first action at or after the time entered in the navigation box"""
+        try:
+            self.macro_view.goto_time(float(self.macro_goto_var.get()))
+        except ValueError:
+            messagebox.showwarning("Invalid Time", "Enter a time in seconds.")
+    
+    def _editable_macro(self):
+        """The recorded macro as an in-memory MacroStore (a lazily opened file is loaded)"""
+        if isinstance(self.recorded_actions, MacroFile):
+            self.recorded_actions = MacroStore.load(self.recorded_actions.filename)
+        return self.recorded_actions
+    
+    def _macro_block_rows(self):
+        """Zero-based [first, last] rows of the Control Flow range (defaults to the whole macro)"""
+        count = len(self.recorded_actions)
+        first = int(self.macro_block_from_var.get() or 1) - 1
+        last = int(self.macro_block_to_var.get() or count) - 1
+        if not 0 <= first <= last < count:
+            raise ValueError(f"rows must be between 1 and {count:,}")
+        return first, last
+    
+    def wrap_macro_rows(self, block_type):
+        """Wrap the selected rows in a repeat (count, 0 = until stopped) or timed loop block"""
+        if not self.recorded_actions:
+            messagebox.showwarning("No Macro", "No macro has been recorded yet.")
+            return
+        try:
+            first, last = self._macro_block_rows()
+            if block_type == 'repeat':
+                opener = {'type': 'repeat', 'count': int(self.macro_repeat_count_var.get())}
             else:
-                text = f"{i+1}. {action['type']}: {action}\n"
-            
-            self.macro_text.insert(tk.END, text)
-        
-        self.macro_text.config(state="disabled")
+                opener = {'type': 'loop', 'seconds': float(self.macro_block_seconds_var.get())}
+            macro = self._editable_macro()
+            macro.insert(last + 1, {'type': 'end'})
+            macro.insert(first, opener)
+        except (tk.TclError, ValueError) as e:
+            messagebox.showerror("Control Flow", f"Cannot add the {block_type}: {e}")
+            return
+        self.display_recorded_actions()
+        self.update_status(f"Rows {first + 1:,}-{last + 1:,} wrapped in a {block_type}", "green")
+    
+    def insert_macro_wait(self):
+        """Insert a wait of the entered seconds before the first selected row"""
+        if not self.recorded_actions:
+            messagebox.showwarning("No Macro", "No macro has been recorded yet.")
+            return
+        try:
+            first, _ = self._macro_block_rows()
+            self._editable_macro().insert(first, {'type': 'wait', 'seconds': float(self.macro_block_seconds_var.get())})
+        except (tk.TclError, ValueError) as e:
+            messagebox.showerror("Control Flow", f"Cannot add the wait: {e}")
+            return
+        self.display_recorded_actions()
+        self.update_status(f"Wait added before row {first + 1:,}", "green")
     
     def clear_macro(self):
         """Clear recorded macro"""
-        self.recorded_actions = []
+        self.recorded_actions = MacroStore()
         self.play_macro_button.config(state="disabled")
         
-        self.macro_text.config(state="normal")
-        self.macro_text.delete(1.0, tk.END)
-        self.macro_text.config(state="disabled")
+        self.display_recorded_actions()
         
         self.update_status("Macro cleared", "orange")
     
+    def compiled_macro(self):
+        """The recorded macro compiled for playback, reused until the macro changes"""
+        source, count, compiled = self._compiled_macro
+        if source is not self.recorded_actions or count != len(self.recorded_actions):
+            compiled = compile_macro(self.recorded_actions)
+            self._compiled_macro = (self.recorded_actions, len(self.recorded_actions), compiled)
+        return compiled
+    
     def play_macro(self):
         """Play recorded macro"""
         if not self.recorded_actions:
             messagebox.showwarning("No Macro", "No macro has been recorded yet.")
             return
         
-        self.update_status("Playing macro...", "blue")
+        if self.is_playing_macro:
+            # Pressing again stops playback that waits for the trigger condition
+            self.is_playing_macro = False
+            return
+        
+        try:
+            speed = float(self.macro_speed_var.get())
+        except (tk.TclError, ValueError):
+            speed = 1.0
+        try:
+            if self.macro_parallel_windows_var.get():
+                player = self.engine.parallel_macro_player(
+                    self.target_window_var.get(), speed=speed, catch_up=self.macro_catch_up_var.get(),
+                    max_workers=self.macro_parallel_workers_var.get())
+                windows = len(player.windows)
+                player.progress = lambda progress: self._post_parallel_progress(progress, windows)
+            else:
+                player = MacroPlayer(self.mouse_handler, speed=speed, catch_up=self.macro_catch_up_var.get(),
+                                     progress=self._post_macro_progress)
+        except (tk.TclError, ValueError) as e:
+            messagebox.showerror("Parallel Playback", f"Cannot play in parallel: {e}")
+            return
+        try:
+            program = self.compiled_macro()
+        except ValueError as e:
+            messagebox.showerror("Invalid Macro", f"Cannot play the macro: {e}")
+            return
+        
+        watch = None
+        if self.macro_wait_condition_var.get():
+            try:
+                condition = self.take_condition()
+                if condition is None:
+                    raise ValueError("no condition is set on the Main Controls tab")
+                watch = self.engine.watch_condition('macro', self.target_window_var.get(), condition)
+            except Exception as e:
+                messagebox.showerror("Trigger Condition", f"Cannot watch the trigger condition: {e}")
+                return
+            self.play_macro_button.config(text="Stop Macro")
+        
+        self.is_playing_macro = True
+        self._update_refresh_state()
+        self.update_status(f"Playing macro at {player.speed:g}x...", "blue")
         
         # Start playback thread
-        playback_thread = threading.Thread(target=self._play_macro_worker, daemon=True)
+        playback_thread = threading.Thread(target=self._play_macro_worker, args=(player, program, watch), daemon=True)
         playback_thread.start()
     
-    def _play_macro_worker(self):
-        """Worker thread for macro playback"""
+    def _post_macro_progress(self, progress):
+        """Show playback position and iteration from the playback thread (coalesced)"""
+        text = format_macro_progress(progress)
+        self.ui_queue.post(lambda: self.macro_progress_label.config(text=text), key='macro_progress')
+    
+    def _post_parallel_progress(self, progress, windows):
+        """Show the window furthest behind during parallel playback (coalesced)"""
+        text = format_parallel_progress(progress, windows)
+        self.ui_queue.post(lambda: self.macro_progress_label.config(text=text), key='macro_progress')
+    
+    def _play_macro_worker(self, player, program, watch=None):
+        """Worker thread for macro playback; with a watch, plays each time its condition fires"""
         try:
-            for action in self.recorded_actions:
-                if action['type'] == 'move':
-                    pyautogui.moveTo(action['x'], action['y'])
-                    time.sleep(action.get('delay', 0.1))
-                elif action['type'] == 'click':
-                    pyautogui.click(action['x'], action['y'], button=action.get('button', 'left'))
+            while True:
+                if watch is not None:
+                    self.post_status("Macro waiting for the trigger condition...", "blue")
+                    if not watch.wait(lambda: self.is_playing_macro):
+                        self.post_status("Macro playback stopped", "orange")
+                        break
                 
-            self.root.after(0, lambda: self.update_status("Macro playback complete", "green"))
+                with HighResolutionTimer():
+                    stats = player.play(program, lambda: self.is_playing_macro)
+                
+                logging.info(f"Macro playback: {stats}")
+                if 'windows' in stats:
+                    summary = (f"{stats['completed']}/{stats['windows']} windows ({stats['failed']} failed), "
+                               f"{stats['executed']} events, timeline error up to {stats['max_final_error_ms']:.1f}ms"
+                               f" (max {stats['max_lag_ms']:.1f}ms)")
+                else:
+                    summary = (f"{stats['executed']} events, timeline error {stats['final_error_ms']:.1f}ms"
+                               f" (max {stats['max_lag_ms']:.1f}ms), {stats['dropped']} moves dropped")
+                if stats['cancelled']:
+                    self.post_status(f"Macro playback stopped: {summary}", "orange")
+                    break
+                self.post_status(f"Macro playback complete: {summary}", "green")
+                if watch is None:
+                    break
             
         except Exception as e:
             logging.error(f"Error playing macro: {e}")
-            self.root.after(0, lambda: self.update_status(f"Macro error: {e}", "red"))
+            self.post_status(f"Macro error: {e}", "red")
+        finally:
+            self.is_playing_macro = False
+            self.ui_queue.post(lambda: self.macro_progress_label.config(text=""), key='macro_progress')
+            self.ui_queue.post(self._update_refresh_state, key='refresh_state')
+            if watch is not None:
+                logging.info(f"Macro condition watch: {watch.get_stats()}")
+                self.engine.region_watcher.remove(watch.name)
+                self.ui_queue.post(lambda: self.play_macro_button.config(text="Play Macro"), key='macro_button')
     
     def save_macro(self):
         """Save macro to file"""
@@ -910,28 +6607,77 @@ Performance Features:
             return
         
         filename = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            defaultextension=".acmacro",
+            filetypes=[("Macro files", "*.acmacro"), ("JSON files", "*.json"), ("All files", "*.*")]
         )
         
         if filename:
             try:
-                with open(filename, 'w') as f:
-                    json.dump(self.recorded_actions, f, indent=2)
+                if self.simplify_on_save_var.get():
+                    self.simplify_macro_path(show_result=False)
+                if filename.lower().endswith('.json'):
+                    self._write_json_macro(filename)
+                else:
+                    self.recorded_actions.save(filename)
                 messagebox.showinfo("Success", f"Macro saved to {filename}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save macro: {e}")
     
+    def simplify_macro_path(self, show_result=True):
+        """Simplify recorded mouse movement and report how many events were removed"""
+        if not self.recorded_actions:
+            if show_result:
+                messagebox.showwarning("No Macro", "No macro to simplify.")
+            return
+        
+        try:
+            tolerance = float(self.path_tolerance_var.get())
+        except (tk.TclError, ValueError):
+            tolerance = self.config.get('path_tolerance', 2.0)
+        
+        original_count = len(self.recorded_actions)
+        start = time.perf_counter()
+        try:
+            simplified, removed = PathSimplifier(tolerance).simplify(self.recorded_actions)
+        except Exception as e:
+            logging.error(f"Error simplifying macro path: {e}")
+            messagebox.showerror("Error", f"Failed to simplify macro: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        
+        if isinstance(simplified, MacroFile):
+            self._temp_macro_files.append(simplified.filename)
+        self.recorded_actions = simplified
+        self.display_recorded_actions()
+        
+        ratio = original_count / len(simplified) if simplified else 0.0
+        summary = f"Removed {removed} of {original_count} events ({ratio:.1f}x fewer)"
+        logging.info(f"Path simplification (tolerance {tolerance}px): {summary} in {elapsed:.3f}s")
+        self.update_status(summary, "green")
+        if show_result:
+            messagebox.showinfo("Path Simplified", summary)
+    
+    def _write_json_macro(self, filename):
+        """Write the macro as a legacy JSON list, one action at a time"""
+        with open(filename, 'w') as f:
+            f.write('[')
+            for i, action in enumerate(self.recorded_actions):
+                f.write(',\n  ' if i else '\n  ')
+                json.dump(action, f)
+            f.write('\n]\n')
+    
     def load_macro(self):
         """Load macro from file"""
         filename = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("Macro files", "*.acmacro"), ("JSON files", "*.json"), ("All files", "*.*")]
         )
         
         if filename:
             try:
-                with open(filename, 'r') as f:
-                    self.recorded_actions = json.load(f)
+                macro = open_macro(filename)
+                # Validate every event now rather than midway through playback
+                self._compiled_macro = (macro, len(macro), compile_macro(macro))
+                self.recorded_actions = macro
                 self.display_recorded_actions()
                 self.play_macro_button.config(state="normal")
                 messagebox.showinfo("Success", f"Macro loaded from {filename}")
@@ -941,10 +6687,10 @@ Performance Features:
     
     def apply_theme(self):
         """Apply selected theme"""
-        if THEMES_AVAILABLE and ThemedStyle is not None:
+        if THEMES_AVAILABLE:
             try:
                 theme = self.theme_var.get()
-                style = ThemedStyle(self.root)
+                style = ttkthemes.ThemedStyle(self.root)
                 style.set_theme(theme)
                 self.config['theme'] = theme
                 messagebox.showinfo("Theme Applied", f"Theme '{theme}' has been applied.")
@@ -953,115 +6699,254 @@ Performance Features:
         else:
             messagebox.showwarning("Theme Unavailable", "Theme support is not available. Please install ttkthemes: pip install ttkthemes")
     
-    def save_config(self):
-        """Save current configuration"""
+    def _config_from_ui(self):
+        """The current configuration: the loaded one updated from the Tk variables"""
+        config = dict(self.config)
+        for key, name in self.CONFIG_VARIABLES:
+            variable = getattr(self, name, None)
+            if variable is None:
+                continue
+            try:
+                config[key] = variable.get()
+            except (tk.TclError, ValueError):
+                pass  # Half-typed value: keep the previous one
+        config['jobs'] = [job.to_dict() for job in self.job_scheduler.jobs.values()]
+        return config
+    
+    def _apply_config(self, config):
+        """Show a configuration in the UI and hand it to running work without stopping it"""
+        changed = set()
+        self._applying_config = True
         try:
-            self.config.update({
-                'click_interval': self.interval_var.get(),
-                'action_type': self.action_type_var.get(),
-                'mouse_button': self.mouse_button_var.get(),
-                'click_type': self.click_type_var.get(),
-                'x_coordinate': self.x_var.get(),
-                'y_coordinate': self.y_var.get(),
-                'keyboard_key': self.keyboard_key_var.get(),
-                'target_window': self.target_window_var.get(),
-                'hotkey_start_stop': self.start_hotkey_var.get(),
-                'emergency_stop_hotkey': self.emergency_hotkey_var.get(),
-                'auto_resize_window': self.auto_resize_var.get(),
-            })
-            
-            if hasattr(self, 'theme_var'):
-                self.config['theme'] = self.theme_var.get()
-            
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=2)
-            
-            messagebox.showinfo("Success", "Configuration saved successfully!")
-            
+            for key, name in self.CONFIG_VARIABLES:
+                variable = getattr(self, name, None)
+                if variable is None or key not in config:
+                    continue
+                try:
+                    current = variable.get()
+                except (tk.TclError, ValueError):
+                    current = None
+                if current != config[key]:
+                    variable.set(config[key])
+                    changed.add(key)
+        finally:
+            self._applying_config = False
+        self.config = config
+        
+        if changed & {'metrics_enabled', 'metrics_port'}:
+            self.apply_metrics_settings()
+        
+        # Jobs are updated in place when they differ; running ones keep running
+        jobs = config.get('jobs', [])
+        if jobs != [job.to_dict() for job in self.job_scheduler.jobs.values()]:
+            self._set_jobs(jobs)
+            if self.job_scheduler.running and not self.job_scheduler.jobs:
+                self.toggle_jobs()
+        
+        self.on_action_type_change()
+        if self.is_clicking:
+            # The running worker picks up the new snapshot on its next tick
+            self.apply_action_settings()
+    
+    def _trace_config_variables(self):
+        for key, name in self.CONFIG_VARIABLES:
+            variable = getattr(self, name, None)
+            if variable is not None:
+                variable.trace_add('write', self._on_config_edited)
+    
+    def _on_config_edited(self, *args):
+        if not self._applying_config:
+            self._schedule_profile_save()
+    
+    def _schedule_profile_save(self):
+        """Save the active profile once edits pause, instead of on every change"""
+        if self._profile_save_job is not None:
+            self.root.after_cancel(self._profile_save_job)
+        self._profile_save_job = self.root.after(PROFILE_SAVE_DELAY_MS, self._save_profile)
+    
+    def _save_profile(self):
+        """Write the active profile now (one transaction); returns success"""
+        if self._profile_save_job is not None:
+            self.root.after_cancel(self._profile_save_job)
+            self._profile_save_job = None
+        
+        self.config = self._config_from_ui()
+        try:
+            if self.profiles is not None:
+                self.profiles.save(self.profile_name, self.config)
+            else:
+                write_config(self.config_file, self.config)
+            return True
         except Exception as e:
             logging.error(f"Error saving configuration: {e}")
-            messagebox.showerror("Error", f"Failed to save configuration: {e}")
+            return False
+    
+    def save_config(self):
+        """Save current configuration"""
+        if self._save_profile():
+            messagebox.showinfo("Success", f"Profile '{self.profile_name}' saved successfully!")
+        else:
+            messagebox.showerror("Error", "Failed to save configuration; see autoclick.log for details.")
     
-    def load_config(self):
-        """Load configuration from file"""
+    def load_config(self, profile=None):
+        """Load the given (or else the active) profile from the profile store"""
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    loaded_config = json.load(f)
-                
-                # Merge with defaults
-                for key, value in self.default_config.items():
-                    if key not in loaded_config:
-                        loaded_config[key] = value
-                
-                return loaded_config
-            else:
-                return self.default_config.copy()
-                
+            self.profiles = open_profile_store(PROFILE_DB, self.config_file)
+            if profile not in self.profiles:
+                if profile:
+                    logging.warning(f"No profile named {profile}, using the active profile")
+                profile = self.profiles.active or self.profiles.names()[0]
+            self.profile_name = profile
+            return self.profiles.get(self.profile_name)
         except Exception as e:
             logging.error(f"Error loading configuration: {e}")
             return self.default_config.copy()
     
     def load_config_file(self):
-        """Load configuration from a selected file"""
+        """Load a configuration file into the active profile and follow later edits to it"""
         filename = filedialog.askopenfilename(
             filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
         )
         
         if filename:
             try:
-                with open(filename, 'r') as f:
-                    loaded_config = json.load(f)
+                self._apply_config(read_config(filename))
+                self._save_profile()
                 
-                # Update variables
-                self.interval_var.set(loaded_config.get('click_interval', 1.0))
-                self.action_type_var.set(loaded_config.get('action_type', 'mouse'))
-                self.mouse_button_var.set(loaded_config.get('mouse_button', 'left'))
-                self.click_type_var.set(loaded_config.get('click_type', 'single'))
-                self.x_var.set(loaded_config.get('x_coordinate', 100))
-                self.y_var.set(loaded_config.get('y_coordinate', 100))
-                self.keyboard_key_var.set(loaded_config.get('keyboard_key', 'space'))
-                self.target_window_var.set(loaded_config.get('target_window', ''))
-                self.start_hotkey_var.set(loaded_config.get('hotkey_start_stop', 'f6'))
-                self.emergency_hotkey_var.set(loaded_config.get('emergency_stop_hotkey', 'f12'))
-                self.auto_resize_var.set(loaded_config.get('auto_resize_window', True))
+                if self.linked_config_file:
+                    self.file_watcher.unwatch(self.linked_config_file)
+                self.linked_config_file = filename
+                self.file_watcher.watch_file(filename)
                 
-                if hasattr(self, 'theme_var'):
-                    self.theme_var.set(loaded_config.get('theme', 'arc'))
-                
-                self.config = loaded_config
-                self.on_action_type_change()
-                
-                messagebox.showinfo("Success", f"Configuration loaded from {filename}")
+                messagebox.showinfo("Success", f"Configuration loaded from {filename}\n"
+                                               "Changes to the file will be applied automatically.")
                 
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load configuration: {e}")
     
+    def export_config_file(self):
+        """Write the current configuration to a JSON file"""
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            initialfile=f"{self.profile_name}.json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        
+        if filename:
+            try:
+                write_config(filename, self._config_from_ui())
+                messagebox.showinfo("Success", f"Configuration exported to {filename}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to export configuration: {e}")
+    
     def reset_config(self):
         """Reset configuration to defaults"""
         if messagebox.askyesno("Reset Configuration", 
                               "Are you sure you want to reset all settings to default?"):
-            self.config = self.default_config.copy()
-            
-            # Update all variables
-            self.interval_var.set(self.config['click_interval'])
-            self.action_type_var.set(self.config['action_type'])
-            self.mouse_button_var.set(self.config['mouse_button'])
-            self.click_type_var.set(self.config['click_type'])
-            self.x_var.set(self.config['x_coordinate'])
-            self.y_var.set(self.config['y_coordinate'])
-            self.keyboard_key_var.set(self.config['keyboard_key'])
-            self.target_window_var.set(self.config['target_window'])
-            self.start_hotkey_var.set(self.config['hotkey_start_stop'])
-            self.emergency_hotkey_var.set(self.config['emergency_stop_hotkey'])
-            self.auto_resize_var.set(self.config['auto_resize_window'])
-            
-            if hasattr(self, 'theme_var'):
-                self.theme_var.set(self.config['theme'])
-            
-            self.on_action_type_change()
+            self._apply_config(self.default_config.copy())
+            self._save_profile()
             messagebox.showinfo("Reset Complete", "Configuration has been reset to defaults.")
     
+    def _on_watched_change(self, key):
+        """Apply a profile store or linked configuration file changed outside this window"""
+        if key == 'profiles':
+            if self._profile_save_job is not None:
+                self._save_profile()  # Keep pending edits
+            self.profiles.reload()
+            self._register_profile_hotkeys()
+            if self.profile_name not in self.profiles:
+                return
+            config = self.profiles.get(self.profile_name)
+        elif key == self.linked_config_file:
+            try:
+                config = read_config(key)
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not reload {key}: {e}")  # e.g. still being written
+                return
+        else:
+            return
+        
+        if config != self.config:
+            self._apply_config(config)
+            if key != 'profiles':
+                self._save_profile()
+            self.update_status(f"Configuration reloaded ({os.path.basename(key)})", "blue")
+            logging.info(f"Applied changed configuration from {key}")
+    
+    def _update_profile_list(self):
+        if self.profiles is not None:
+            self.profile_combo['values'] = self.profiles.names()
+    
+    def switch_profile(self, name):
+        """Make another profile active; running actions and jobs continue with its settings"""
+        if self.profiles is None or name not in self.profiles or name == self.profile_name:
+            return
+        start = time.perf_counter()
+        
+        if self._profile_save_job is not None:
+            self._save_profile()  # Don't lose pending edits of the old profile
+        self.profile_name = name
+        self._apply_config(self.profiles.get(name))
+        self.profiles.set_active(name)
+        self.profile_var.set(name)
+        self.profile_hotkey_var.set(self.profiles.hotkeys().get(name, ''))
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logging.info(f"Switched to profile {name} in {elapsed_ms:.1f}ms")
+        self.update_status(f"Profile: {name}", "blue")
+    
+    def save_profile_as(self):
+        """Save the current settings as a new (or replaced) profile and switch to it"""
+        name = simpledialog.askstring("Save Profile", "Profile name:", parent=self.root)
+        name = name.strip() if name else ""
+        if not name:
+            return
+        if name in self.profiles and not messagebox.askyesno("Save Profile", f"Replace profile '{name}'?"):
+            return
+        
+        try:
+            self.config = self._config_from_ui()
+            self.profiles.save(name, self.config)
+            self.profiles.set_active(name)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save profile: {e}")
+            return
+        self.profile_name = name
+        self.profile_var.set(name)
+        self.profile_hotkey_var.set(self.profiles.hotkeys().get(name, ''))
+        self.update_status(f"Profile: {name}", "blue")
+    
+    def delete_profile(self):
+        """Delete the active profile and switch to another one"""
+        names = [name for name in self.profiles.names() if name != self.profile_name]
+        if not names:
+            messagebox.showwarning("Delete Profile", "The last profile cannot be deleted.")
+            return
+        if not messagebox.askyesno("Delete Profile", f"Delete profile '{self.profile_name}'?"):
+            return
+        
+        deleted = self.profile_name
+        if self._profile_save_job is not None:
+            self.root.after_cancel(self._profile_save_job)
+            self._profile_save_job = None
+        self.switch_profile(names[0])
+        self.profiles.delete(deleted)
+        self._register_profile_hotkeys()
+    
+    def set_profile_hotkey(self):
+        """Assign the hotkey entered in the Settings tab to the active profile"""
+        hotkey = self.profile_hotkey_var.get().strip().lower()
+        if hotkey in (self.config.get('hotkey_start_stop', 'f6'), self.config.get('emergency_stop_hotkey', 'f12')):
+            messagebox.showerror("Profile Hotkey", f"{hotkey} is already a control hotkey.")
+            return
+        try:
+            self.profiles.set_hotkey(self.profile_name, hotkey)
+        except ValueError as e:
+            messagebox.showerror("Profile Hotkey", str(e))
+            return
+        self._register_profile_hotkeys()
+        self.update_status(f"Profile hotkey: {hotkey or 'none'}", "blue")
+    
     def update_status(self, text, color=None):
         """Update status label with color"""
         actual_color = color if color else "black"
@@ -1075,13 +6960,31 @@ Performance Features:
         try:
             # Stop all actions
             self.is_clicking = False
+            self.is_playing_macro = False
+            self.job_scheduler.stop()
             self.is_recording_macro = False
+            self.macro_recorder.stop()
+            self.macro_recorder.discard()
+            for filename in self._temp_macro_files:
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
             
             # Unregister hotkeys
             self.keyboard_handler.unregister_all()
+            self.metrics_server.stop()
+            
+            logging.info(f"Window title cache: {self.window_manager.get_cache_stats()}")
+            logging.info(f"Mouse position cache: {self.mouse_handler.get_cache_stats()}")
+            
+            self.engine.region_watcher.stop()
             
             # Save configuration
-            self.save_config()
+            self.file_watcher.stop()
+            self._save_profile()
+            if self.profiles is not None:
+                self.profiles.close()
             
             # Close application
             self.root.destroy()
@@ -1098,16 +7001,56 @@ Performance Features:
             self.on_closing()
 
 
-def main():
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Auto Action Clicker")
+    parser.add_argument('--headless', action='store_true',
+                        help="Run without the GUI using the configuration (and macro, if given)")
+    parser.add_argument('--config', help=f"Configuration file (default: the active profile in {PROFILE_DB})")
+    parser.add_argument('--profile', help=f"Profile from {PROFILE_DB} to run (default: the active one)")
+    parser.add_argument('--macro', help="Macro file to play (.acmacro or legacy .json)")
+    parser.add_argument('--jobs', action='store_true', help="Run the jobs from the configuration")
+    parser.add_argument('--repeat', type=int, default=1, help="Macro passes, 0 = until stopped (default: 1)")
+    parser.add_argument('--count', type=int, help="Stop after this many actions")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    parser.add_argument('--paused', action='store_true', help="Wait for the start/stop hotkey before running")
+    parser.add_argument('--no-hotkeys', action='store_true', help="Do not register the start/stop and emergency hotkeys")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this localhost port")
+    parser.add_argument('--log-file', default=LOG_FILE, help=f"Log file, rotated at 5 MB (default: {LOG_FILE})")
+    parser.add_argument('--log-json', metavar='FILE', help="Also write structured JSON lines logs to this file")
+    args = parser.parse_args(argv)
+    
+    if (args.macro or args.jobs or args.count or args.duration or args.paused or args.metrics_port) and not args.headless:
+        parser.error("--macro, --jobs, --count, --duration, --paused and --metrics-port require --headless")
+    if args.profile and args.config:
+        parser.error("--profile and --config cannot be combined")
+    if args.macro and args.jobs:
+        parser.error("--macro and --jobs cannot be combined")
+    if args.paused and args.no_hotkeys:
+        parser.error("--paused needs the start/stop hotkey")
+    return args
+
+
+def main(argv=None):
     """Main entry point"""
+    args = parse_args(argv)
+    
+    # Check if running on Windows
+    if os.name != 'nt':
+        print("This application is designed for Windows only.")
+        return EXIT_ERROR
+    
+    if not check_dependencies():
+        return EXIT_ERROR
+    
+    setup_logging(args.log_file, json_filename=args.log_json)
+    
+    if args.headless:
+        return run_headless(args)
+    
     try:
-        # Check if running on Windows
-        if os.name != 'nt':
-            print("This application is designed for Windows only.")
-            return
-        
         # Create and run application
-        app = AutoActionClicker()
+        app = AutoActionClicker(profile=args.profile)
         app.run()
         
     except Exception as e:
@@ -1116,7 +7059,9 @@ def main():
             messagebox.showerror("Fatal Error", f"Application encountered a fatal error: {e}")
         except:
             print(f"Fatal error: {e}")
+        return EXIT_ERROR
+    return EXIT_OK
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,987 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Auto Action Clicker - Benchmarks
+
+Runs headless (also on Linux) against simulated window and input backends:
+
+- action engine: achieved actions/sec and jitter of the deadline scheduler
+  loop used by the action worker, for foreground and background delivery
+- window lookup: find_target_window and cached handle latency with N windows
+- window title cache: get_open_window_titles hit rate for polling periods
+- macro I/O: save/load time, file size and memory of the binary and JSON
+  formats at 1k, 100k and 1M events
+- macro playback: per-event cost of compiling a macro and of the playback
+  interpreter loop, with waits removed so only dispatch overhead is timed,
+  also through a repeat block whose compiled size stays that of the source
+- parallel macro playback: one macro posted to 1, 8 and 32 simulated windows
+  from a worker pool; wall time relative to one playback and per-window
+  timeline error
+- startup: GUI against headless startup time and peak memory
+- idle wakeups: UI refresh timer wakeups/sec per window state (simulated
+  time), checked against fixed targets as well as the baseline
+- template match: image-click search, tracked and unchanged-frame match time
+  and accuracy on synthetic screen-sized textures
+- region watch: CPU per sample of a watched region where a small area keeps
+  changing, watches per core at 10 samples/sec, and the time from a change to
+  the condition firing with dozens of watches on one watcher thread
+
+Results are written as JSON and can be compared against a baseline recorded
+on the same machine; the suite runs several times and the medians are gated, so
+the exit code is 1 only when a metric regresses past its threshold.
+
+Usage:
+    python benchmark.py [--quick] [--output results.json]
+    python benchmark.py --save-baseline          # store benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json
+"""
+
+import argparse
+import contextlib
+import fnmatch
+import gc
+import heapq
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import auto_action_clicker as app_module
+from auto_action_clicker import (HeadlessRunner, MacroPlayer, MacroStore, MouseHandler, ParallelMacroPlayer,
+                                 RecordingInputBackend, RegionCondition, RegionWatch, RegionWatcher, TargetWindowResolver, TemplateMatcher,
+                                 UIRefreshController, WindowManager, compile_macro, numpy, open_macro)
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+# Fields that identify an entry within each result list (used as metric path labels)
+RESULT_KEYS = {
+    'action_engine': ('rate', 'delivery_mode'),
+    'window_lookup': ('windows',),
+    'title_cache': ('poll_interval',),
+    'macro_formats': ('events',),
+    'macro_playback': ('events',),
+    'macro_parallel': ('windows',),
+    'startup': ('mode',),
+    'idle_wakeups': ('scenario',),
+    'template_match': ('frame',),
+    'region_watch': ('region', 'mode'),
+    'region_fire_latency': ('watches',),
+}
+
+# Regression thresholds by metric path: (pattern, better, relative tolerance, absolute tolerance).
+# Medians over the repeated runs are compared, and a metric regresses only when it is
+# worse than the baseline by more than both tolerances, so scheduler noise in fast
+# metrics does not fail the run. Maxima (jitter, lag, fire latency) are single samples
+# and are reported but never gated.
+REGRESSION_THRESHOLDS = (
+    ('*.hit_rate', 'higher', 0.02, 0.01),
+    ('*.achieved_rate', 'higher', 0.15, 1.0),
+    ('*.jitter_mean_ms', 'lower', 1.0, 1.0),
+    ('*_event_us', 'lower', 1.0, 1.0),
+    ('*_us', 'lower', 1.0, 5.0),
+    ('*_seconds', 'lower', 0.5, 0.02),
+    ('*_bytes', 'lower', 0.2, 64 * 1024),
+    ('*.wakeups_per_sec', 'lower', 0.1, 0.5),
+    ('template_match*_ms', 'lower', 0.5, 5.0),
+    ('template_match*.accuracy', 'higher', 0.0, 0.05),
+    ('*.watches_per_core', 'higher', 0.5, 5.0),
+    ('*.fire_latency_mean_ms', 'lower', 0.5, 25.0),
+    ('macro_parallel*.duration_ratio', 'lower', 0.2, 0.1),
+)
+DEFAULT_REPEAT = 3
+
+# UI refresh scenarios: (name, visible, focused, busy, pointer moving) and the
+# most timer wakeups/sec each may cost. Idle states must not schedule timers at all.
+DISPLAY_RATE = 60
+IDLE_WAKEUP_SCENARIOS = (
+    ('minimized', False, False, False, False, 0.0),
+    ('unfocused', True, False, False, False, 0.0),
+    ('focused_idle', True, True, False, False, 1.1),
+    ('running_minimized', False, False, True, True, 0.0),
+    ('running_unfocused', True, False, True, False, 1.1),
+    ('focused_moving', True, True, False, True, DISPLAY_RATE + 1),
+)
+
+
+class SimulatedWindows:
+    """Stand-in for win32gui with a fixed set of synthetic top-level windows"""
+
+    def __init__(self, window_count, seed=0):
+        rng = random.Random(seed)
+        words = ('Editor', 'Browser', 'Terminal', 'Player', 'Explorer', 'Settings', 'Chat', 'Game')
+        self.titles = {}
+        for index in range(window_count):
+            hwnd = 0x10000 + index * 4
+            # About a third of real top-level windows are hidden or untitled
+            if rng.random() < 0.3:
+                self.titles[hwnd] = ''
+            else:
+                self.titles[hwnd] = f"{rng.choice(words)} {index} - Window"
+        self.foreground = next(iter(self.titles), 0)
+        self.posted_messages = 0
+
+    def EnumWindows(self, callback, extra):
+        for hwnd in self.titles:
+            if not callback(hwnd, extra):
+                break
+
+    def IsWindow(self, hwnd):
+        return hwnd in self.titles
+
+    def IsWindowVisible(self, hwnd):
+        return bool(self.titles.get(hwnd))
+
+    def GetWindowText(self, hwnd):
+        return self.titles.get(hwnd, '')
+
+    def GetForegroundWindow(self):
+        return self.foreground
+
+    def SetForegroundWindow(self, hwnd):
+        self.foreground = hwnd
+
+    def IsIconic(self, hwnd):
+        return False
+
+    def ShowWindow(self, hwnd, command):
+        pass
+
+    def ChildWindowFromPointEx(self, hwnd, point, flags):
+        return hwnd  # Top-level windows without child controls
+
+    def ScreenToClient(self, hwnd, point):
+        return point
+
+    def ClientToScreen(self, hwnd, point):
+        return point
+
+    def PostMessage(self, hwnd, message, wparam, lparam):
+        self.posted_messages += 1
+
+    SendMessage = PostMessage
+
+
+class SimulatedWin32Api:
+    """Stand-in for the win32api calls used by the action engine and the GUI at startup"""
+
+    @staticmethod
+    def GetSystemMetrics(index):
+        # A 1920x1080 virtual screen at the origin
+        constants = SimulatedWin32Con()
+        return {constants.SM_CXVIRTUALSCREEN: 1920, constants.SM_CYVIRTUALSCREEN: 1080}.get(index, 0)
+
+    @staticmethod
+    def GetCursorPos():
+        return (0, 0)
+
+    @staticmethod
+    def EnumDisplaySettings(device, mode):
+        raise OSError("no display settings in the simulation")
+
+    @staticmethod
+    def MAKELONG(low, high):
+        return (high << 16) | low
+
+    @staticmethod
+    def MapVirtualKey(code, map_type):
+        return code & 0xFF
+
+    @staticmethod
+    def VkKeyScan(character):
+        return ord(character[0]) & 0xFF
+
+
+class SimulatedWin32Con:
+    """Stand-in for win32con: every constant resolves to a stable integer"""
+
+    def __getattr__(self, name):
+        return sum(map(ord, name))
+
+
+@contextlib.contextmanager
+def simulated_environment(window_count=100):
+    """Swap the app's Windows modules for simulations (yields the SimulatedWindows)"""
+    windows = SimulatedWindows(window_count)
+    replaced = {'win32gui': windows, 'win32api': SimulatedWin32Api(), 'win32con': SimulatedWin32Con()}
+    original = {name: getattr(app_module, name) for name in replaced}
+    for name, module in replaced.items():
+        setattr(app_module, name, module)
+    try:
+        yield windows
+    finally:
+        for name, module in original.items():
+            setattr(app_module, name, module)
+
+
+class NoWaitScheduler:
+    """Scheduler whose deadlines are always already due, so playback runs back to back"""
+
+    def now(self):
+        return 0.0
+
+    def wait_until(self, deadline, should_continue=None):
+        return deadline
+
+
+class FakeClock:
+    """Manually advanced clock for deterministic cache benchmarks"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SimulatedEventLoop:
+    """Tk-style after/after_cancel timers on a FakeClock"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self._timers = []
+        self._ids = itertools.count()
+        self._cancelled = set()
+
+    def after(self, delay_ms, func):
+        handle = next(self._ids)
+        heapq.heappush(self._timers, (self.clock.now + delay_ms / 1000, handle, func))
+        return handle
+
+    def after_cancel(self, handle):
+        self._cancelled.add(handle)
+
+    def run_until(self, end):
+        while self._timers and self._timers[0][0] <= end:
+            deadline, handle, func = heapq.heappop(self._timers)
+            if handle in self._cancelled:
+                self._cancelled.discard(handle)
+                continue
+            self.clock.now = deadline
+            func()
+        self.clock.now = end
+
+
+def generate_actions(count, seed=0):
+    """Generate a synthetic recording: mostly moves with some clicks, scrolls and keys"""
+    rng = random.Random(seed)
+    actions = []
+    t = 0.0
+    x, y = 960, 540
+    for _ in range(count):
+        t += rng.uniform(0.001, 0.02)
+        roll = rng.random()
+        if roll < 0.85:
+            x = min(1919, max(0, x + rng.randint(-8, 8)))
+            y = min(1079, max(0, y + rng.randint(-8, 8)))
+            actions.append({'type': 'move', 'x': x, 'y': y, 't': t})
+        elif roll < 0.93:
+            event_type = rng.choice(('mouse_down', 'mouse_up'))
+            actions.append({'type': event_type, 'x': x, 'y': y, 'button': 'left', 't': t})
+        elif roll < 0.95:
+            actions.append({'type': 'scroll', 'x': x, 'y': y, 'delta': rng.choice((-1.0, 1.0)), 't': t})
+        else:
+            event_type = rng.choice(('key_down', 'key_up'))
+            actions.append({'type': event_type, 'key': rng.choice('abcdefgh'), 'scan_code': 30, 't': t})
+    return actions
+
+
+def peak_memory_bytes():
+    """Peak resident memory of the current process"""
+    if os.name == 'nt':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _measure(func):
+    """Run func and return (result, seconds, peak traced bytes)"""
+    # Timed and traced separately: tracemalloc slows allocation-heavy code down a lot
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _time_per_call(func, repeat):
+    """Average microseconds per call over repeat calls"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def benchmark_action_engine(rate, delivery_mode, duration):
+    """Run the deadline scheduler loop of the action worker at a target rate"""
+    config = dict(app_module.DEFAULT_CONFIG, input_backend='recording', rate_mode='cps',
+                  clicks_per_second=rate, delivery_mode=delivery_mode)
+    with simulated_environment(100) as windows:
+        config['target_window'] = next(title for title in windows.titles.values() if title)
+        runner = HeadlessRunner(config, count=max(2, int(rate * duration)), use_hotkeys=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            runner.run()
+
+    stats = runner.scheduler.get_stats()
+    action_latency = runner.engine.latency_stats.get_stats().get(f'{delivery_mode}_click', {})
+    return {
+        'rate': rate,
+        'delivery_mode': delivery_mode,
+        'actions': stats['ticks'],
+        'target_rate': stats['target_rate'],
+        'achieved_rate': stats['achieved_rate'],
+        'jitter_mean_ms': stats['jitter_mean_ms'],
+        'jitter_max_ms': stats['jitter_max_ms'],
+        'action_mean_us': action_latency.get('mean_ms', 0.0) * 1000,
+    }
+
+
+def benchmark_window_lookup(window_count, repeat=200):
+    """Latency of a full window search against a revalidated cached handle"""
+    with simulated_environment(window_count) as windows:
+        manager = WindowManager()
+        titles = [title for title in windows.titles.values() if title]
+        target = titles[len(titles) // 2]
+
+        def enumerate_titles():
+            manager.clear_cache()
+            return manager.get_open_window_titles()
+
+        find_us = _time_per_call(lambda: manager.find_target_window(target), repeat)
+        titles_us = _time_per_call(enumerate_titles, repeat)
+
+        resolver = TargetWindowResolver(manager)
+        resolver.resolve(target)
+        resolve_us = _time_per_call(lambda: resolver.resolve(target), repeat * 10)
+
+    return {
+        'windows': window_count,
+        'find_target_window_us': find_us,
+        'enumerate_titles_us': titles_us,
+        'cached_resolve_us': resolve_us,
+    }
+
+
+def benchmark_title_cache(poll_interval, window_count=200, duration=60.0, cache_timeout=2.0):
+    """Hit rate of get_open_window_titles polled at a fixed period (simulated time)"""
+    clock = FakeClock()
+    with simulated_environment(window_count):
+        manager = WindowManager(cache_timeout=cache_timeout, clock=clock)
+        while clock.now < duration:
+            manager.get_open_window_titles()
+            clock.now += poll_interval
+    stats = manager.get_cache_stats()
+    return {
+        'poll_interval': poll_interval,
+        'cache_timeout': cache_timeout,
+        'calls': stats['hits'] + stats['misses'],
+        'enumerations': stats['misses'],
+        'hit_rate': stats['hit_rate'],
+    }
+
+
+def benchmark_idle_wakeups(scenario, visible, focused, busy, moving, target, duration=60.0, settle=5.0):
+    """Steady-state UI refresh wakeups/sec of the GUI's refresh loops in one window state"""
+    clock = FakeClock()
+    loop = SimulatedEventLoop(clock)
+    refresh = UIRefreshController(loop.after, loop.after_cancel, lambda: moving, lambda: True,
+                                  frame_interval=1000 / DISPLAY_RATE)
+    refresh.update(visible=visible, focused=focused, busy=busy)
+    loop.run_until(settle)
+    start_wakeups = refresh.wakeups
+    loop.run_until(settle + duration)
+    wakeups_per_sec = (refresh.wakeups - start_wakeups) / duration
+    return {
+        'scenario': scenario,
+        'wakeups_per_sec': wakeups_per_sec,
+        'target_per_sec': target,
+        'met': wakeups_per_sec <= target,
+    }
+
+
+def synthetic_texture(rng, height, width, block=8):
+    """Smooth random grayscale texture, a stand-in for screen content"""
+    blocks = rng.random((height // block + 2, width // block + 2)) * 255
+    image = numpy.kron(blocks, numpy.ones((block, block)))[:height, :width]
+    # 5x5 box blur so that matches are not exact at every offset
+    padded = numpy.pad(image, 2, mode='edge')
+    return sum(padded[dy:dy + height, dx:dx + width] for dy in range(5) for dx in range(5)) / 25
+
+
+def benchmark_template_match(width, height, trials, template_size=64, seed=0):
+    """Median match time of a full search, a tracked move and an unchanged frame, and search accuracy"""
+    rng = numpy.random.default_rng(seed)
+    background = synthetic_texture(rng, height, width)
+    template = synthetic_texture(rng, template_size, template_size) * 0.5 + 60
+
+    def frame_with_template(x, y):
+        frame = background.copy()
+        frame[y:y + template_size, x:x + template_size] = template
+        frame += rng.normal(0, 2, frame.shape)
+        return frame.astype(numpy.float32)
+
+    def located(result, x, y):
+        center = template_size // 2
+        return result.found and abs(result.x - x - center) <= 1 and abs(result.y - y - center) <= 1
+
+    matcher = TemplateMatcher(template)
+    times = {'search': [], 'tracked': [], 'cached': []}
+    found = 0
+    for _ in range(trials):
+        x = int(rng.integers(8, width - template_size - 8))
+        y = int(rng.integers(8, height - template_size - 8))
+        frame = frame_with_template(x, y)
+        matcher.reset()
+        result = matcher.match(frame)
+        times[result.mode].append(result.match_ms)
+        found += located(result, x, y)
+
+        # Same frame again, then the template moved by a few pixels
+        result = matcher.match(frame)
+        times[result.mode].append(result.match_ms)
+        x, y = x + int(rng.integers(-6, 7)), y + int(rng.integers(-6, 7))
+        result = matcher.match(frame_with_template(x, y))
+        times[result.mode].append(result.match_ms)
+        found += located(result, x, y)
+
+    return {
+        'frame': f"{width}x{height}",
+        'search_ms': float(numpy.median(times['search'])) if times['search'] else 0.0,
+        'tracked_ms': float(numpy.median(times['tracked'])) if times['tracked'] else 0.0,
+        'cached_ms': float(numpy.median(times['cached'])) if times['cached'] else 0.0,
+        'accuracy': found / (2 * trials),
+        'modes': matcher.counts.copy(),
+    }
+
+
+class SyntheticRegion:
+    """Stand-in for ScreenCapture that returns a BGRA frame set by the benchmark"""
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def grab_bgra(self, left, top, width, height):
+        return self.frame
+
+    def close(self):
+        pass
+
+
+def synthetic_bgra(rng, height, width):
+    gray = synthetic_texture(rng, height, width).astype(numpy.uint8)
+    return numpy.dstack((gray, gray // 2, 255 - gray, numpy.full_like(gray, 255)))
+
+
+def benchmark_region_watch(width, height, mode, samples=200, seed=0):
+    """CPU per sample of a watched region where a 16x16 spinner changes every frame"""
+    rng = numpy.random.default_rng(seed)
+    frames = [synthetic_bgra(rng, height, width)]
+    for step in range(7):
+        frame = frames[0].copy()
+        frame[8:24, 8:24, :3] = step * 32
+        frames.append(frame)
+    condition = RegionCondition(mode, color=(0, 255, 0))
+    watch = RegionWatch('benchmark', (0, 0, width, height), condition, capture=SyntheticRegion(frames[0]))
+    watch.sample()  # The first sample checks every tile
+
+    start = time.thread_time()
+    for index in range(samples):
+        watch.capture.frame = frames[1 + index % 7]
+        watch.sample()
+    per_sample = (time.thread_time() - start) / samples
+
+    # A full-screen change re-checks every tile
+    full_frames = [synthetic_bgra(rng, height, width) for _ in range(5)]
+    start = time.thread_time()
+    for frame in full_frames:
+        watch.capture.frame = frame
+        watch.sample()
+    full_change = (time.thread_time() - start) / len(full_frames)
+
+    return {
+        'region': f"{width}x{height}",
+        'mode': mode,
+        'cpu_per_sample_us': per_sample * 1e6,
+        'full_change_us': full_change * 1e6,
+        'watches_per_core': 1.0 / (per_sample * 10) if per_sample > 0 else float('inf'),
+        'tiles_checked_ratio': condition.get_stats()['tiles_checked_ratio'],
+    }
+
+
+def benchmark_region_fire_latency(watch_count, interval=0.05, trials=10, size=(320, 240), seed=0):
+    """Time from a region change to its condition firing with watch_count watches sampling in real time"""
+    rng = numpy.random.default_rng(seed)
+    base = synthetic_bgra(rng, size[1], size[0])
+    changed = base.copy()
+    changed[100:140, 100:140, :3] = (0, 255, 0)
+    fired = []
+    watcher = RegionWatcher()
+    captures = []
+    for index in range(watch_count):
+        capture = SyntheticRegion(base)
+        captures.append(capture)
+        watcher.add(RegionWatch(f"watch{index}", (0, 0) + size, RegionCondition('color', color=(0, 255, 0)),
+                                interval, lambda watch: fired.append(time.perf_counter()), capture))
+    latencies = []
+    try:
+        for trial in range(trials):
+            capture = captures[trial % watch_count]
+            time.sleep(interval * (1 + rng.random()))
+            count = len(fired)
+            changed_at = time.perf_counter()
+            capture.frame = changed
+            deadline = changed_at + 1.0
+            while len(fired) == count and time.perf_counter() < deadline:
+                time.sleep(0.001)
+            if len(fired) > count:
+                latencies.append(fired[count] - changed_at)
+            capture.frame = base
+            time.sleep(interval * 2)  # Let the condition clear before the next trial
+        stats = watcher.get_stats()
+    finally:
+        watcher.stop()
+    return {
+        'watches': watch_count,
+        'interval_ms': interval * 1000,
+        'fired': len(latencies),
+        'fire_latency_mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'fire_latency_max_ms': max(latencies) * 1000 if latencies else 0.0,
+        'cpu_percent_total': sum(watch['cpu_percent'] for watch in stats.values()),
+    }
+
+
+def benchmark_macro_formats(event_count, directory, include_json=True):
+    """Measure the binary (and optionally JSON) macro paths for one event count"""
+    actions = generate_actions(event_count)
+    store = MacroStore.from_actions(actions)
+    json_path = os.path.join(directory, f'macro_{event_count}.json')
+    binary_path = os.path.join(directory, f'macro_{event_count}.acmacro')
+
+    def save_json():
+        with open(json_path, 'w') as f:
+            json.dump(actions, f, indent=2)
+
+    def load_json():
+        with open(json_path, 'r') as f:
+            return json.load(f)
+
+    _, binary_save_time, _ = _measure(lambda: store.save(binary_path))
+    _, binary_load_time, binary_memory = _measure(lambda: MacroStore.load(binary_path))
+    _, open_time, open_memory = _measure(lambda: open_macro(binary_path))
+
+    result = {
+        'events': event_count,
+        'binary': {
+            'file_bytes': os.path.getsize(binary_path),
+            'save_seconds': binary_save_time,
+            'load_seconds': binary_load_time,
+            'memory_bytes': binary_memory,
+            'lazy_open_seconds': open_time,
+            'lazy_open_memory_bytes': open_memory,
+        },
+    }
+    if include_json:
+        _, json_save_time, _ = _measure(save_json)
+        _, json_load_time, json_memory = _measure(load_json)
+        result['json'] = {
+            'file_bytes': os.path.getsize(json_path),
+            'save_seconds': json_save_time,
+            'load_seconds': json_load_time,
+            'memory_bytes': json_memory,
+        }
+    return result
+
+
+def benchmark_macro_playback(event_count):
+    """Per-event compile and interpreter cost of macro playback into the recording backend"""
+    store = MacroStore.from_actions(generate_actions(event_count))
+    program, compile_time, compile_memory = _measure(lambda: compile_macro(store))
+    backend = RecordingInputBackend()
+    player = MacroPlayer(MouseHandler(backend), scheduler=NoWaitScheduler())
+    gc.collect()
+    start = time.perf_counter()
+    stats = player.play(program)
+    play_time = time.perf_counter() - start
+
+    # A macro file is validated in a streaming pass and compiled one chunk at a time as it plays
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'macro.acmacro')
+        store.save(path)
+        macro_file = open_macro(path)
+        streamed, streamed_compile_time, streamed_memory = _measure(lambda: compile_macro(macro_file))
+        gc.collect()
+        start = time.perf_counter()
+        player.play(streamed)
+        streamed_time = time.perf_counter() - start
+
+    # The same events repeated lazily: executed length grows, compiled size does not
+    repeats = max(2, 200000 // event_count)
+    store.insert(len(store), {'type': 'end'})
+    store.insert(0, {'type': 'repeat', 'count': repeats})
+    repeated, _, repeated_memory = _measure(lambda: compile_macro(store))
+    gc.collect()
+    start = time.perf_counter()
+    repeated_stats = player.play(repeated)
+    repeated_time = time.perf_counter() - start
+    return {
+        'events': event_count,
+        'executed': stats['executed'],
+        'compile_event_us': compile_time / event_count * 1e6,
+        'compile_memory_bytes': compile_memory,
+        'dispatch_event_us': play_time / event_count * 1e6,
+        'file_compile_event_us': streamed_compile_time / event_count * 1e6,
+        'file_compile_memory_bytes': streamed_memory,
+        'file_dispatch_event_us': streamed_time / event_count * 1e6,
+        'repeats': repeats,
+        'repeat_executed': repeated_stats['executed'],
+        'repeat_dispatch_event_us': repeated_time / repeated_stats['executed'] * 1e6,
+        'repeat_compile_memory_bytes': repeated_memory,
+    }
+
+
+def benchmark_macro_parallel(window_count, event_count=200, speed=2.0):
+    """Play one short macro into window_count simulated windows at once, one worker per window"""
+    store = MacroStore.from_actions(generate_actions(event_count))
+    macro_seconds = store.t_us[-1] / 1e6 / speed
+    with simulated_environment(window_count * 2) as windows:
+        targets = [(hwnd, title) for hwnd, title in windows.titles.items() if title][:window_count]
+        # As if recorded against the first window, so playback translates from its client origin
+        store.origin = windows.ClientToScreen(targets[0][0], (0, 0))
+        player = ParallelMacroPlayer(targets, speed=speed, max_workers=window_count)
+        stats = player.play(store)
+        posted = windows.posted_messages
+
+    per_window = [result for result in stats['per_window'].values() if 'error' not in result]
+    return {
+        'windows': len(targets),
+        'completed': stats['completed'],
+        'posted_messages': posted,
+        'duration_ratio': stats['duration'] / macro_seconds,
+        'mean_lag_ms': stats['mean_lag_ms'],
+        'max_lag_ms': stats['max_lag_ms'],
+        'max_start_delay_ms': max((result['start_delay_ms'] for result in per_window), default=0.0),
+    }
+
+
+# Child process scripts: time from interpreter start-up to "ready to act"
+STARTUP_SCRIPTS = {
+    'gui': """
+import time
+start = time.perf_counter()
+import auto_action_clicker as app_module
+if app_module.os.name != 'nt':
+    from benchmark import simulated_environment
+    simulation = simulated_environment()
+    simulation.__enter__()
+app = app_module.AutoActionClicker()
+app.root.update()
+ready = time.perf_counter() - start
+app.keyboard_handler.unregister_all()
+app.root.destroy()
+""",
+    'headless': """
+import time
+start = time.perf_counter()
+import auto_action_clicker as app_module
+if app_module.os.name != 'nt':
+    from benchmark import simulated_environment
+    simulation = simulated_environment()
+    simulation.__enter__()
+runner = app_module.HeadlessRunner(app_module.DEFAULT_CONFIG.copy(), use_hotkeys=False)
+ready = time.perf_counter() - start
+""",
+}
+
+STARTUP_REPORT = """
+import json
+from benchmark import peak_memory_bytes
+print(json.dumps({'ready_seconds': ready, 'peak_memory_bytes': peak_memory_bytes()}))
+"""
+
+
+def display_available():
+    """Whether Tk can open a window here (X11 needs DISPLAY; Windows and macOS always can)"""
+    return os.name == 'nt' or sys.platform == 'darwin' or bool(os.environ.get('DISPLAY'))
+
+
+def benchmark_startup(mode, runs):
+    """Start the app in a fresh interpreter and report the best of several runs"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPTS[mode] + STARTUP_REPORT],
+                                cwd=directory, capture_output=True, text=True, check=True).stdout
+        process_seconds = time.perf_counter() - start
+        sample = json.loads(output.strip().splitlines()[-1])
+        sample['process_seconds'] = process_seconds
+        samples.append(sample)
+
+    return {
+        'mode': mode,
+        'runs': runs,
+        'ready_seconds': min(sample['ready_seconds'] for sample in samples),
+        'process_seconds': min(sample['process_seconds'] for sample in samples),
+        'peak_memory_bytes': min(sample['peak_memory_bytes'] for sample in samples),
+    }
+
+
+def flatten_metrics(results):
+    """Flatten results to {'section[label].metric': value}, e.g. 'window_lookup[100].find_target_window_us'"""
+    metrics = {}
+
+    def visit(value, path):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                visit(item, f"{path}.{key}")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[path] = value
+
+    for section, entries in results.get('benchmarks', results).items():
+        keys = RESULT_KEYS.get(section, ())
+        for entry in entries:
+            label = "_".join(str(entry.get(key)) for key in keys)
+            visit({name: item for name, item in entry.items() if name not in keys}, f"{section}[{label}]")
+    return metrics
+
+
+def median_metrics(runs):
+    """Median of every flattened metric over repeated runs of the suite"""
+    samples = {}
+    for results in runs:
+        for path, value in flatten_metrics(results).items():
+            samples.setdefault(path, []).append(value)
+    return {path: statistics.median(values) for path, values in samples.items()}
+
+
+def _threshold(path):
+    for pattern, better, relative, absolute in REGRESSION_THRESHOLDS:
+        if fnmatch.fnmatch(path, pattern):
+            return better, relative, absolute
+    return None
+
+
+def compare_to_baseline(results, baseline):
+    """Return the metrics whose medians regressed past their thresholds"""
+    current = results.get('medians') or flatten_metrics(results)
+    regressions = []
+    for path, base_value in (baseline.get('medians') or flatten_metrics(baseline)).items():
+        threshold = _threshold(path)
+        if threshold is None or path not in current:
+            continue
+        better, relative, absolute = threshold
+        value = current[path]
+        change = value - base_value if better == 'lower' else base_value - value
+        if change > absolute and change > abs(base_value) * relative:
+            regressions.append({'metric': path, 'baseline': base_value, 'current': value,
+                                'allowed_relative': relative, 'allowed_absolute': absolute})
+    return regressions
+
+
+def run_benchmarks(args, startup_runs):
+    """Run all benchmark sections and print a summary line per measurement"""
+    results = {'action_engine': [], 'window_lookup': [], 'title_cache': [], 'macro_formats': [], 'macro_playback': [], 'macro_parallel': [], 'startup': [],
+               'idle_wakeups': [], 'template_match': [], 'region_watch': [], 'region_fire_latency': []}
+
+    # Startup runs first: on Linux, child processes inherit the parent's peak RSS
+    for mode in ('gui', 'headless') if startup_runs else ():
+        if mode == 'gui' and not display_available():
+            print(f"startup {mode:>9} | skipped: no display for Tk (set DISPLAY, e.g. under Xvfb)")
+            continue
+        try:
+            result = benchmark_startup(mode, startup_runs)
+        except subprocess.CalledProcessError as e:
+            print(f"startup {mode:>9} | failed: {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+            continue
+        results['startup'].append(result)
+        print(f"startup {mode:>9} | ready {result['ready_seconds'] * 1000:,.0f} ms | "
+              f"process {result['process_seconds'] * 1000:,.0f} ms | "
+              f"peak RAM {result['peak_memory_bytes'] / 1024 / 1024:,.1f} MB")
+
+    for rate in args.rates:
+        for delivery_mode in ('foreground', 'background'):
+            result = benchmark_action_engine(rate, delivery_mode, args.action_seconds)
+            results['action_engine'].append(result)
+            print(f"action engine {rate:>6g}/s {delivery_mode:>10} | achieved {result['achieved_rate']:,.1f}/s | "
+                  f"jitter mean {result['jitter_mean_ms']:.3f} ms max {result['jitter_max_ms']:.3f} ms")
+
+    for count in args.windows:
+        result = benchmark_window_lookup(count)
+        results['window_lookup'].append(result)
+        print(f"window lookup {count:>6} windows | find {result['find_target_window_us']:,.1f} us | "
+              f"enumerate {result['enumerate_titles_us']:,.1f} us | cached {result['cached_resolve_us']:,.2f} us")
+
+    for interval in (0.05, 0.5, 1.0, 5.0):
+        result = benchmark_title_cache(interval)
+        results['title_cache'].append(result)
+        print(f"title cache   poll {interval:>5g}s | hit rate {result['hit_rate']:.1%} | "
+              f"{result['enumerations']} enumerations for {result['calls']} calls")
+
+    for scenario in IDLE_WAKEUP_SCENARIOS:
+        result = benchmark_idle_wakeups(*scenario)
+        results['idle_wakeups'].append(result)
+        print(f"idle wakeups  {result['scenario']:>17} | {result['wakeups_per_sec']:.2f}/s "
+              f"(target <= {result['target_per_sec']:g}/s){'' if result['met'] else ' MISSED'}")
+
+    for width, height in ((800, 600), (1920, 1080)) if app_module.NUMPY_AVAILABLE else ():
+        result = benchmark_template_match(width, height, args.template_trials)
+        results['template_match'].append(result)
+        print(f"template match {result['frame']:>9} | search {result['search_ms']:.1f} ms | "
+              f"tracked {result['tracked_ms']:.1f} ms | unchanged {result['cached_ms']:.2f} ms | "
+              f"accuracy {result['accuracy']:.0%}")
+
+    for width, height in ((200, 150), (1920, 1080)) if app_module.NUMPY_AVAILABLE else ():
+        for mode in RegionCondition.MODES:
+            result = benchmark_region_watch(width, height, mode)
+            results['region_watch'].append(result)
+            print(f"region watch {result['region']:>9} {mode:>6} | {result['cpu_per_sample_us']:,.0f} us/sample "
+                  f"({result['tiles_checked_ratio']:.1%} tiles checked) | full change {result['full_change_us']:,.0f} us"
+                  f" | {result['watches_per_core']:,.0f} watches/core at 10/s")
+
+    for count in (1, 24) if app_module.NUMPY_AVAILABLE else ():
+        result = benchmark_region_fire_latency(count)
+        results['region_fire_latency'].append(result)
+        print(f"region fire {count:>3} watches | latency mean {result['fire_latency_mean_ms']:.1f} ms "
+              f"max {result['fire_latency_max_ms']:.1f} ms (sampling every {result['interval_ms']:g} ms) | "
+              f"CPU {result['cpu_percent_total']:.1f}%")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.events:
+            # JSON at 1M events takes minutes and gigabytes, so it has its own size limit
+            result = benchmark_macro_formats(count, directory, include_json=count <= args.json_max_events)
+            results['macro_formats'].append(result)
+
+            binary_result = result['binary']
+            line = (f"macro {count:>9} events | binary {binary_result['file_bytes'] / 1024:,.0f} KB, "
+                    f"save {binary_result['save_seconds'] * 1000:,.1f} ms, "
+                    f"load {binary_result['load_seconds'] * 1000:,.1f} ms, "
+                    f"RAM {binary_result['memory_bytes'] / 1024:,.0f} KB")
+            if 'json' in result:
+                json_result = result['json']
+                line += (f" | json {json_result['file_bytes'] / 1024:,.0f} KB, "
+                         f"save {json_result['save_seconds'] * 1000:,.1f} ms, "
+                         f"load {json_result['load_seconds'] * 1000:,.1f} ms, "
+                         f"RAM {json_result['memory_bytes'] / 1024:,.0f} KB")
+            print(line)
+
+    for count in args.events:
+        result = benchmark_macro_playback(count)
+        results['macro_playback'].append(result)
+        print(f"macro playback {count:>9} events | compile {result['compile_event_us']:.2f} us/event "
+              f"({result['compile_memory_bytes'] / 1024:,.0f} KB) | dispatch {result['dispatch_event_us']:.2f} us/event | "
+              f"file {result['file_compile_event_us']:.2f} us/event ({result['file_compile_memory_bytes'] / 1024:,.0f} KB) "
+              f"dispatch {result['file_dispatch_event_us']:.2f} us/event | "
+              f"x{result['repeats']} repeat {result['repeat_dispatch_event_us']:.2f} us/event "
+              f"({result['repeat_compile_memory_bytes'] / 1024:,.0f} KB)")
+
+    for count in (1, 8, 32):
+        result = benchmark_macro_parallel(count)
+        results['macro_parallel'].append(result)
+        print(f"macro parallel {count:>3} windows | {result['completed']} completed in {result['duration_ratio']:.2f}x "
+              f"one playback | lag mean {result['mean_lag_ms']:.2f} ms max {result['max_lag_ms']:.2f} ms | "
+              f"start delay max {result['max_start_delay_ms']:.1f} ms")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auto Action Clicker benchmarks")
+    parser.add_argument('--quick', action='store_true',
+                        help="Smaller sizes and shorter runs (1k/100k events, 1s per rate)")
+    parser.add_argument('--events', type=int, nargs='+', help="Macro sizes (event counts) to benchmark")
+    parser.add_argument('--json-max-events', type=int, default=100000,
+                        help="Largest macro size that is also measured as JSON (default: 100000)")
+    parser.add_argument('--rates', type=float, nargs='+', default=[10, 100, 1000],
+                        help="Target action rates (actions/sec) for the action engine")
+    parser.add_argument('--action-seconds', type=float, help="Seconds to run each action rate")
+    parser.add_argument('--windows', type=int, nargs='+', default=[10, 100, 1000],
+                        help="Synthetic window counts for the window lookup benchmark")
+    parser.add_argument('--template-trials', type=int,
+                        help="Random template positions per frame size for the template match benchmark")
+    parser.add_argument('--startup-runs', type=int, default=3,
+                        help="Fresh-process starts per mode for the startup benchmark (0 to skip)")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help=f"Runs of the suite whose medians are compared to the baseline (default: {DEFAULT_REPEAT})")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare against this baseline and fail on regressions")
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help=f"Store the results as the baseline (default: {DEFAULT_BASELINE})")
+    args = parser.parse_args()
+
+    if args.events is None:
+        args.events = [1000, 100000] if args.quick else [1000, 100000, 1000000]
+    if args.template_trials is None:
+        args.template_trials = 5 if args.quick else 20
+    if args.action_seconds is None:
+        args.action_seconds = 1.0 if args.quick else 3.0
+
+    runs = []
+    for run in range(max(1, args.repeat)):
+        if args.repeat > 1:
+            print(f"--- run {run + 1}/{args.repeat} ---")
+        # Startup spawns fresh processes and keeps its best sample already, so it runs once
+        runs.append(run_benchmarks(args, args.startup_runs if run == 0 else 0))
+
+    report = {
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'processor': platform.processor()},
+        'runs': len(runs),
+        'benchmarks': runs[0],
+        'medians': median_metrics(runs),
+    }
+
+    missed = [result['scenario'] for result in report['benchmarks']['idle_wakeups'] if not result['met']]
+    if missed:
+        print(f"Idle wakeup targets missed: {', '.join(missed)}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        report['regressions'] = compare_to_baseline(report, baseline)
+        for regression in report['regressions']:
+            print(f"REGRESSION {regression['metric']}: {regression['baseline']:.6g} -> {regression['current']:.6g}")
+        if not report['regressions']:
+            print(f"No regressions against {args.baseline}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    return 1 if report.get('regressions') or missed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Shared fixtures: deterministic clocks, so timing tests don't depend on the machine"""
+
+import pytest
+
+
+class FakeClock:
+    """Monotonic clock that only advances when slept on, plus a tiny step per read
+
+    The per-read step stands in for the time a busy-wait spends reading the clock,
+    so spin loops terminate without real time passing.
+    """
+
+    def __init__(self, read_step=1e-6):
+        self.now = 0.0
+        self.read_step = read_step
+        self.sleeps = []
+
+    def __call__(self):
+        self.now += self.read_step
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += max(0.0, seconds)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,98 @@
+"""ActionScheduler driven by a fake clock: deadlines, resync after a stall and achieved rate"""
+
+import pytest
+
+from auto_action_clicker import ActionScheduler
+
+
+def make_scheduler(clock, interval):
+    scheduler = ActionScheduler(clock=clock, sleep=clock.sleep)
+    scheduler.reset(interval)
+    return scheduler
+
+
+def tick_times(scheduler, clock, count):
+    times = []
+    for _ in range(count):
+        assert scheduler.wait_next()
+        times.append(clock.now)
+    return times
+
+
+def test_ticks_land_on_absolute_deadlines(clock):
+    scheduler = make_scheduler(clock, 0.01)
+    times = tick_times(scheduler, clock, 50)
+    start = times[0]
+    for index, t in enumerate(times):
+        assert t - (start + index * 0.01) == pytest.approx(0.0, abs=1e-4)
+
+
+def test_action_time_does_not_accumulate_as_drift(clock):
+    scheduler = make_scheduler(clock, 0.01)
+    times = []
+    for _ in range(50):
+        assert scheduler.wait_next()
+        times.append(clock.now)
+        clock.advance(0.004)  # The action itself takes 40% of the interval
+    assert times[-1] - times[0] == pytest.approx(49 * 0.01, abs=1e-4)
+    assert scheduler.resync_count == 0
+
+
+def test_coarse_sleep_then_short_spin(clock):
+    scheduler = make_scheduler(clock, 0.5)
+    tick_times(scheduler, clock, 2)
+    # Sleeps are sliced so stop requests stay responsive, and stop short of the spin threshold
+    assert clock.sleeps and max(clock.sleeps) <= 0.05 + 1e-9
+
+
+def test_late_tick_within_a_cycle_keeps_the_grid(clock):
+    scheduler = make_scheduler(clock, 0.01)
+    start = tick_times(scheduler, clock, 1)[0]
+    clock.advance(0.015)  # Half a cycle past the next deadline
+    late = tick_times(scheduler, clock, 1)[0]
+    following = tick_times(scheduler, clock, 1)[0]
+    assert late == pytest.approx(start + 0.015, abs=1e-4)
+    assert following == pytest.approx(start + 0.02, abs=1e-4)
+    assert scheduler.resync_count == 0
+
+
+def test_stall_longer_than_a_cycle_resyncs_instead_of_bursting(clock):
+    scheduler = make_scheduler(clock, 0.01)
+    tick_times(scheduler, clock, 3)
+    clock.advance(0.025)  # Stalled for 2.5 cycles: the next tick is 1.5 cycles late
+    stalled = tick_times(scheduler, clock, 1)[0]
+    following = tick_times(scheduler, clock, 2)
+    assert scheduler.resync_count == 1
+    assert following[0] - stalled == pytest.approx(0.01, abs=1e-4)
+    assert following[1] - following[0] == pytest.approx(0.01, abs=1e-4)
+
+
+def test_achieved_rate_is_measured_to_the_last_tick(clock):
+    scheduler = make_scheduler(clock, 0.01)
+    tick_times(scheduler, clock, 101)
+    stats = scheduler.get_stats()
+    assert stats['ticks'] == 101
+    assert stats['target_rate'] == pytest.approx(100.0)
+    assert stats['achieved_rate'] == pytest.approx(100.0, rel=1e-3)
+    assert stats['jitter_max_ms'] < 0.1
+
+    # Idle time after the last tick (e.g. after stopping) does not dilute the rate
+    clock.advance(10.0)
+    assert scheduler.get_stats()['achieved_rate'] == pytest.approx(100.0, rel=1e-3)
+
+
+def test_interval_change_applies_from_the_next_deadline(clock):
+    scheduler = make_scheduler(clock, 0.01)
+    first = tick_times(scheduler, clock, 1)[0]
+    scheduler.set_interval(0.05)
+    second = tick_times(scheduler, clock, 1)[0]
+    third = tick_times(scheduler, clock, 1)[0]
+    assert second - first == pytest.approx(0.01, abs=1e-4)
+    assert third - second == pytest.approx(0.05, abs=1e-4)
+
+
+def test_cancel_while_waiting(clock):
+    scheduler = make_scheduler(clock, 1.0)
+    assert scheduler.wait_next()
+    assert not scheduler.wait_next(lambda: False)
+    assert scheduler.get_stats()['ticks'] == 1
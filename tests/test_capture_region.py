@@ -0,0 +1,55 @@
+"""ActionEngine.capture_region and condition watches for minimized or off-area targets"""
+
+import pytest
+
+from auto_action_clicker import ActionEngine, ConditionSpec
+from benchmark import simulated_environment
+
+HWND = 0x10000
+
+
+@pytest.fixture
+def windows():
+    with simulated_environment(4) as windows:
+        windows.minimized = set()
+        windows.IsIconic = lambda hwnd: hwnd in windows.minimized
+        # Client areas: 800x600 at screen (100, 50), or 0x0 while minimized
+        windows.GetClientRect = lambda hwnd: (0, 0, 0, 0) if hwnd in windows.minimized else (0, 0, 800, 600)
+        windows.ClientToScreen = lambda hwnd, point: (point[0] + 100, point[1] + 50)
+        yield windows
+
+
+@pytest.fixture
+def engine(windows):
+    engine = ActionEngine('pyautogui')
+    yield engine
+    engine.region_watcher.stop()
+
+
+def test_region_within_client_area(engine):
+    assert engine.capture_region(HWND) == (100, 50, 800, 600)
+    assert engine.capture_region(HWND, (700, 500, 200, 200)) == (800, 550, 100, 100)
+
+
+def test_screen_region_without_window(engine):
+    assert engine.capture_region(None, (10, 20, 30, 40)) == (10, 20, 30, 40)
+
+
+def test_minimized_window_has_no_region(engine, windows):
+    windows.minimized.add(HWND)
+
+    assert engine.capture_region(HWND) is None
+    assert engine.capture_region(HWND, (10, 10, 50, 50)) is None
+
+
+def test_empty_region_has_nothing_to_capture(engine):
+    assert engine.capture_region(HWND, (10, 10, 0, 50)) is None
+
+
+def test_watch_on_minimized_window_fails_before_sampling(engine, windows):
+    windows.minimized.add(HWND)
+    condition = ConditionSpec.from_config({'condition_mode': 'change', 'condition_region': '0,0,20,20'})
+
+    with pytest.raises(ValueError, match="minimized"):
+        engine.watch_condition('actions', windows.titles[HWND], condition)
+    assert engine.region_watcher.get_stats() == {}
@@ -0,0 +1,110 @@
+"""JobScheduler stop and resume: runs, repeat limits and next deadlines survive a pause"""
+
+import threading
+import time
+
+import pytest
+
+from auto_action_clicker import ClickJob, JobScheduler
+
+
+class Recorder:
+    """Job executor that records when each job ran"""
+
+    def __init__(self):
+        self.runs = []
+        self.ran = threading.Condition()
+
+    def __call__(self, job):
+        with self.ran:
+            self.runs.append((job.job_id, time.perf_counter()))
+            self.ran.notify_all()
+        return True
+
+    def wait_for(self, count, timeout=5.0):
+        with self.ran:
+            assert self.ran.wait_for(lambda: len(self.runs) >= count, timeout)
+
+
+def test_resume_keeps_runs_of_a_repeat_job():
+    recorder = Recorder()
+    scheduler = JobScheduler(recorder)
+    job = ClickJob(interval=0.02, repeat=5)
+    scheduler.add_job(job)
+
+    scheduler.start()
+    recorder.wait_for(2)
+    scheduler.stop()
+    runs = job.run_count
+    assert 2 <= runs < 5
+
+    scheduler.start(resume=True)
+    recorder.wait_for(5)
+    time.sleep(0.1)
+    scheduler.stop()
+
+    assert job.run_count == 5 == len(recorder.runs)
+    assert job.finished
+    assert scheduler.active_count() == 0
+
+
+def test_resume_keeps_time_to_next_deadline(clock):
+    recorder = Recorder()
+    scheduler = JobScheduler(recorder, clock=clock)
+    job = ClickJob(interval=0.5)
+    scheduler.add_job(job)
+
+    scheduler.start()
+    recorder.wait_for(1)
+    clock.advance(0.1)
+    scheduler.stop()
+    clock.advance(30.0)
+
+    scheduler.start(resume=True)
+    with scheduler._condition:
+        deadline = scheduler._queue[0][0]
+    scheduler.stop()
+
+    # 0.4 s were left at the pause, however long the pause was
+    assert deadline - clock.now == pytest.approx(0.4, abs=1e-3)
+    assert job.run_count == 1
+
+
+def test_start_afresh_resets_runs():
+    recorder = Recorder()
+    scheduler = JobScheduler(recorder)
+    job = ClickJob(interval=0.02, repeat=2)
+    scheduler.add_job(job)
+
+    scheduler.start()
+    recorder.wait_for(2)
+    time.sleep(0.05)
+    scheduler.stop()
+    assert job.finished
+
+    scheduler.start()
+    recorder.wait_for(4)
+    time.sleep(0.05)
+    scheduler.stop()
+
+    assert job.run_count == 2
+    assert len(recorder.runs) == 4
+
+
+def test_job_added_while_stopped_starts_on_resume():
+    recorder = Recorder()
+    scheduler = JobScheduler(recorder)
+    first = ClickJob(interval=10.0)
+    scheduler.add_job(first)
+    scheduler.start()
+    recorder.wait_for(1)
+    scheduler.stop()
+
+    second = ClickJob(interval=10.0)
+    scheduler.add_job(second)
+    scheduler.start(resume=True)
+    recorder.wait_for(2)
+    scheduler.stop()
+
+    assert [job_id for job_id, _ in recorder.runs] == [first.job_id, second.job_id]
+    assert first.run_count == second.run_count == 1
@@ -0,0 +1,98 @@
+"""Macro control flow linking: blocks that would repeat without moving the timeline are rejected"""
+
+import pytest
+
+from auto_action_clicker import EXIT_USAGE, MacroFile, MacroStore, compile_macro, parse_args, run_headless
+
+
+def click(t):
+    return {'type': 'click', 'x': 10, 'y': 20, 't': t}
+
+
+def control(event_type, t, **fields):
+    return dict(fields, type=event_type, t=t)
+
+
+def compiled(actions, tmp_path=None):
+    store = MacroStore.from_actions(actions)
+    if tmp_path is None:
+        return compile_macro(store)
+    path = tmp_path / 'macro.acm'
+    store.save(path)
+    return compile_macro(MacroFile(path))
+
+
+@pytest.mark.parametrize('body', [
+    [],
+    [control('repeat', 0.0, count=2), control('end', 0.0)],
+    [control('wait', 0.0, seconds=0)],
+    [click(0.0), click(0.0)],
+], ids=['empty', 'only-control', 'zero-wait', 'no-duration'])
+@pytest.mark.parametrize('streamed', [False, True])
+def test_until_stopped_repeat_without_time_is_rejected(tmp_path, body, streamed):
+    actions = [control('repeat', 0.0, count=0)] + body + [control('end', 0.0)]
+
+    with pytest.raises(ValueError, match="event 1: repeat until stopped has no duration"):
+        compiled(actions, tmp_path if streamed else None)
+
+
+@pytest.mark.parametrize('body', [
+    [click(0.0), click(0.5)],
+    [click(0.0), control('wait', 0.0, seconds=0.1)],
+    [control('repeat', 0.0, count=2), control('wait', 0.0, seconds=0.1), control('end', 0.0)],
+], ids=['duration', 'wait', 'nested-wait'])
+def test_until_stopped_repeat_that_takes_time_links(body):
+    program = compiled([control('repeat', 0.0, count=0)] + body + [control('end', body[-1]['t'])])
+
+    assert program.jump[0] == len(program) - 1
+
+
+def test_bounded_repeat_may_take_no_time():
+    program = compiled([control('repeat', 0.0, count=3), click(0.0), control('end', 0.0)])
+
+    assert program.jump[0] == 2
+
+
+def test_calls_count_the_time_of_their_sub_macro():
+    def macro(sub_seconds):
+        return [control('sub', 0.0, name='step'), click(0.0), control('wait', 0.0, seconds=sub_seconds),
+                control('end', 0.0),
+                control('sub', 0.0, name='outer'), control('call', 0.0, name='step'), control('end', 0.0),
+                control('repeat', 0.0, count=0), control('call', 0.0, name='outer'), control('end', 0.0)]
+
+    assert compiled(macro(0.2)).has_waits
+    with pytest.raises(ValueError, match="event 8: repeat until stopped"):
+        compiled(macro(0))
+
+
+def test_timed_loop_needs_duration_or_a_wait():
+    with pytest.raises(ValueError, match="timed loop has no duration"):
+        compiled([control('loop', 0.0, seconds=5), click(0.0), control('end', 0.0)])
+
+    program = compiled([control('loop', 0.0, seconds=5), click(0.0), control('wait', 0.0, seconds=0.5),
+                        control('end', 0.0)])
+    assert program.jump[0] == 3
+
+
+def test_headless_repeat_until_stopped_rejects_a_macro_without_time(tmp_path, capsys):
+    config = tmp_path / 'config.json'
+    config.write_text('{}')
+    path = tmp_path / 'macro.acm'
+    MacroStore.from_actions([click(0.0), click(0.0)]).save(path)
+    args = parse_args(['--headless', '--config', str(config), '--macro', str(path), '--repeat', '0'])
+
+    assert run_headless(args) == EXIT_USAGE
+    assert "--repeat 0 needs a macro that takes time" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('actions, takes_time', [
+    ([click(0.0)], False),
+    ([click(0.0), control('wait', 0.0, seconds=0)], False),
+    ([click(0.0), control('wait', 0.0, seconds=0.5)], True),
+    ([click(0.0), click(0.5)], True),
+])
+@pytest.mark.parametrize('streamed', [False, True])
+def test_program_reports_whether_a_pass_takes_time(tmp_path, actions, takes_time, streamed):
+    program = compiled(actions, tmp_path if streamed else None)
+
+    assert (program.end_time > 0 or program.has_waits) == takes_time
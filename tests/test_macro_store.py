@@ -0,0 +1,123 @@
+"""MacroStore key events and MacroFile chunk access: scan code and key index ranges, decodes per chunk"""
+
+import pytest
+
+from auto_action_clicker import MACRO_MAX_CHUNK_KEYS, MacroFile, MacroStore, MacroStreamWriter, compile_macro
+
+
+def key_actions(scan_codes, key='a'):
+    actions = []
+    for i, scan_code in enumerate(scan_codes):
+        actions.append({'type': 'key_down', 'key': key, 'scan_code': scan_code, 't': i / 100})
+        actions.append({'type': 'key_up', 'key': key, 'scan_code': scan_code, 't': i / 100 + 0.005})
+    return actions
+
+
+def keys_and_scan_codes(actions):
+    return [(action['key'], action['scan_code']) for action in actions]
+
+
+@pytest.mark.parametrize('scan_code', [0, 0x1E, 0x7FFF, 0x8000, 0xE01D, 0xFFFF])
+def test_scan_codes_round_trip(tmp_path, scan_code):
+    store = MacroStore.from_actions(key_actions([scan_code]) + [{'type': 'move', 'x': -5, 'y': 7, 't': 1.0}])
+    path = tmp_path / 'keys.acm'
+    store.save(path)
+
+    expected = [('a', scan_code)] * 2
+    assert keys_and_scan_codes(store.to_actions()[:2]) == expected
+    assert keys_and_scan_codes(MacroStore.load(path).to_actions()[:2]) == expected
+    assert keys_and_scan_codes(list(MacroFile(path))[:2]) == expected
+    assert MacroStore.load(path)[2] == store[2]
+
+
+@pytest.mark.parametrize('scan_code', [-1, 0x10000, 1 << 40])
+def test_out_of_range_scan_code_is_rejected(scan_code):
+    with pytest.raises(ValueError):
+        MacroStore.from_actions(key_actions([scan_code]))
+
+
+def test_key_indexes_past_16_bits_round_trip(tmp_path):
+    # Every chunk holds fewer than 65536 names, but the store's key table does not
+    count = 70000
+    actions = [{'type': 'key_down', 'key': f'k{i}', 'scan_code': 0x8000 + i % 0x8000, 't': i / 1000}
+               for i in range(count)]
+    store = MacroStore.from_actions(actions)
+    path = tmp_path / 'many.acm'
+    store.save(path, chunk_size=4096)
+
+    loaded = MacroStore.load(path)
+    assert len(loaded.keys) == count
+    assert loaded[count - 1]['key'] == f'k{count - 1}'
+    assert keys_and_scan_codes(loaded.to_actions()) == keys_and_scan_codes(actions)
+
+    compiled = compile_macro(loaded)
+    assert compiled.keys[compiled.arg[count - 1]] == f'k{count - 1}'
+
+
+def test_too_many_names_in_one_chunk_is_rejected(tmp_path):
+    actions = [{'type': 'key_down', 'key': f'k{i}', 't': i / 1000} for i in range(MACRO_MAX_CHUNK_KEYS + 1)]
+    store = MacroStore.from_actions(actions)
+
+    with pytest.raises(ValueError):
+        store.save(tmp_path / 'chunk.acm', chunk_size=len(actions))
+
+
+def test_streamed_writer_keeps_scan_codes(tmp_path):
+    path = tmp_path / 'stream.acm'
+    with MacroStreamWriter(path, chunk_size=3) as writer:
+        for action in key_actions([0x1E, 0xE038, 0xFFFF]):
+            writer.append(action)
+
+    assert [scan_code for _, scan_code in keys_and_scan_codes(MacroFile(path))] == [0x1E, 0x1E, 0xE038, 0xE038,
+                                                                                     0xFFFF, 0xFFFF]
+
+
+def test_select_and_insert_keep_scan_codes():
+    store = MacroStore.from_actions(key_actions([0x10, 0x9000]))
+    store.insert(0, {'type': 'repeat', 'count': 2})
+    store.append({'type': 'end'})
+
+    assert store[0]['type'] == 'repeat'
+    assert keys_and_scan_codes(store.to_actions()[1:5]) == [('a', 0x10), ('a', 0x10), ('a', 0x9000), ('a', 0x9000)]
+    assert keys_and_scan_codes(store.select([3, 4]).to_actions()) == [('a', 0x9000)] * 2
+
+
+def moves(count):
+    return [{'type': 'move', 'x': i, 'y': -i, 't': i * 0.01 + (i % 7) * 0.001} for i in range(count)]
+
+
+@pytest.fixture
+def chunked(tmp_path):
+    store = MacroStore.from_actions(moves(100))
+    path = tmp_path / 'chunked.acm'
+    store.save(path, chunk_size=10)
+    return store, MacroFile(path)
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    counts = []
+    read_chunk = MacroStore._read_chunk
+
+    def counting(self, view, offset):
+        counts.append(offset)
+        return read_chunk(self, view, offset)
+
+    monkeypatch.setattr(MacroStore, '_read_chunk', counting)
+    return counts
+
+
+def test_macro_file_sequential_reads_decode_each_chunk_once(chunked, decodes):
+    store, macro_file = chunked
+
+    actions = [macro_file[i] for i in range(len(macro_file))]
+
+    assert actions == store.to_actions()
+    assert len(decodes) == len(set(decodes)) == 10
+
+
+def test_macro_file_first_event_delay_of_any_chunk(chunked):
+    store, macro_file = chunked
+
+    for i in (90, 30, 10, 0, 50):
+        assert macro_file[i]['delay'] == store[i]['delay']
@@ -0,0 +1,82 @@
+"""Back/forward mouse buttons reach both input backends as X buttons, never as a left click"""
+
+import ctypes
+
+import pytest
+
+import auto_action_clicker as app
+from auto_action_clicker import SendInputBackend, WindowMessageSender
+from benchmark import simulated_environment
+
+
+class FakeUser32:
+    """Records (dwFlags, mouseData) of every injected mouse event"""
+
+    def __init__(self):
+        self.events = []
+
+    def SendInput(self, count, inputs, size):
+        self.events.extend((event.union.mi.dwFlags, event.union.mi.mouseData) for event in inputs[:count])
+        return count
+
+
+@pytest.fixture
+def send_input():
+    # Built without __init__, which needs ctypes.windll
+    backend = SendInputBackend.__new__(SendInputBackend)
+    backend._user32 = FakeUser32()
+    backend._input_size = ctypes.sizeof(app.INPUT)
+    backend._left = backend._top = 0
+    backend._width = backend._height = 1000
+    return backend
+
+
+@pytest.fixture
+def posted(monkeypatch):
+    messages = []
+    monkeypatch.setattr(WindowMessageSender, '_post',
+                        staticmethod(lambda hwnd, msg, wparam, lparam: messages.append((msg, wparam))))
+    with simulated_environment(4):
+        yield messages
+
+
+@pytest.mark.parametrize('button, data', [('x', app.XBUTTON1), ('x2', app.XBUTTON2)])
+def test_send_input_x_buttons(send_input, button, data):
+    send_input.click_many([(10, 20)], button=button)
+    send_input.mouse_button(10, 20, button=button, down=False)
+
+    buttons = send_input._user32.events[1:3] + send_input._user32.events[4:]
+    assert buttons == [(app.MOUSEEVENTF_XDOWN, data), (app.MOUSEEVENTF_XUP, data), (app.MOUSEEVENTF_XUP, data)]
+
+
+def test_send_input_rejects_unknown_button(send_input):
+    with pytest.raises(ValueError):
+        send_input.click_many([(10, 20)], button='x3')
+    with pytest.raises(ValueError):
+        send_input.mouse_button(10, 20, button='x3')
+    assert send_input._user32.events == []
+
+
+@pytest.mark.parametrize('button, data, key_state', [('x', app.XBUTTON1, app.MK_XBUTTON1),
+                                                     ('x2', app.XBUTTON2, app.MK_XBUTTON2)])
+def test_window_messages_x_buttons(posted, button, data, key_state):
+    sender = WindowMessageSender()
+    sender.click(1, 10, 20, button=button, clicks=2, screen_coords=False)
+    assert sender.button(1, 10, 20, button=button, down=True) == key_state
+
+    assert [message for message in posted if message[0] != app.win32con.WM_MOUSEMOVE] == [
+        (app.WM_XBUTTONDOWN, data << 16 | key_state),
+        (app.WM_XBUTTONUP, data << 16),
+        (app.WM_XBUTTONDBLCLK, data << 16 | key_state),
+        (app.WM_XBUTTONUP, data << 16),
+        (app.WM_XBUTTONDOWN, data << 16 | key_state),
+    ]
+
+
+def test_window_messages_reject_unknown_button(posted):
+    sender = WindowMessageSender()
+    with pytest.raises(ValueError):
+        sender.click(1, 10, 20, button='x3')
+    with pytest.raises(ValueError):
+        sender.button(1, 10, 20, button='x3')
+    assert posted == []
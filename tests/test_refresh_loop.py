@@ -0,0 +1,119 @@
+"""UI refresh loops on a fake clock: no timers while hidden or unfocused, at most 1/s while idle"""
+
+import pytest
+
+from auto_action_clicker import RefreshLoop, UIRefreshController
+from benchmark import SimulatedEventLoop
+
+FRAME_MS = 1000 / 60
+SETTLE = 5.0
+DURATION = 60.0
+
+
+class Refresh:
+    """UIRefreshController on a simulated Tk event loop, recording when each callback ran"""
+
+    def __init__(self, clock, moving=False):
+        self.clock = clock
+        self.loop = SimulatedEventLoop(clock)
+        self.moving = moving
+        self.pointer_times = []
+        self.statistics_times = []
+        self.controller = UIRefreshController(self.loop.after, self.loop.after_cancel,
+                                              self._update_pointer, self._update_statistics,
+                                              frame_interval=FRAME_MS)
+
+    def _update_pointer(self):
+        self.pointer_times.append(self.clock.now)
+        return self.moving
+
+    def _update_statistics(self):
+        self.statistics_times.append(self.clock.now)
+        return True
+
+    def pending_timers(self):
+        return [timer for timer in self.loop._timers if timer[1] not in self.loop._cancelled]
+
+    def run(self, seconds):
+        self.loop.run_until(self.clock.now + seconds)
+
+
+def steady_times(times, start):
+    return [t for t in times if t > start]
+
+
+@pytest.mark.parametrize('visible, focused', [(False, False), (False, True), (True, False)])
+def test_no_wakeups_when_minimized_or_unfocused(clock, visible, focused):
+    refresh = Refresh(clock)
+    refresh.controller.update(visible=visible, focused=focused, busy=False)
+    refresh.run(SETTLE + DURATION)
+
+    assert refresh.controller.wakeups == 0
+    assert refresh.pending_timers() == []
+
+
+def test_focused_idle_wakes_at_most_once_per_second(clock):
+    refresh = Refresh(clock)
+    refresh.controller.update(visible=True, focused=True, busy=False)
+    refresh.run(SETTLE + DURATION)
+
+    times = steady_times(refresh.pointer_times, SETTLE)
+    assert len(times) <= DURATION
+    assert all(b - a >= 1.0 - 1e-9 for a, b in zip(times, times[1:]))
+    assert refresh.statistics_times == []
+
+
+def test_losing_focus_or_minimizing_stops_timers(clock):
+    refresh = Refresh(clock, moving=True)
+    refresh.controller.update(visible=True, focused=True, busy=True)
+    refresh.run(1.0)
+    assert refresh.controller.wakeups > 0
+
+    refresh.controller.update(focused=False)
+    refresh.controller.update(visible=False)
+    wakeups = refresh.controller.wakeups
+    refresh.run(DURATION)
+
+    assert refresh.controller.wakeups == wakeups
+    assert refresh.pending_timers() == []
+
+
+def test_moving_pointer_refreshes_at_display_rate(clock):
+    refresh = Refresh(clock, moving=True)
+    refresh.controller.update(visible=True, focused=True, busy=False)
+    refresh.run(SETTLE + DURATION)
+
+    assert len(steady_times(refresh.pointer_times, SETTLE)) <= 60 * DURATION
+
+
+def test_wake_returns_to_frame_interval(clock):
+    refresh = Refresh(clock)
+    refresh.controller.update(visible=True, focused=True, busy=False)
+    refresh.run(SETTLE)
+    assert refresh.controller.pointer_loop.interval == 1000
+
+    refresh.controller.wake()
+    assert refresh.controller.pointer_loop.interval == refresh.controller.pointer_loop.min_interval
+    assert len(refresh.pending_timers()) == 1
+
+
+def test_statistics_run_once_per_second_while_busy(clock):
+    refresh = Refresh(clock)
+    refresh.controller.update(visible=True, focused=False, busy=True)
+    refresh.run(DURATION)
+
+    assert refresh.pointer_times == []
+    assert len(refresh.statistics_times) <= DURATION + 1
+    assert all(b - a >= 1.0 - 1e-9 for a, b in zip(refresh.statistics_times, refresh.statistics_times[1:]))
+
+
+def test_failing_callback_backs_off(clock):
+    def fail():
+        raise RuntimeError("widget destroyed")
+
+    loop = SimulatedEventLoop(clock)
+    refresh = RefreshLoop(loop.after, loop.after_cancel, fail, FRAME_MS, 1000)
+    refresh.set_enabled(True)
+    loop.run_until(SETTLE)
+
+    assert refresh.interval == 1000
@@ -0,0 +1,109 @@
+"""TemplateMatcher on synthetic textures: search, tracked re-search, unchanged frames and misses"""
+
+import pytest
+
+import auto_action_clicker as app
+from auto_action_clicker import TemplateMatcher, numpy
+from benchmark import synthetic_texture
+
+pytestmark = pytest.mark.skipif(not app.NUMPY_AVAILABLE, reason="numpy is not installed")
+
+FRAME = (240, 320)
+SIZE = 48
+
+
+@pytest.fixture
+def scene():
+    rng = numpy.random.default_rng(1)
+    background = synthetic_texture(rng, *FRAME)
+    template = synthetic_texture(rng, SIZE, SIZE) * 0.5 + 60
+
+    def frame(x=None, y=None):
+        image = background.copy()
+        if x is not None:
+            image[y:y + SIZE, x:x + SIZE] = template
+        return (image + rng.normal(0, 2, image.shape)).astype(numpy.float32)
+
+    return template, frame
+
+
+def assert_at(match, x, y):
+    assert match.found
+    assert abs(match.x - (x + SIZE // 2)) <= 1
+    assert abs(match.y - (y + SIZE // 2)) <= 1
+
+
+def test_search_finds_location(scene):
+    template, frame = scene
+    matcher = TemplateMatcher(template)
+
+    match = matcher.match(frame(200, 90))
+
+    assert match.mode == 'search'
+    assert match.score >= matcher.threshold
+    assert_at(match, 200, 90)
+
+
+def test_moved_template_is_tracked(scene):
+    template, frame = scene
+    matcher = TemplateMatcher(template)
+    matcher.match(frame(120, 80))
+
+    match = matcher.match(frame(130, 74))
+
+    assert match.mode == 'tracked'
+    assert_at(match, 130, 74)
+
+
+def test_unchanged_frame_reuses_last_match(scene):
+    template, frame = scene
+    matcher = TemplateMatcher(template)
+    image = frame(40, 150)
+    first = matcher.match(image)
+
+    # Sensor noise stays below the change threshold
+    again = matcher.match(image + 1.0)
+
+    assert again.mode == 'cached'
+    assert again[:4] == first[:4]
+    assert matcher.counts == {'cached': 1, 'tracked': 0, 'search': 1}
+
+
+def test_missing_template_is_not_found(scene):
+    template, frame = scene
+    matcher = TemplateMatcher(template)
+
+    match = matcher.match(frame())
+
+    assert not match.found
+    assert match.score < matcher.threshold
+
+
+def test_template_that_disappears_is_not_found(scene):
+    template, frame = scene
+    matcher = TemplateMatcher(template)
+    assert matcher.match(frame(60, 60)).found
+
+    match = matcher.match(frame())
+
+    assert match.mode == 'search'
+    assert not match.found
+
+
+def test_reset_searches_again(scene):
+    template, frame = scene
+    matcher = TemplateMatcher(template)
+    image = frame(250, 20)
+    matcher.match(image)
+    matcher.reset()
+
+    match = matcher.match(image)
+
+    assert match.mode == 'search'
+    assert_at(match, 250, 20)
+
+
+@pytest.mark.parametrize('template', [[[128.0] * 32] * 32, list(range(32)), [[0.0] * 32]])
+def test_unusable_template_is_rejected(template):
+    with pytest.raises(ValueError):
+        TemplateMatcher(template)